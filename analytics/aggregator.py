@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from db.mongo import get_database
+from . import archive, rollups, timebuckets
+from .events import ensure_event_indexes
 
 
 _COLLECTION_NAME = "analytics_events"
@@ -14,134 +16,201 @@ def _events_collection():
     return db[_COLLECTION_NAME]
 
 
-def _single_count(match: Dict[str, Any]) -> int:
-    pipeline = [{"$match": match}, {"$count": "value"}]
-    results = list(_events_collection().aggregate(pipeline))
-    return int(results[0]["value"]) if results else 0
+_EXPORT_EVENT_TYPES = ["export_storybook", "export_comic", "export_bundle"]
 
 
 def get_total_dreams() -> int:
-    return _single_count({"event_type": "dream_created"})
+    return int(rollups.total(["dream_created"]))
 
 
 def get_total_images() -> int:
-    return _single_count({"event_type": "image_generated"})
+    return int(rollups.total(["image_generated"]))
 
 
 def get_audio_minutes() -> float:
     """Return total audio duration in minutes based on audio_generated events.
 
     Expects events of type "audio_generated" to store a
-    meta.duration_seconds numeric field (fallback to 0 if missing).
+    meta.duration_seconds numeric field (fallback to 0 if missing); the
+    seconds are summed into the rollups when the event is logged.
     """
 
-    pipeline = [
-        {"$match": {"event_type": "audio_generated"}},
-        {
-            "$group": {
-                "_id": None,
-                "total_seconds": {
-                    "$sum": {"$ifNull": ["$meta.duration_seconds", 0]}
-                },
-            }
-        },
-    ]
-
-    results = list(_events_collection().aggregate(pipeline))
-    if not results:
-        return 0.0
-
-    total_seconds = float(results[0].get("total_seconds", 0.0))
-    return total_seconds / 60.0
+    return rollups.total(["audio_generated"], field="duration_seconds") / 60.0
 
 
 def get_video_render_count() -> int:
-    return _single_count({"event_type": "video_rendered"})
+    return int(rollups.total(["video_rendered"]))
 
 
 def get_exports_count() -> int:
-    return _single_count(
-        {"event_type": {"$in": ["export_storybook", "export_comic", "export_bundle"]}}
-    )
+    return int(rollups.total(_EXPORT_EVENT_TYPES))
 
 
 def get_active_users(days: int) -> int:
-    """Count distinct users with any event in the last N days."""
+    """Approximate distinct users with any event in the last N days.
 
-    since = datetime.utcnow() - timedelta(days=days)
+    Merges the per-day HyperLogLog sketches (error bound in analytics.hll);
+    the window is today plus the N - 1 previous whole UTC days.
+    """
 
-    pipeline = [
-        {"$match": {"created_at": {"$gte": since}, "user_id": {"$exists": True}}},
-        {"$group": {"_id": "$user_id"}},
-        {"$count": "value"},
-    ]
+    since = datetime.utcnow() - timedelta(days=max(days, 1) - 1)
+    return rollups.active_users_since(since)
 
-    results = list(_events_collection().aggregate(pipeline))
-    return int(results[0]["value"]) if results else 0
 
+def get_overview() -> Dict[str, Any]:
+    """Every overview metric from a single $facet query over the rollups."""
 
-def get_timeseries(metric: str) -> List[Dict[str, Any]]:
-    """Return a daily timeseries for the requested metric.
+    now = datetime.utcnow()
+    data = rollups.overview(
+        {"1d": now, "7d": now - timedelta(days=6), "30d": now - timedelta(days=29)}
+    )
+    totals = data["totals"]
+
+    def count(event_types: Sequence[str]) -> int:
+        return int(sum(totals.get(event_type, {}).get("count", 0) for event_type in event_types))
+
+    return {
+        "total_dreams": count(["dream_created"]),
+        "total_images": count(["image_generated"]),
+        "audio_minutes": totals.get("audio_generated", {}).get("duration_seconds", 0.0) / 60.0,
+        "video_render_count": count(["video_rendered"]),
+        "exports_count": count(_EXPORT_EVENT_TYPES),
+        "active_users_1d": data["active"]["1d"],
+        "active_users_7d": data["active"]["7d"],
+        "active_users_30d": data["active"]["30d"],
+    }
 
-    Supported metrics:
-      - "dreams": count of dream_created events per day
-      - "images": count of image_generated events per day
-      - "video_renders": count of video_rendered events per day
-      - "exports": count of export_* events per day
-      - "audio_minutes": total audio minutes per day (from meta.duration_seconds)
-    """
 
-    metric_defs: Dict[str, Dict[str, Any]] = {
-        "dreams": {
-            "event_types": ["dream_created"],
-            "value_expr": 1,
-        },
-        "images": {
-            "event_types": ["image_generated"],
-            "value_expr": 1,
-        },
-        "video_renders": {
-            "event_types": ["video_rendered"],
-            "value_expr": 1,
-        },
-        "exports": {
-            "event_types": ["export_storybook", "export_comic", "export_bundle"],
-            "value_expr": 1,
+_METRIC_DEFS: Dict[str, Dict[str, Any]] = {
+    "dreams": {
+        "event_types": ["dream_created"],
+        "field": "count",
+        "value_expr": 1,
+    },
+    "images": {
+        "event_types": ["image_generated"],
+        "field": "count",
+        "value_expr": 1,
+    },
+    "video_renders": {
+        "event_types": ["video_rendered"],
+        "field": "count",
+        "value_expr": 1,
+    },
+    "exports": {
+        "event_types": _EXPORT_EVENT_TYPES,
+        "field": "count",
+        "value_expr": 1,
+    },
+    "audio_minutes": {
+        "event_types": ["audio_generated"],
+        "field": "duration_seconds",
+        "value_expr": {"$ifNull": ["$meta.duration_seconds", 0]},
+    },
+}
+
+
+def _truncated_event_points(
+    definition: Dict[str, Any], buckets: timebuckets.Buckets, unit: str, tz_name: str, since: datetime
+) -> List[Tuple[datetime, float]]:
+    """(bucket start, value) from raw events at or after since, grouped with $dateTrunc in tz."""
+
+    ensure_event_indexes()
+    pipeline = [
+        {
+            "$match": {
+                "event_type": {"$in": definition["event_types"]},
+                "created_at": {"$gte": max(since, buckets.start), "$lt": buckets.end},
+            }
         },
-        "audio_minutes": {
-            "event_types": ["audio_generated"],
-            "value_expr": {"$ifNull": ["$meta.duration_seconds", 0]},
+        {
+            "$group": {
+                "_id": {
+                    "$dateTrunc": {
+                        "date": "$created_at",
+                        "unit": unit,
+                        "timezone": tz_name,
+                        "startOfWeek": "monday",
+                    }
+                },
+                "value": {"$sum": definition["value_expr"]},
+            }
         },
-    }
+    ]
+    return [(row["_id"], float(row.get("value", 0.0))) for row in _events_collection().aggregate(pipeline)]
 
-    if metric not in metric_defs:
-        raise ValueError(f"Unsupported metric: {metric}")
 
-    definition = metric_defs[metric]
+def _unaligned_points(
+    definition: Dict[str, Any], buckets: timebuckets.Buckets, unit: str, tz_name: str
+) -> List[Tuple[datetime, float]]:
+    """Points for buckets that UTC hours do not tile (e.g. Asia/Kolkata).
 
-    match_stage = {
-        "$match": {"event_type": {"$in": definition["event_types"]}},
-    }
+    Raw events are exact, but those before the retention watermark only
+    live in the archive files. For that part of the range the hourly
+    rollups are used instead, each hour counted in the bucket its start
+    falls in, so values can shift by the zone's fractional offset (30 or
+    45 minutes) around bucket boundaries.
+    """
 
-    group_stage = {
-        "$group": {
-            "_id": {
-                "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-            },
-            "value": {"$sum": definition["value_expr"]},
-        }
-    }
+    through = archive.archived_through()
+    if through is None or through <= buckets.start:
+        return _truncated_event_points(definition, buckets, unit, tz_name, buckets.start)
 
-    pipeline = [match_stage, group_stage, {"$sort": {"_id": 1}}]
+    split = min(through, buckets.end)
+    first_hour = rollups.bucket_start(buckets.start, "hour")
+    hourly = rollups.series(definition["event_types"], "hour", first_hour, split, field=definition["field"])
+    points = [(max(hour, buckets.start), value) for hour, value in hourly.items()]
+    if split < buckets.end:
+        points.extend(_truncated_event_points(definition, buckets, unit, tz_name, split))
+    return points
 
-    rows = list(_events_collection().aggregate(pipeline))
+
+def get_timeseries(
+    metric: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    tz_name: str = "UTC",
+) -> List[Dict[str, Any]]:
+    """Return a zero-filled timeseries for the requested metric.
+
+    Supported metrics:
+      - "dreams": count of dream_created events per bucket
+      - "images": count of image_generated events per bucket
+      - "video_renders": count of video_rendered events per bucket
+      - "exports": count of export_* events per bucket
+      - "audio_minutes": total audio minutes per bucket (from meta.duration_seconds)
+
+    Buckets are hours, days or weeks (starting Monday) in tz_name, covering
+    [start, end); naive start/end are wall times in that zone and default to
+    a recent window (see timebuckets). Values come from the daily rollups
+    for UTC days/weeks, from the hourly rollups when the zone is a whole
+    number of hours from UTC, and otherwise from the raw events in range
+    (indexed on event_type + created_at; archived ranges fall back to the
+    hourly rollups, see _unaligned_points). The cost depends on the range
+    only, never on the total history.
+    """
+
+    if metric not in _METRIC_DEFS:
+        raise ValueError(f"Unsupported metric: {metric}")
+
+    definition = _METRIC_DEFS[metric]
+    buckets = timebuckets.make_buckets(granularity, tz_name, start, end)
+
+    if granularity != "hour" and buckets.aligned_to(timedelta(days=1)):
+        values = rollups.series(definition["event_types"], "day", buckets.start, buckets.end, field=definition["field"])
+        points = list(values.items())
+    elif buckets.aligned_to(timedelta(hours=1)):
+        values = rollups.series(definition["event_types"], "hour", buckets.start, buckets.end, field=definition["field"])
+        points = list(values.items())
+    else:
+        points = _unaligned_points(definition, buckets, granularity, tz_name)
 
     timeseries: List[Dict[str, Any]] = []
-    for row in rows:
-        value = float(row.get("value", 0.0))
+    for label, value in buckets.fill(timebuckets.bucket_values(buckets, points)):
         if metric == "audio_minutes":
             value = value / 60.0
-        timeseries.append({"date": row["_id"], "value": value})
+        timeseries.append({"date": label, "value": value})
 
     return timeseries
 
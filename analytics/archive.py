@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, Optional, Sequence, Set
+
+from config.settings import settings
+from db.mongo import get_database
+
+try:  # Optional: zstd-compressed archives
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    zstandard = None  # type: ignore
+
+try:  # Optional: Parquet archives
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    pq = None  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+_META_COLLECTION = "analytics_meta"
+_RETENTION_META_ID = "retention"
+
+SUFFIXES = {
+    "zstd": ".ndjson.zst",
+    "gzip": ".ndjson.gz",
+    "parquet": ".parquet",
+}
+_PART_RE = re.compile(r"^events-(\d{4}-\d{2}-\d{2})\.(\d+)\.")
+
+_warned_formats: Set[str] = set()
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC as stored in Mongo and the archive; aware values are converted."""
+
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def archive_root() -> Path:
+    return Path(settings.analytics_archive_dir)
+
+
+def archive_format() -> str:
+    """The configured format, falling back to gzip when its library is missing.
+
+    A fallback is logged once per process as a warning.
+    """
+
+    fmt = settings.analytics_archive_format
+    if fmt not in SUFFIXES:
+        reason = "is not one of " + ", ".join(SUFFIXES)
+    elif fmt == "zstd" and zstandard is None:
+        reason = "needs the zstandard package"
+    elif fmt == "parquet" and pq is None:
+        reason = "needs the pyarrow package"
+    else:
+        return fmt
+
+    if fmt not in _warned_formats:
+        _warned_formats.add(fmt)
+        logger.warning("ANALYTICS_ARCHIVE_FORMAT=%s %s; archiving as gzip NDJSON instead.", fmt, reason)
+    return "gzip"
+
+
+def day_dir(day: datetime) -> Path:
+    return archive_root() / f"{day:%Y}" / f"{day:%m}"
+
+
+def day_parts(day: datetime) -> List[Path]:
+    """The archive files holding one UTC day's events, in part order."""
+
+    directory = day_dir(day)
+    if not directory.is_dir():
+        return []
+
+    parts = []
+    for path in directory.glob(f"events-{day:%Y-%m-%d}.*"):
+        match = _PART_RE.match(path.name)
+        if match and any(path.name.endswith(suffix) for suffix in SUFFIXES.values()):
+            parts.append((int(match.group(2)), path))
+    return [path for _, path in sorted(parts)]
+
+
+def next_part_path(day: datetime, fmt: str) -> Path:
+    existing = day_parts(day)
+    number = int(_PART_RE.match(existing[-1].name).group(2)) + 1 if existing else 0  # type: ignore[union-attr]
+    return day_dir(day) / f"events-{day:%Y-%m-%d}.{number}{SUFFIXES[fmt]}"
+
+
+def archived_through() -> Optional[datetime]:
+    """Events created before this instant live only in the archive files."""
+
+    doc = get_database()[_META_COLLECTION].find_one({"_id": _RETENTION_META_ID})
+    return doc.get("archived_through") if doc else None
+
+
+def set_archived_through(day_end: datetime) -> None:
+    get_database()[_META_COLLECTION].update_one(
+        {"_id": _RETENTION_META_ID},
+        {"$max": {"archived_through": day_end}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def _open_text(path: Path) -> IO[str]:
+    if path.name.endswith(SUFFIXES["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}.")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+def iter_part_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    """Rows (analytics.export.COLUMNS) from one archive file."""
+
+    if path.suffix == ".parquet":
+        if pq is None:
+            raise RuntimeError(f"pyarrow is required to read {path}.")
+        parquet = pq.ParquetFile(str(path))
+        for group in range(parquet.num_row_groups):
+            for row in parquet.read_row_group(group).to_pylist():
+                row["meta"] = json.loads(row["meta"]) if row.get("meta") else {}
+                yield row
+        return
+
+    with _open_text(path) as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            row["created_at"] = datetime.fromisoformat(row["created_at"]) if row.get("created_at") else None
+            yield row
+
+
+def iter_archived_rows(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_types: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Archived events in [start, end), day by day (and by part within a day).
+
+    Only days before the archived_through watermark are read; later events
+    are still in Mongo.
+    """
+
+    through = archived_through()
+    if through is None:
+        return
+
+    start, end = naive_utc(start), naive_utc(end)
+    stop = min(end, through) if end is not None else through
+    if start is None:
+        day = _oldest_archived_day()
+        if day is None:
+            return
+    else:
+        day = datetime(start.year, start.month, start.day)
+
+    wanted = set(event_types) if event_types else None
+    while day < stop:
+        for path in day_parts(day):
+            for row in iter_part_rows(path):
+                created_at = row.get("created_at")
+                if created_at is None or created_at >= stop or (start is not None and created_at < start):
+                    continue
+                if wanted is not None and row.get("event_type") not in wanted:
+                    continue
+                yield row
+        day += timedelta(days=1)
+
+
+def _oldest_archived_day() -> Optional[datetime]:
+    days = []
+    root = archive_root()
+    if not root.is_dir():
+        return None
+    for path in root.glob("*/*/events-*"):
+        match = _PART_RE.match(path.name)
+        if match:
+            days.append(match.group(1))
+    return datetime.strptime(min(days), "%Y-%m-%d") if days else None
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import threading
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """Small in-process cache whose misses are single-flight.
+
+    get() returns (value, age_seconds). When an entry is missing or older
+    than ttl_seconds, the first caller computes it while concurrent callers
+    for the same key wait for that result instead of computing it again.
+    """
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, float]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and monotonic() - entry[0] < self._ttl:
+                return entry[1], monotonic() - entry[0]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        assert flight is not None
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                entry = self._entries.get(key)
+            return flight.value, (monotonic() - entry[0]) if entry is not None else 0.0
+
+        try:
+            flight.value = compute()
+            with self._lock:
+                self._entries[key] = (monotonic(), flight.value)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+        return flight.value, 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,13 +1,31 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime
 from typing import Any, Mapping, Optional
 
+from pymongo import ASCENDING
+
 from db.mongo import get_database
+from .sink import get_event_sink, write_events
 
 
 _COLLECTION_NAME = "analytics_events"
 
+_indexes_ready = False
+
+
+def ensure_event_indexes() -> None:
+    """Indexes for time-range reads (exports, timeseries, snapshots)."""
+
+    global _indexes_ready
+
+    if not _indexes_ready:
+        collection = get_database()[_COLLECTION_NAME]
+        collection.create_index([("created_at", ASCENDING)])
+        collection.create_index([("event_type", ASCENDING), ("created_at", ASCENDING)])
+        _indexes_ready = True
+
 
 def log_event(
     event_type: str,
@@ -18,11 +36,15 @@ def log_event(
     """Insert a single analytics event into the analytics_events collection.
 
     The event schema is intentionally simple and flexible so we can attach
-    arbitrary metadata in the future without schema migrations.
-    """
+    arbitrary metadata in the future without schema migrations. The hour,
+    day and total counters in analytics_rollups are bumped at the same time
+    so dashboards never have to scan the raw events.
 
-    db = get_database()
-    collection = db[_COLLECTION_NAME]
+    While the event sink runs (see main.on_startup) the event is only queued
+    and written in a later batch; otherwise it is written immediately. On the
+    event loop (async handlers) a full buffer drops the event instead of
+    waiting for room.
+    """
 
     now = datetime.utcnow()
 
@@ -37,4 +59,14 @@ def log_event(
     if dream_id is not None:
         doc["dream_id"] = str(dream_id)
 
-    collection.insert_one(doc)
+    sink = get_event_sink()
+    if sink.running:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            on_event_loop = False
+        else:
+            on_event_loop = True
+        sink.submit(doc, block=not on_event_loop)
+    else:
+        write_events([doc])
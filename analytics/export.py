@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from pymongo import ASCENDING
+
+from db.mongo import get_database
+from . import archive
+from .events import ensure_event_indexes
+
+try:  # Optional: Parquet export needs pyarrow
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+
+_COLLECTION_NAME = "analytics_events"
+_CURSOR_BATCH = 2000
+# Rows per Parquet row group, and per encoded CSV/NDJSON chunk.
+_PARQUET_ROW_GROUP = 50_000
+_TEXT_CHUNK_ROWS = 1000
+
+COLUMNS = ["id", "event_type", "user_id", "dream_id", "created_at", "meta"]
+FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_PROJECTION = {"event_type": 1, "user_id": 1, "dream_id": 1, "created_at": 1, "meta": 1}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def event_query(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_types: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if start is not None or end is not None:
+        query["created_at"] = {}
+        if start is not None:
+            query["created_at"]["$gte"] = start
+        if end is not None:
+            query["created_at"]["$lt"] = end
+    if event_types:
+        query["event_type"] = {"$in": list(event_types)}
+    return query
+
+
+def event_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(doc.get("_id")),
+        "event_type": doc.get("event_type"),
+        "user_id": doc.get("user_id"),
+        "dream_id": doc.get("dream_id"),
+        "created_at": doc.get("created_at"),
+        "meta": doc.get("meta") or {},
+    }
+
+
+def iter_event_rows(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_types: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Matching events as flat rows (COLUMNS), oldest first, fetched in batches.
+
+    Events older than the retention watermark are read back from the archive
+    files (see analytics.retention), the rest from Mongo.
+    """
+
+    start, end = archive.naive_utc(start), archive.naive_utc(end)
+    through = archive.archived_through()
+    if through is not None and (start is None or start < through):
+        yield from archive.iter_archived_rows(start, end, event_types)
+        if end is not None and end <= through:
+            return
+        start = through
+
+    collection = get_database()[_COLLECTION_NAME]
+    ensure_event_indexes()
+
+    cursor = (
+        collection.find(event_query(start, end, event_types), _PROJECTION)
+        .sort("created_at", ASCENDING)
+        .batch_size(_CURSOR_BATCH)
+    )
+    for doc in cursor:
+        yield event_row(doc)
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iso(value: Any) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+
+    for chunk in _chunks(rows, _TEXT_CHUNK_ROWS):
+        for row in chunk:
+            writer.writerow(
+                [
+                    row["id"],
+                    row["event_type"],
+                    row["user_id"],
+                    row["dream_id"],
+                    _iso(row["created_at"]),
+                    json.dumps(row["meta"], ensure_ascii=False, default=str),
+                ]
+            )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    for chunk in _chunks(rows, _TEXT_CHUNK_ROWS):
+        lines = [
+            json.dumps({**row, "created_at": _iso(row["created_at"])}, ensure_ascii=False, default=str)
+            for row in chunk
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ByteSink(io.RawIOBase):
+    """Collects what ParquetWriter writes so it can be yielded per row group."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_parquet(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """One Parquet row group per _PARQUET_ROW_GROUP rows; meta is a JSON string column."""
+
+    if pq is None:
+        raise RuntimeError("pyarrow is required for Parquet export.")
+
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("event_type", pa.string()),
+            ("user_id", pa.string()),
+            ("dream_id", pa.string()),
+            ("created_at", pa.timestamp("ms")),
+            ("meta", pa.string()),
+        ]
+    )
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for chunk in _chunks(rows, _PARQUET_ROW_GROUP):
+            columns = {name: [row[name] for row in chunk] for name in COLUMNS}
+            columns["meta"] = [json.dumps(meta, ensure_ascii=False, default=str) for meta in columns["meta"]]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_events(
+    fmt: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_types: Optional[Sequence[str]] = None,
+    gzip: bool = False,
+) -> Iterator[bytes]:
+    """Encoded export of the matching events, produced as the cursor is read.
+
+    Memory stays bounded by one cursor batch plus one encoded chunk (one row
+    group for Parquet), independent of how many events match.
+    """
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    rows = iter_event_rows(start, end, event_types)
+    if fmt == "csv":
+        chunks = iter_csv(rows)
+    elif fmt == "ndjson":
+        chunks = iter_ndjson(rows)
+    else:
+        chunks = iter_parquet(rows)
+
+    return gzip_stream(chunks) if gzip else chunks
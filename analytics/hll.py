@@ -0,0 +1,158 @@
+"""HyperLogLog sketches for approximate distinct-user counts.
+
+Each UTC day keeps one sketch of the user ids seen that day (see
+analytics.rollups). A sketch has 2**14 one-byte registers (16 KiB) and
+counts any number of distinct ids with a standard error of
+1.04 / sqrt(2**14) ~= 0.81%: about 68% of estimates fall within 0.8% of
+the exact count, 95% within 1.6% and 99.7% within 2.4%. Small counts
+(below 2.5 * 2**14) use linear counting and are nearly exact. Sketches of
+several days merge by taking the register-wise maximum, which gives the
+sketch of the union, so DAU/WAU/MAU or any other window is one merge of
+the day sketches involved.
+
+    python -m analytics.hll verify --days 30
+
+compares the estimates with exact counts from analytics_events
+(tests/test_hll.py checks the error on synthetic ids).
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+
+_HASH_BITS = 64
+_REST_BITS = _HASH_BITS - PRECISION
+_REST_MASK = (1 << _REST_BITS) - 1
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+# 2**-rank for every possible register value.
+_INVERSE_POWERS = np.ldexp(1.0, -np.arange(_REST_BITS + 2))
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _register_array(value: Union["HyperLogLog", bytes]) -> np.ndarray:
+    if isinstance(value, HyperLogLog):
+        return value.registers
+    registers = np.frombuffer(value, dtype=np.uint8)
+    if registers.size != REGISTERS:
+        raise ValueError(f"Expected {REGISTERS} registers, got {registers.size}.")
+    return registers
+
+
+class HyperLogLog:
+    """A mergeable distinct-count sketch; see the module docstring for accuracy."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytes] = None) -> None:
+        if registers is None:
+            self.registers = np.zeros(REGISTERS, dtype=np.uint8)
+        else:
+            self.registers = _register_array(registers).copy()
+
+    def add(self, value: str) -> bool:
+        """Add one id; True if the sketch changed."""
+
+        hashed = _hash64(value)
+        index = hashed >> _REST_BITS
+        rank = _REST_BITS - (hashed & _REST_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, values: Iterable[str]) -> bool:
+        changed = False
+        for value in values:
+            changed = self.add(value) or changed
+        return changed
+
+    def merge(self, other: "HyperLogLog | bytes") -> bool:
+        """Fold another sketch into this one; True if any register grew."""
+
+        theirs = _register_array(other)
+        changed = bool(np.any(theirs > self.registers))
+        if changed:
+            np.maximum(self.registers, theirs, out=self.registers)
+        return changed
+
+    def estimate(self) -> int:
+        zeros = REGISTERS - int(np.count_nonzero(self.registers))
+        harmonic = float(_INVERSE_POWERS[self.registers].sum())
+        raw = _ALPHA * REGISTERS * REGISTERS / harmonic
+
+        # 64-bit hashes make the large-range correction unnecessary.
+        if raw <= 2.5 * REGISTERS and zeros:
+            return int(round(REGISTERS * math.log(REGISTERS / zeros)))
+        return int(round(raw))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog | bytes"]) -> "HyperLogLog":
+        result = cls()
+        for sketch in sketches:
+            np.maximum(result.registers, _register_array(sketch), out=result.registers)
+        return result
+
+
+def _relative_error(estimate: int, exact: int) -> float:
+    if exact == 0:
+        return 0.0 if estimate == 0 else 1.0
+    return (estimate - exact) / exact
+
+
+def _verify(days: int) -> bool:
+    from db.mongo import get_database
+    from .rollups import active_users_since
+
+    now = datetime.utcnow()
+    today = datetime(now.year, now.month, now.day)
+    events = get_database()["analytics_events"]
+
+    ok = True
+    for window in sorted({1, 7, min(days, 30), days}):
+        since = today - timedelta(days=window - 1)
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since}, "user_id": {"$ne": None}}},
+            {"$group": {"_id": "$user_id"}},
+            {"$count": "value"},
+        ]
+        rows = list(events.aggregate(pipeline, allowDiskUse=True))
+        exact = int(rows[0]["value"]) if rows else 0
+        estimate = active_users_since(since)
+        error = _relative_error(estimate, exact)
+        within = abs(error) <= 3 * STANDARD_ERROR or abs(estimate - exact) <= 2
+        ok = ok and within
+        print(f"{window:>3}d  exact {exact:>9}  estimate {estimate:>9}  error {error:+.3%}  {'ok' if within else 'FAIL'}")
+    return ok
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check HyperLogLog active-user estimates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    verify = sub.add_parser("verify", help="Compare day-sketch estimates with exact counts from analytics_events.")
+    verify.add_argument("--days", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    print(f"precision {PRECISION}, standard error {STANDARD_ERROR:.3%}, failing beyond 3 sigma")
+    ok = _verify(args.days)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
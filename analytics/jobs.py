@@ -1,57 +1,190 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
 
 from db.mongo import get_database
-from .aggregator import (
-    get_active_users,
-    get_audio_minutes,
-    get_exports_count,
-    get_total_dreams,
-    get_total_images,
-    get_video_render_count,
-)
+from config.settings import settings
+from .events import ensure_event_indexes
+from .retention import run_retention
+from .rollups import active_users_since
 
 
+_SNAPSHOTS_COLLECTION = "analytics_daily"
+_EVENTS_COLLECTION = "analytics_events"
+_EXPORT_EVENT_TYPES = ("export_storybook", "export_comic", "export_bundle")
+
 _scheduler: Optional[BackgroundScheduler] = None
+_snapshot_indexes_ready = False
+
+
+def _day_start(when: datetime) -> datetime:
+    return datetime(when.year, when.month, when.day)
+
+
+def _dedupe_snapshots(collection) -> int:
+    """Delete all but the newest snapshot per date; returns how many went.
+
+    Snapshots written before the upsert-per-date job can repeat a date,
+    which would block the unique index.
+    """
+
+    pipeline = [
+        {"$sort": {"captured_at": DESCENDING, "_id": DESCENDING}},
+        {"$group": {"_id": "$date", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    stale = [doc_id for row in collection.aggregate(pipeline, allowDiskUse=True) for doc_id in row["ids"][1:]]
+    if not stale:
+        return 0
+    return collection.delete_many({"_id": {"$in": stale}}).deleted_count
+
+
+def _snapshots_collection():
+    global _snapshot_indexes_ready
+
+    collection = get_database()[_SNAPSHOTS_COLLECTION]
+    if not _snapshot_indexes_ready:
+        _dedupe_snapshots(collection)
+        legacy = collection.index_information().get("date_1")
+        if legacy is not None and not legacy.get("unique"):
+            collection.drop_index("date_1")
+        collection.create_index([("date", ASCENDING)], unique=True)
+        _snapshot_indexes_ready = True
+    return collection
+
+
+def _event_deltas(start: Optional[datetime], end: datetime) -> Dict[str, Dict[str, float]]:
+    """Per event type count and summed meta.duration_seconds for [start, end)."""
+
+    ensure_event_indexes()
+    created_at: Dict[str, Any] = {"$lt": end}
+    if start is not None:
+        created_at["$gte"] = start
+    pipeline = [
+        {"$match": {"created_at": created_at}},
+        {
+            "$group": {
+                "_id": "$event_type",
+                "count": {"$sum": 1},
+                "duration_seconds": {"$sum": {"$ifNull": ["$meta.duration_seconds", 0]}},
+            }
+        },
+    ]
+    return {
+        str(row["_id"]): {"count": int(row["count"]), "duration_seconds": float(row["duration_seconds"])}
+        for row in get_database()[_EVENTS_COLLECTION].aggregate(pipeline)
+    }
+
+
+def _previous_snapshot(day: datetime) -> Optional[Mapping[str, Any]]:
+    """Latest incremental snapshot before day (legacy ones lack a watermark)."""
+
+    return _snapshots_collection().find_one(
+        {"date": {"$lt": day}, "watermark": {"$exists": True}},
+        sort=[("date", DESCENDING)],
+    )
 
 
-def _take_daily_snapshot() -> None:
-    """Store a daily analytics snapshot document.
+def _take_daily_snapshot(day: Optional[datetime] = None) -> Dict[str, Any]:
+    """Upsert the snapshot for one UTC day (yesterday by default).
 
-    This is optional and does not affect the real-time metrics that are
-    computed directly from events. It can be useful for long-term trending
-    without scanning the full events collection.
+    Totals are the previous snapshot's plus the events from its watermark up
+    to the end of day, so only new events are read. The watermark records
+    that end; re-running a day recomputes it from the same base and
+    overwrites it, which makes the job safe to repeat.
     """
 
-    db = get_database()
-    collection = db["analytics_daily"]
+    if day is None:
+        day = _day_start(datetime.utcnow()) - timedelta(days=1)
+    day = _day_start(day)
+    day_end = day + timedelta(days=1)
 
-    now = datetime.utcnow()
-    day_start = datetime(now.year, now.month, now.day)
+    previous = _previous_snapshot(day)
+    base = previous or {}
+    since: Optional[datetime] = base.get("watermark")
+
+    totals: Dict[str, Dict[str, float]] = {
+        event_type: dict(values) for event_type, values in (base.get("event_totals") or {}).items()
+    }
+    deltas = _event_deltas(since, day_end)
+    for event_type, values in deltas.items():
+        current = totals.setdefault(event_type, {"count": 0, "duration_seconds": 0.0})
+        current["count"] += values["count"]
+        current["duration_seconds"] += values["duration_seconds"]
+
+    def count(event_types: Sequence[str]) -> int:
+        return int(sum(totals.get(event_type, {}).get("count", 0) for event_type in event_types))
 
     doc = {
-        "date": day_start,
-        "captured_at": now,
-        "total_dreams": get_total_dreams(),
-        "total_images": get_total_images(),
-        "audio_minutes": get_audio_minutes(),
-        "video_render_count": get_video_render_count(),
-        "exports_count": get_exports_count(),
-        "active_users_7d": get_active_users(7),
-        "active_users_30d": get_active_users(30),
+        "date": day,
+        "captured_at": datetime.utcnow(),
+        "watermark": day_end,
+        "event_totals": totals,
+        "total_dreams": count(["dream_created"]),
+        "total_images": count(["image_generated"]),
+        "audio_minutes": totals.get("audio_generated", {}).get("duration_seconds", 0.0) / 60.0,
+        "video_render_count": count(["video_rendered"]),
+        "exports_count": count(_EXPORT_EVENT_TYPES),
+        "active_users_1d": active_users_since(day, until=day_end),
+        "active_users_7d": active_users_since(day_end - timedelta(days=7), until=day_end),
+        "active_users_30d": active_users_since(day_end - timedelta(days=30), until=day_end),
     }
 
-    collection.insert_one(doc)
+    collection = _snapshots_collection()
+    try:
+        collection.update_one({"date": day}, {"$set": doc}, upsert=True)
+    except DuplicateKeyError:
+        # Another run inserted this day between our match and insert; update theirs.
+        collection.update_one({"date": day}, {"$set": doc})
+    return doc
+
+
+def catch_up_snapshots(through: Optional[datetime] = None) -> List[datetime]:
+    """Snapshot every day after the latest snapshot up to through (yesterday).
+
+    With no snapshots yet, this starts at the day of the oldest event.
+    Returns the days written.
+    """
+
+    last_day = _day_start(through) if through is not None else _day_start(datetime.utcnow()) - timedelta(days=1)
+
+    latest = _previous_snapshot(last_day + timedelta(days=1))
+    if latest is not None:
+        day = latest["date"] + timedelta(days=1)
+    else:
+        ensure_event_indexes()
+        oldest = get_database()[_EVENTS_COLLECTION].find_one({}, {"created_at": 1}, sort=[("created_at", ASCENDING)])
+        if oldest is None:
+            return []
+        day = _day_start(oldest["created_at"])
+
+    written: List[datetime] = []
+    while day <= last_day:
+        _take_daily_snapshot(day)
+        written.append(day)
+        day += timedelta(days=1)
+    return written
+
+
+def _daily_maintenance() -> None:
+    catch_up_snapshots()
+    # After the snapshots, which still read the raw events being archived.
+    if settings.analytics_retention_days > 0:
+        run_retention()
 
 
 def start_scheduler() -> None:
-    """Start a background scheduler to run the daily snapshot job.
+    """Start a background scheduler that keeps the daily snapshots current.
 
-    Call this from application startup if you want scheduled snapshots.
+    Called from application startup when ANALYTICS_SNAPSHOTS_ENABLED is set.
+    Missed days are caught up once right away and then at 00:15 UTC daily,
+    followed by archival of raw events past ANALYTICS_RETENTION_DAYS.
     """
 
     global _scheduler
@@ -59,8 +192,9 @@ def start_scheduler() -> None:
     if _scheduler is not None:
         return
 
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(_take_daily_snapshot, "cron", hour=1, minute=0)
+    scheduler = BackgroundScheduler(timezone="UTC")
+    scheduler.add_job(_daily_maintenance, "cron", hour=0, minute=15, coalesce=True, max_instances=1)
+    scheduler.add_job(_daily_maintenance, "date")
     scheduler.start()
 
     _scheduler = scheduler
@@ -70,5 +204,25 @@ def shutdown_scheduler() -> None:
     global _scheduler
 
     if _scheduler is not None:
-        _scheduler.shutdown()
+        _scheduler.shutdown(wait=False)
         _scheduler = None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Analytics daily snapshots.")
+    parser.add_argument("--day", help="Recompute a single UTC day (YYYY-MM-DD).")
+    parser.add_argument("--through", help="Catch up through this UTC day (YYYY-MM-DD); default yesterday.")
+    args = parser.parse_args(argv)
+
+    if args.day:
+        doc = _take_daily_snapshot(datetime.strptime(args.day, "%Y-%m-%d"))
+        print(f"Snapshot {doc['date']:%Y-%m-%d} written")
+        return
+
+    through = datetime.strptime(args.through, "%Y-%m-%d") if args.through else None
+    days = catch_up_snapshots(through)
+    print(f"Wrote {len(days)} snapshot(s)" + (f", {days[0]:%Y-%m-%d} to {days[-1]:%Y-%m-%d}" if days else ""))
+
+
+if __name__ == "__main__":
+    main()
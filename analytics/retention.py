@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from config.settings import settings
+from db.mongo import get_database
+from . import archive
+from .events import ensure_event_indexes
+from .export import event_row, iter_ndjson, iter_parquet
+
+try:  # Optional: zstd-compressed archives
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    zstandard = None  # type: ignore
+
+
+_EVENTS_COLLECTION = "analytics_events"
+_SNAPSHOTS_COLLECTION = "analytics_daily"
+_META_COLLECTION = "analytics_meta"
+_LEASE_ID = "retention_lease"
+# Renewed after every archived day, so only a stalled run loses the lease.
+_LEASE_SECONDS = 30 * 60
+
+
+def _day_start(when: datetime) -> datetime:
+    return datetime(when.year, when.month, when.day)
+
+
+def _archived_ids(day: datetime) -> Set[str]:
+    """Ids already written to this day's archive parts (by an interrupted run)."""
+
+    ids: Set[str] = set()
+    for path in archive.day_parts(day):
+        for row in archive.iter_part_rows(path):
+            ids.add(row["id"])
+    return ids
+
+
+def _write_part(day: datetime, rows: Iterator[Dict[str, Any]], fmt: str) -> Path:
+    """Write rows to a new part of day's archive and return its path.
+
+    The part is written under a unique temporary name, then hard-linked to
+    the next free part number. Linking fails instead of replacing an
+    existing file, so a concurrent writer's part is never overwritten.
+    """
+
+    directory = archive.day_dir(day)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f".events-{day:%Y-%m-%d}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "wb") as raw:
+            if fmt == "parquet":
+                for chunk in iter_parquet(rows):
+                    raw.write(chunk)
+            elif fmt == "zstd":
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as out:
+                    for chunk in iter_ndjson(rows):
+                        out.write(chunk)
+            else:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                    for chunk in iter_ndjson(rows):
+                        out.write(chunk)
+            raw.flush()
+            os.fsync(raw.fileno())
+        while True:
+            path = archive.next_part_path(day, fmt)
+            try:
+                os.link(tmp, path)
+                return path
+            except FileExistsError:
+                continue  # another writer took this number
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _delete(ids: List[Any], batch_size: int) -> int:
+    collection = get_database()[_EVENTS_COLLECTION]
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        deleted += collection.delete_many({"_id": {"$in": ids[start : start + batch_size]}}).deleted_count
+    return deleted
+
+
+def archive_day(day: datetime, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Move one UTC day of raw events from Mongo into a new archive part.
+
+    The part is written and fsynced before anything is deleted, and only the
+    ids that made it into an archive file are deleted (in batches). If an
+    earlier run died between the two steps, the events it already archived
+    are deleted without being written twice.
+    """
+
+    batch_size = batch_size or settings.analytics_retention_batch_size
+    day = _day_start(day)
+    day_end = day + timedelta(days=1)
+
+    collection = get_database()[_EVENTS_COLLECTION]
+    already = _archived_ids(day)
+    to_delete: List[Any] = []
+    written = 0
+
+    def rows() -> Iterator[Dict[str, Any]]:
+        nonlocal written
+        cursor = (
+            collection.find({"created_at": {"$gte": day, "$lt": day_end}})
+            .sort("created_at", ASCENDING)
+            .batch_size(2000)
+        )
+        for doc in cursor:
+            to_delete.append(doc["_id"])
+            if str(doc["_id"]) in already:
+                continue
+            written += 1
+            yield event_row(doc)
+
+    fmt = archive.archive_format()
+    path: Optional[Path] = None
+    pending = rows()
+    first = next(pending, None)
+    if first is not None:
+
+        def with_first() -> Iterator[Dict[str, Any]]:
+            yield first
+            yield from pending
+
+        path = _write_part(day, with_first(), fmt)
+    else:
+        # Nothing new (or only leftovers of an interrupted run): just drain.
+        for _ in pending:
+            pass
+
+    deleted = _delete(to_delete, batch_size)
+    return {"day": day, "archived": written, "deleted": deleted, "file": str(path) if path is not None else None}
+
+
+def _latest_snapshot_watermark() -> Optional[datetime]:
+    doc = get_database()[_SNAPSHOTS_COLLECTION].find_one(
+        {"watermark": {"$exists": True}}, sort=[("date", DESCENDING)]
+    )
+    return doc["watermark"] if doc else None
+
+
+def _acquire_lease(owner: str) -> bool:
+    """Take or renew the retention lease; False while another run holds it."""
+
+    now = datetime.utcnow()
+    try:
+        get_database()[_META_COLLECTION].find_one_and_update(
+            {"_id": _LEASE_ID, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=_LEASE_SECONDS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def _release_lease(owner: str) -> None:
+    get_database()[_META_COLLECTION].delete_one({"_id": _LEASE_ID, "owner": owner})
+
+
+def run_retention(days: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Archive and delete every whole UTC day older than the retention window.
+
+    Days are handled oldest first and the analytics_meta watermark advances
+    after each one, so an interrupted run resumes where it stopped. Days not
+    yet covered by a daily snapshot (analytics.jobs) are left alone, since
+    snapshots read raw events. Rollups are maintained at write time and are
+    unaffected. A lease in analytics_meta keeps concurrent runs (several app
+    processes, or the CLI next to the scheduler) from archiving the same
+    days; a run that finds it taken does nothing.
+    """
+
+    days = settings.analytics_retention_days if days is None else days
+    if days <= 0:
+        return []
+
+    cutoff = _day_start(datetime.utcnow()) - timedelta(days=days)
+    if settings.analytics_snapshots_enabled:
+        snapshot_watermark = _latest_snapshot_watermark()
+        if snapshot_watermark is None:
+            return []
+        cutoff = min(cutoff, snapshot_watermark)
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    if not _acquire_lease(owner):
+        return []
+
+    try:
+        ensure_event_indexes()
+        oldest = get_database()[_EVENTS_COLLECTION].find_one(
+            {"created_at": {"$lt": cutoff}}, {"created_at": 1}, sort=[("created_at", ASCENDING)]
+        )
+
+        results: List[Dict[str, Any]] = []
+        if oldest is not None:
+            day = _day_start(oldest["created_at"])
+            while day < cutoff:
+                if not _acquire_lease(owner):
+                    return results  # lease expired and was taken over
+                results.append(archive_day(day))
+                day += timedelta(days=1)
+                archive.set_archived_through(day)
+
+        # Nothing older than cutoff remains in Mongo.
+        archive.set_archived_through(cutoff)
+        return results
+    finally:
+        _release_lease(owner)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive and delete old raw analytics events.")
+    parser.add_argument("--days", type=int, help="Keep this many days in Mongo (default ANALYTICS_RETENTION_DAYS).")
+    args = parser.parse_args(argv)
+
+    results = run_retention(args.days)
+    for result in results:
+        print(f"{result['day']:%Y-%m-%d}: archived {result['archived']}, deleted {result['deleted']}")
+    print(f"Processed {len(results)} day(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from db.mongo import get_database
+from . import archive
+from .hll import HyperLogLog
+
+
+_EVENTS_COLLECTION = "analytics_events"
+_ROLLUPS_COLLECTION = "analytics_rollups"
+_REBUILD_COLLECTION = "analytics_rollups_rebuild"
+
+GRANULARITIES = ("hour", "day", "total")
+# Per-day HyperLogLog sketch of user ids, for active-user counts.
+_DAY_USERS = "day_users_hll"
+_SKETCH_CAS_ATTEMPTS = 20
+# Rebuild passes over events logged meanwhile before giving up and swapping.
+_CATCH_UP_PASSES = 5
+
+_indexes_ready = False
+
+
+def _rollups_collection(name: str = _ROLLUPS_COLLECTION):
+    return get_database()[name]
+
+
+def _ensure_indexes(collection) -> None:
+    global _indexes_ready
+
+    live = collection.name == _ROLLUPS_COLLECTION
+    if live and _indexes_ready:
+        return
+    collection.create_index([("granularity", ASCENDING), ("event_type", ASCENDING), ("bucket", ASCENDING)])
+    if live:
+        _indexes_ready = True
+
+
+def bucket_start(when: datetime, granularity: str) -> Optional[datetime]:
+    if granularity == "hour":
+        return when.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return None
+
+
+def rollup_id(granularity: str, event_type: str, bucket: Optional[datetime]) -> str:
+    if bucket is None:
+        return f"{granularity}|{event_type}"
+    return f"{granularity}|{event_type}|{bucket.isoformat()}"
+
+
+def _duration_seconds(event: Mapping[str, Any]) -> float:
+    meta = event.get("meta") or {}
+    try:
+        return float(meta.get("duration_seconds") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Accumulator:
+    """Folds a batch of events into one $inc per rollup document."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, str, Optional[datetime]], List[float]] = defaultdict(lambda: [0, 0.0])
+        self.users: Dict[datetime, Set[str]] = defaultdict(set)
+
+    def add(self, event: Mapping[str, Any]) -> None:
+        created_at: datetime = event["created_at"]
+        event_type = str(event["event_type"])
+        seconds = _duration_seconds(event)
+
+        for granularity in GRANULARITIES:
+            counter = self.counters[(granularity, event_type, bucket_start(created_at, granularity))]
+            counter[0] += 1
+            counter[1] += seconds
+
+        user_id = event.get("user_id")
+        if user_id is not None:
+            self.users[bucket_start(created_at, "day")].add(str(user_id))
+
+    def sketches(self) -> Dict[datetime, HyperLogLog]:
+        sketches: Dict[datetime, HyperLogLog] = {}
+        for day, users in self.users.items():
+            sketch = HyperLogLog()
+            sketch.update(users)
+            sketches[day] = sketch
+        return sketches
+
+    def operations(self) -> List[UpdateOne]:
+        ops: List[UpdateOne] = []
+        for (granularity, event_type, bucket), (count, seconds) in self.counters.items():
+            inc: Dict[str, Any] = {"count": count}
+            if seconds:
+                inc["duration_seconds"] = seconds
+            ops.append(
+                UpdateOne(
+                    {"_id": rollup_id(granularity, event_type, bucket)},
+                    {
+                        "$inc": inc,
+                        "$setOnInsert": {"granularity": granularity, "event_type": event_type, "bucket": bucket},
+                    },
+                    upsert=True,
+                )
+            )
+        return ops
+
+
+def _merge_sketch(collection, day: datetime, sketch: HyperLogLog) -> None:
+    """Max-merge sketch into the stored one for day (compare-and-swap on version)."""
+
+    doc_id = rollup_id(_DAY_USERS, "*", day)
+    for _ in range(_SKETCH_CAS_ATTEMPTS):
+        current = collection.find_one({"_id": doc_id}, {"registers": 1, "version": 1})
+        if current is None:
+            try:
+                collection.insert_one(
+                    {
+                        "_id": doc_id,
+                        "granularity": _DAY_USERS,
+                        "event_type": "*",
+                        "bucket": day,
+                        "registers": Binary(sketch.to_bytes()),
+                        "version": 1,
+                    }
+                )
+                return
+            except DuplicateKeyError:
+                continue
+
+        merged = HyperLogLog(current["registers"])
+        if not merged.merge(sketch):
+            return  # nothing new for this day
+        result = collection.update_one(
+            {"_id": doc_id, "version": current["version"]},
+            {"$set": {"registers": Binary(merged.to_bytes())}, "$inc": {"version": 1}},
+        )
+        if result.matched_count:
+            return
+
+    raise RuntimeError(f"Could not update the active-user sketch for {day:%Y-%m-%d}: too much contention.")
+
+
+class RollupBatch:
+    """The rollup writes for one batch of events, applied step by step.
+
+    Writes that succeeded are forgotten, so calling apply() again after a
+    failure only repeats what did not land: the counter updates the bulk
+    write reported as failed (all of them if it raised anything else), and
+    the day sketches not merged yet. A counter $inc is never sent twice
+    once acknowledged.
+    """
+
+    def __init__(self, events: Iterable[Mapping[str, Any]]) -> None:
+        acc = _Accumulator()
+        self.size = 0
+        for event in events:
+            acc.add(event)
+            self.size += 1
+        self.days: Set[datetime] = {bucket for (granularity, _, bucket) in acc.counters if granularity == "day"}
+        self.ops = acc.operations()
+        self.sketches = acc.sketches()
+        self.touched = len(self.ops) + len(self.sketches)
+
+    @property
+    def done(self) -> bool:
+        return not self.ops and not self.sketches
+
+    def apply(self, collection_name: str = _ROLLUPS_COLLECTION) -> None:
+        if self.done:
+            return
+        collection = _rollups_collection(collection_name)
+        _ensure_indexes(collection)
+
+        if self.ops:
+            try:
+                collection.bulk_write(self.ops, ordered=False)
+            except BulkWriteError as exc:
+                failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+                self.ops = [op for index, op in enumerate(self.ops) if index in failed]
+                raise
+            self.ops = []
+
+        for day in list(self.sketches):
+            _merge_sketch(collection, day, self.sketches[day])
+            del self.sketches[day]
+
+
+def apply_rollups(events: Iterable[Mapping[str, Any]], collection_name: str = _ROLLUPS_COLLECTION) -> int:
+    """$inc the hour/day/total rollups for a batch of raw events.
+
+    User ids are folded into each day's HyperLogLog sketch. Returns the
+    number of rollup documents touched.
+    """
+
+    batch = RollupBatch(events)
+    batch.apply(collection_name)
+    return batch.touched
+
+
+def total(event_types: Sequence[str], field: str = "count") -> float:
+    ids = [rollup_id("total", event_type, None) for event_type in event_types]
+    docs = _rollups_collection().find({"_id": {"$in": ids}}, {field: 1})
+    return float(sum(doc.get(field, 0) or 0 for doc in docs))
+
+
+def series(
+    event_types: Sequence[str],
+    granularity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    field: str = "count",
+) -> Dict[datetime, float]:
+    """Summed rollup values per bucket for the given event types."""
+
+    query: Dict[str, Any] = {"granularity": granularity, "event_type": {"$in": list(event_types)}}
+    if start is not None or end is not None:
+        query["bucket"] = {}
+        if start is not None:
+            query["bucket"]["$gte"] = start
+        if end is not None:
+            query["bucket"]["$lt"] = end
+
+    values: Dict[datetime, float] = defaultdict(float)
+    for doc in _rollups_collection().find(query, {"bucket": 1, field: 1}):
+        values[doc["bucket"]] += float(doc.get(field, 0) or 0)
+    return dict(sorted(values.items()))
+
+
+def active_users_since(since: datetime, until: Optional[datetime] = None) -> int:
+    """Distinct users with events on any day from since's day onwards (before until).
+
+    Estimated by merging the day sketches; see analytics.hll for the error bound.
+    """
+
+    bucket: Dict[str, Any] = {"$gte": bucket_start(since, "day")}
+    if until is not None:
+        bucket["$lt"] = until
+    docs = _rollups_collection().find({"granularity": _DAY_USERS, "bucket": bucket}, {"registers": 1})
+    return HyperLogLog.union(doc["registers"] for doc in docs).estimate()
+
+
+def overview(active_since: Mapping[str, datetime]) -> Dict[str, Any]:
+    """All-time totals per event type plus active-user counts, in one round trip.
+
+    active_since maps a name (e.g. "7d") to the start of its window. A
+    single $facet aggregation over the indexed total and day sketch
+    documents fetches everything; the windows' sketches are merged here.
+    """
+
+    days = {name: bucket_start(since, "day") for name, since in active_since.items()}
+    facets: Dict[str, Any] = {
+        "totals": [
+            {"$match": {"granularity": "total"}},
+            {
+                "$project": {
+                    "event_type": 1,
+                    "count": {"$ifNull": ["$count", 0]},
+                    "duration_seconds": {"$ifNull": ["$duration_seconds", 0]},
+                }
+            },
+        ],
+    }
+    if days:
+        facets["sketches"] = [
+            {"$match": {"granularity": _DAY_USERS}},
+            {"$project": {"bucket": 1, "registers": 1}},
+        ]
+
+    match: Dict[str, Any] = {"granularity": "total"}
+    if days:
+        match = {"$or": [match, {"granularity": _DAY_USERS, "bucket": {"$gte": min(days.values())}}]}
+
+    rows = list(_rollups_collection().aggregate([{"$match": match}, {"$facet": facets}]))
+    row = rows[0] if rows else {}
+
+    totals = {
+        doc["event_type"]: {"count": doc["count"], "duration_seconds": float(doc["duration_seconds"])}
+        for doc in row.get("totals", [])
+    }
+    sketches = row.get("sketches") or []
+    active = {
+        name: HyperLogLog.union(doc["registers"] for doc in sketches if doc["bucket"] >= day).estimate()
+        for name, day in days.items()
+    }
+    return {"totals": totals, "active": active}
+
+
+def _last_event_id(events) -> Optional[ObjectId]:
+    doc = events.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+    return doc["_id"] if doc else None
+
+
+def _id_range(after: Optional[ObjectId], upto: ObjectId, through: Optional[datetime]) -> Dict[str, Any]:
+    """Events inserted after the after watermark up to upto, minus archived ones."""
+
+    ids: Dict[str, Any] = {"$lte": upto}
+    if after is not None:
+        ids["$gt"] = after
+    query: Dict[str, Any] = {"_id": ids}
+    if through is not None:
+        query["created_at"] = {"$gte": through}
+    return query
+
+
+def rebuild_rollups(batch_size: int = 5000) -> int:
+    """Recompute all rollups from the raw events and swap them in.
+
+    Archived events (see analytics.retention) are replayed first, then
+    analytics_events, into a scratch collection which then replaces the
+    live one. Live events are read in _id (insertion) order up to a
+    watermark, so events logged late with an old created_at are still
+    picked up and none is replayed twice. Short catch-up passes move the
+    watermark forward to just before the rename; only an event whose
+    rollup is written at the instant of the swap can be missed or doubled.
+    Returns the number of events read.
+    """
+
+    db = get_database()
+    events = db[_EVENTS_COLLECTION]
+    db.drop_collection(_REBUILD_COLLECTION)
+
+    through = archive.archived_through()
+    processed = _replay(archive.iter_archived_rows(), batch_size)
+
+    watermark: Optional[ObjectId] = None
+    for _ in range(_CATCH_UP_PASSES):
+        upto = _last_event_id(events)
+        if upto is None or upto == watermark:
+            break
+        replayed = _replay(events.find(_id_range(watermark, upto, through)).sort("_id", ASCENDING), batch_size)
+        processed += replayed
+        watermark = upto
+        if replayed < batch_size:
+            break  # caught up closely enough to swap
+
+    if _REBUILD_COLLECTION in db.list_collection_names():
+        db[_REBUILD_COLLECTION].rename(_ROLLUPS_COLLECTION, dropTarget=True)
+    else:  # no events at all
+        db.drop_collection(_ROLLUPS_COLLECTION)
+    return processed
+
+
+def _replay(cursor, batch_size: int, collection_name: str = _REBUILD_COLLECTION) -> int:
+    count = 0
+    batch: List[Mapping[str, Any]] = []
+    for event in cursor:
+        if "created_at" not in event or "event_type" not in event:
+            continue
+        batch.append(event)
+        if len(batch) >= batch_size:
+            apply_rollups(batch, collection_name)
+            count += len(batch)
+            batch = []
+    if batch:
+        apply_rollups(batch, collection_name)
+        count += len(batch)
+    return count
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Analytics rollup maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="Rebuild analytics_rollups from raw analytics_events.")
+    backfill.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        started = datetime.utcnow()
+        processed = rebuild_rollups(batch_size=args.batch_size)
+        elapsed = (datetime.utcnow() - started) / timedelta(seconds=1)
+        print(f"Rebuilt rollups from {processed} events in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
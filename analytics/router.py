@@ -1,29 +1,25 @@
 from __future__ import annotations
 
-import json
-from io import StringIO
-from typing import Any, Dict, List
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-import pandas as pd
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from db.mongo import get_database
-from .aggregator import (
-    get_active_users,
-    get_audio_minutes,
-    get_exports_count,
-    get_timeseries,
-    get_top_models,
-    get_total_dreams,
-    get_total_images,
-    get_video_render_count,
-)
+from config.settings import settings
+from .aggregator import get_overview, get_timeseries, get_top_models
+from .archive import naive_utc
+from .cache import TTLCache
+from .export import FORMATS, MEDIA_TYPES, parquet_available, stream_events
+from .sink import get_event_sink
 
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+_overview_cache = TTLCache(settings.analytics_overview_ttl_seconds)
+
 
 class OverviewResponse(BaseModel):
     total_dreams: int
@@ -31,8 +27,12 @@ class OverviewResponse(BaseModel):
     audio_minutes: float
     video_render_count: int
     exports_count: int
+    # Active users are HyperLogLog estimates (~0.8% standard error).
+    active_users_1d: int
     active_users_7d: int
     active_users_30d: int
+    # Seconds since these numbers were computed (0 for a fresh computation).
+    cache_age_seconds: float
 
 
 class TimeseriesPoint(BaseModel):
@@ -42,6 +42,8 @@ class TimeseriesPoint(BaseModel):
 
 class TimeseriesResponse(BaseModel):
     metric: str
+    granularity: str
+    timezone: str
     points: List[TimeseriesPoint]
 
 
@@ -56,26 +58,26 @@ class TopModelsResponse(BaseModel):
 
 @router.get("/overview", response_model=OverviewResponse)
 async def analytics_overview() -> OverviewResponse:
-    return OverviewResponse(
-        total_dreams=get_total_dreams(),
-        total_images=get_total_images(),
-        audio_minutes=get_audio_minutes(),
-        video_render_count=get_video_render_count(),
-        exports_count=get_exports_count(),
-        active_users_7d=get_active_users(7),
-        active_users_30d=get_active_users(30),
-    )
+    # Concurrent dashboard loads share one computation (see TTLCache).
+    overview, age = await run_in_threadpool(_overview_cache.get, "overview", get_overview)
+    return OverviewResponse(**overview, cache_age_seconds=round(age, 3))
 
 
 @router.get("/timeseries", response_model=TimeseriesResponse)
-async def analytics_timeseries(metric: str = Query(..., description="Metric name, e.g. dreams, images, audio_minutes")) -> TimeseriesResponse:
+async def analytics_timeseries(
+    metric: str = Query(..., description="Metric name, e.g. dreams, images, audio_minutes"),
+    start: Optional[datetime] = Query(None, description="Range start; naive values are read in `timezone`"),
+    end: Optional[datetime] = Query(None, description="Range end (exclusive), defaults to now"),
+    granularity: str = Query("day", description="hour, day or week"),
+    timezone: str = Query("UTC", description="IANA zone the buckets are aligned to, e.g. Asia/Kolkata"),
+) -> TimeseriesResponse:
     try:
-        rows = get_timeseries(metric)
-    except ValueError as exc:  # unsupported metric
+        rows = await run_in_threadpool(get_timeseries, metric, start, end, granularity, timezone)
+    except ValueError as exc:  # unsupported metric, granularity, zone or range
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     points = [TimeseriesPoint(**row) for row in rows]
-    return TimeseriesResponse(metric=metric, points=points)
+    return TimeseriesResponse(metric=metric, granularity=granularity, timezone=timezone, points=points)
 
 
 @router.get("/top-models", response_model=TopModelsResponse)
@@ -84,43 +86,63 @@ async def analytics_top_models(limit: int = Query(5, ge=1, le=50)) -> TopModelsR
     return TopModelsResponse(models=[TopModel(**row) for row in rows])
 
 
-@router.get("/export/csv")
-async def analytics_export_csv() -> StreamingResponse:
-    """Export raw analytics_events as a CSV file.
+@router.get("/ingest-stats")
+async def analytics_ingest_stats() -> Dict[str, Any]:
+    """Event buffer depth and accepted/flushed/dropped/failed counters."""
+
+    return get_event_sink().snapshot()
+
+
+def _export_response(
+    fmt: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    event_types: Optional[List[str]],
+    gzip: bool,
+) -> StreamingResponse:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow on the server.")
+    if fmt == "parquet" and gzip:
+        raise HTTPException(status_code=400, detail="Parquet files are already compressed; gzip is not supported.")
+    # Query params ending in Z parse as aware, others as naive; compare both as naive UTC.
+    start, end = naive_utc(start), naive_utc(end)
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+
+    filename = f"analytics_events.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_events(fmt, start=start, end=end, event_types=event_types, gzip=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
 
-    This is intended for internal analysis. It limits the number of rows to
-    avoid exporting an unbounded dataset.
+@router.get("/export")
+async def analytics_export(
+    format: str = Query("csv", description="csv, ndjson or parquet"),
+    start: Optional[datetime] = Query(None, description="Only events at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only events before this time (UTC)"),
+    event_type: Optional[List[str]] = Query(None, description="Repeat to select several event types"),
+    gzip: bool = Query(False),
+) -> StreamingResponse:
+    """Stream raw analytics_events, oldest first.
+
+    Rows are encoded while the cursor is read, so memory use does not depend
+    on how many events match and there is no row limit.
     """
 
-    db = get_database()
-    collection = db["analytics_events"]
-
-    cursor = collection.find().limit(10000)
-
-    rows: List[Dict[str, Any]] = []
-    for doc in cursor:
-        rows.append(
-            {
-                "id": str(doc.get("_id")),
-                "event_type": doc.get("event_type"),
-                "user_id": doc.get("user_id"),
-                "dream_id": doc.get("dream_id"),
-                "created_at": doc.get("created_at"),
-                "meta": json.dumps(doc.get("meta") or {}, ensure_ascii=False),
-            }
-        )
-
-    if not rows:
-        df = pd.DataFrame(columns=["id", "event_type", "user_id", "dream_id", "created_at", "meta"])
-    else:
-        df = pd.DataFrame(rows)
-
-    buffer = StringIO()
-    df.to_csv(buffer, index=False)
-    buffer.seek(0)
+    return _export_response(format, start, end, event_type, gzip)
 
-    return StreamingResponse(
-        buffer,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=analytics_events.csv"},
-    )
+
+@router.get("/export/csv")
+async def analytics_export_csv(
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    event_type: Optional[List[str]] = Query(None),
+    gzip: bool = Query(False),
+) -> StreamingResponse:
+    """Export raw analytics_events as a CSV file (see /export for other formats)."""
+
+    return _export_response("csv", start, end, event_type, gzip)
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from time import monotonic
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from pymongo.errors import BulkWriteError
+
+from config.settings import settings
+from db.mongo import get_database
+from .rollups import RollupBatch, apply_rollups
+
+
+_COLLECTION_NAME = "analytics_events"
+
+
+def insert_events(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert raw events; returns the ones that were stored.
+
+    With an unordered insert_many some documents can fail while the rest
+    are written; only the failed ones are left out of the result.
+    """
+
+    if not docs:
+        return []
+    try:
+        get_database()[_COLLECTION_NAME].insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+        return [doc for index, doc in enumerate(docs) if index not in failed]
+    return docs
+
+
+def write_events(docs: List[Dict[str, Any]]) -> None:
+    """Insert raw events and fold them into the rollups."""
+
+    apply_rollups(insert_events(docs))
+
+
+class EventSink:
+    """In-memory event buffer drained by a background thread.
+
+    Events are written with insert_many once batch_size of them are queued
+    or flush_seconds have passed, whichever comes first. When the buffer is
+    full, submit() waits up to block_seconds for room and then drops the
+    event, so a slow or unreachable database never stalls a request for
+    longer than that; with block=False (used on the event loop) it drops
+    right away.
+
+    Storing an event and rolling it up are separate steps. If the rollup
+    writes fail after the insert succeeded, the ones that did not land
+    (see RollupBatch) are retried before the next batch. Once more than
+    max_buffer events are waiting, the oldest batches are given up and
+    their days reported as stale_rollup_days until
+    `python -m analytics.rollups backfill` runs.
+    """
+
+    def __init__(
+        self,
+        max_buffer: int,
+        batch_size: int,
+        flush_seconds: float,
+        block_seconds: float,
+    ) -> None:
+        self._max_buffer = max(max_buffer, 1)
+        self._batch_size = max(batch_size, 1)
+        self._flush_seconds = max(flush_seconds, 0.01)
+        self._block_seconds = max(block_seconds, 0.0)
+
+        self._cond = threading.Condition()
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        # Rollups of stored events that still have to be written.
+        self._unrolled: Deque[RollupBatch] = deque()
+        self._rollup_pending = 0
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._accepted = 0
+        self._flushed = 0
+        self._dropped = 0
+        self._failed = 0
+        self._rollup_failed = 0
+        self._rollup_dropped = 0
+        self._stale_days: Set[str] = set()
+        self._batches = 0
+        self._last_error: Optional[str] = None
+        self._last_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="analytics-sink", daemon=True)
+            self._thread.start()
+
+    def submit(self, doc: Dict[str, Any], block: bool = True) -> bool:
+        """Queue one event; False if it was dropped because the buffer stayed full."""
+
+        with self._cond:
+            if len(self._buffer) >= self._max_buffer:
+                deadline = monotonic() + (self._block_seconds if block else 0.0)
+                while len(self._buffer) >= self._max_buffer:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0 or self._stopping:
+                        self._dropped += 1
+                        return False
+                    self._cond.wait(remaining)
+
+            self._buffer.append(doc)
+            self._accepted += 1
+            if len(self._buffer) >= self._batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        count = min(len(self._buffer), self._batch_size)
+        batch = [self._buffer.popleft() for _ in range(count)]
+        # Wake producers blocked on a full buffer.
+        self._cond.notify_all()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = monotonic() + self._flush_seconds
+                while not self._stopping and len(self._buffer) < self._batch_size:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+                batch = self._take_batch()
+
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._write_lock:
+            self._retry_rollups()
+            if not batch:
+                return
+
+            started = monotonic()
+            try:
+                stored = insert_events(batch)
+            except Exception as exc:  # analytics must never take the app down
+                self._record_error(exc, failed=len(batch))
+                return
+
+            if len(stored) < len(batch):
+                with self._cond:
+                    self._failed += len(batch) - len(stored)
+            if stored:
+                self._roll_up(RollupBatch(stored))
+
+            with self._cond:
+                self._flushed += len(stored)
+                self._batches += 1
+                self._last_flush_seconds = round(monotonic() - started, 4)
+
+    def _roll_up(self, rollups: RollupBatch) -> None:
+        """Write a batch's rollups, keeping what did not land for a retry."""
+
+        try:
+            rollups.apply()
+        except Exception as exc:
+            self._record_error(exc, rollup_failed=rollups.size)
+            self._unrolled.append(rollups)
+            with self._cond:
+                self._rollup_pending += rollups.size
+            self._give_up_overflow()
+
+    def _retry_rollups(self) -> None:
+        while self._unrolled:
+            try:
+                self._unrolled[0].apply()
+            except Exception as exc:
+                self._record_error(exc)
+                return  # still failing; try again on the next write
+            done = self._unrolled.popleft()
+            with self._cond:
+                self._rollup_pending -= done.size
+
+    def _give_up_overflow(self) -> None:
+        while len(self._unrolled) > 1 and self._rollup_pending > self._max_buffer:
+            given_up = self._unrolled.popleft()
+            with self._cond:
+                self._rollup_pending -= given_up.size
+                self._rollup_dropped += given_up.size
+                self._stale_days.update(f"{day:%Y-%m-%d}" for day in given_up.days)
+
+    def _record_error(self, exc: Exception, failed: int = 0, rollup_failed: int = 0) -> None:
+        with self._cond:
+            self._failed += failed
+            self._rollup_failed += rollup_failed
+            self._last_error = f"{type(exc).__name__}: {exc}"
+
+    def flush(self) -> None:
+        """Write everything queued so far from the calling thread."""
+
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            self._write(batch)
+            if not batch:
+                return
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the background thread and write out whatever is still queued."""
+
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+        self.flush()
+        with self._cond:
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "running": self._thread is not None,
+                "buffered": len(self._buffer),
+                "max_buffer": self._max_buffer,
+                "batch_size": self._batch_size,
+                "flush_seconds": self._flush_seconds,
+                "accepted": self._accepted,
+                "flushed": self._flushed,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "rollup_pending": self._rollup_pending,
+                "rollup_failed": self._rollup_failed,
+                "rollup_dropped": self._rollup_dropped,
+                "stale_rollup_days": sorted(self._stale_days),
+                "batches": self._batches,
+                "last_flush_seconds": self._last_flush_seconds,
+                "last_error": self._last_error,
+            }
+
+
+_sink = EventSink(
+    max_buffer=settings.analytics_buffer_size,
+    batch_size=settings.analytics_batch_size,
+    flush_seconds=settings.analytics_flush_seconds,
+    block_seconds=settings.analytics_block_seconds,
+)
+
+
+def get_event_sink() -> EventSink:
+    return _sink
+
+
+def start_event_sink() -> None:
+    _sink.start()
+
+
+def stop_event_sink() -> None:
+    _sink.stop()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+GRANULARITIES = ("hour", "day", "week")
+MAX_BUCKETS = 2000
+
+# Range used when the caller gives no start.
+_DEFAULT_SPAN = {
+    "hour": timedelta(hours=48),
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=26),
+}
+
+
+def resolve_zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise ValueError(f"Unknown timezone: {name}") from exc
+
+
+def to_utc(value: datetime, tz: ZoneInfo) -> datetime:
+    """Naive UTC (as stored in Mongo); naive input is read as wall time in tz."""
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _truncate_local(local: datetime, granularity: str) -> datetime:
+    local = local.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return local
+    local = local.replace(hour=0)
+    if granularity == "week":
+        local -= timedelta(days=local.weekday())  # weeks start on Monday
+    return local
+
+
+def _wall_to_utc(wall: datetime, tz: ZoneInfo) -> datetime:
+    return wall.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Buckets:
+    """The buckets of [start, end) for one granularity in one timezone.
+
+    starts holds each bucket's first instant as naive UTC, labels the string
+    the API reports for it (local date, or local ISO time for hours).
+    """
+
+    def __init__(self, starts: List[datetime], labels: List[str], end: datetime, tz: ZoneInfo) -> None:
+        self.starts = starts
+        self.labels = labels
+        self.end = end
+        self.tz = tz
+
+    @property
+    def start(self) -> datetime:
+        return self.starts[0]
+
+    def index_of(self, instant: datetime) -> Optional[int]:
+        """Bucket containing a naive UTC instant, or None outside the range."""
+
+        if instant < self.starts[0] or instant >= self.end:
+            return None
+        return bisect_right(self.starts, instant) - 1
+
+    def aligned_to(self, unit: timedelta) -> bool:
+        """True if every bucket boundary's UTC offset is a multiple of unit.
+
+        With unit = 1 hour, each UTC hour falls entirely inside one bucket,
+        so hourly rollups regroup exactly; with 1 day (offset 0) the daily
+        rollups do.
+        """
+
+        for instant in (*self.starts, self.end):
+            offset = instant.replace(tzinfo=timezone.utc).astimezone(self.tz).utcoffset() or timedelta(0)
+            if offset % unit:
+                return False
+        return True
+
+    def fill(self, values: Dict[int, float]) -> List[Tuple[str, float]]:
+        return [(label, float(values.get(index, 0.0))) for index, label in enumerate(self.labels)]
+
+
+def make_buckets(
+    granularity: str,
+    tz_name: str = "UTC",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+) -> Buckets:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    tz = resolve_zone(tz_name)
+    end_utc = to_utc(end, tz) if end is not None else (now or datetime.utcnow())
+    start_utc = to_utc(start, tz) if start is not None else end_utc - _DEFAULT_SPAN[granularity]
+    if end_utc <= start_utc:
+        raise ValueError("end must be after start.")
+
+    local_start = start_utc.replace(tzinfo=timezone.utc).astimezone(tz)
+    wall = _truncate_local(local_start, granularity)
+
+    starts: List[datetime] = []
+    labels: List[str] = []
+    if granularity == "hour":
+        # Step in absolute time so DST changes neither skip nor repeat hours.
+        instant = _wall_to_utc(wall, tz)
+        while instant < end_utc:
+            starts.append(instant)
+            labels.append(instant.replace(tzinfo=timezone.utc).astimezone(tz).isoformat())
+            instant += timedelta(hours=1)
+            if len(starts) > MAX_BUCKETS:
+                break
+    else:
+        step = timedelta(days=7 if granularity == "week" else 1)
+        while True:
+            instant = _wall_to_utc(wall, tz)
+            if instant >= end_utc:
+                break
+            starts.append(instant)
+            labels.append(wall.date().isoformat())
+            wall += step
+            if len(starts) > MAX_BUCKETS:
+                break
+
+    if len(starts) > MAX_BUCKETS:
+        raise ValueError(f"Range too large: more than {MAX_BUCKETS} {granularity} buckets.")
+    return Buckets(starts, labels, end_utc, tz)
+
+
+def bucket_values(buckets: Buckets, points: Sequence[Tuple[datetime, float]]) -> Dict[int, float]:
+    """Sum (naive UTC instant, value) points into their buckets."""
+
+    values: Dict[int, float] = {}
+    for instant, value in points:
+        index = buckets.index_of(instant)
+        if index is not None:
+            values[index] = values.get(index, 0.0) + value
+    return values
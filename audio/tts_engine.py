@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import hashlib
 import os
 from pathlib import Path
 from time import time
-from typing import Optional
 
 from gtts import gTTS
 
+from .voice_styles import apply_voice_style, get_voice_style
+
 
 _TTS_CACHE: dict[tuple[str, str], str] = {}
 
@@ -26,21 +28,7 @@ def _get_gtts_language_code(language: str) -> str:
     return lang_map[key]
 
 
-def generate_tts(
-    text: str,
-    language: str,
-    voice_style: str = "default",
-    output_dir: str = "generated_audio",
-) -> str:
-    """Generate TTS audio for a given text and language.
-
-    Returns the absolute path to a WAV file.
-    """
-
-    cleaned = text.strip()
-    if not cleaned:
-        raise ValueError("Text is empty")
-
+def _generate_base_tts(cleaned: str, language: str, output_dir: str) -> str:
     lang_key = language.lower()
     cache_key = (lang_key, cleaned)
 
@@ -52,9 +40,6 @@ def generate_tts(
 
     lang_code = _get_gtts_language_code(language)
 
-    # Note: voice_style is accepted for future extension; many Coqui models
-    # are single-voice, so we simply ignore it for now.
-
     timestamp = int(time())
     safe_lang = lang_key.replace(" ", "_")
     filename = f"scene_{safe_lang}_{timestamp}.wav"
@@ -67,3 +52,34 @@ def generate_tts(
     _TTS_CACHE[cache_key] = resolved
 
     return resolved
+
+
+def generate_tts(
+    text: str,
+    language: str,
+    voice_style: str = "default",
+    output_dir: str = "generated_audio",
+) -> str:
+    """Generate TTS audio for a given text and language.
+
+    The base narration is synthesized once per (language, text); any
+    non-default voice_style is applied afterwards as DSP on that narration
+    (see audio.voice_styles).
+
+    Returns the absolute path to a WAV file.
+    """
+
+    cleaned = text.strip()
+    if not cleaned:
+        raise ValueError("Text is empty")
+
+    lang_key = language.lower()
+    style_key = (voice_style or "default").strip().lower()
+    get_voice_style(style_key)
+
+    base_path = _generate_base_tts(cleaned, language, output_dir)
+    if style_key == "default":
+        return base_path
+
+    text_hash = hashlib.sha1(f"{lang_key}:{cleaned}".encode("utf-8")).hexdigest()
+    return apply_voice_style(base_path, style_key, text_hash, output_dir=output_dir)
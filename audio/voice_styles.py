@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import os
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+from utils.pcm import iter_pcm_blocks
+
+
+@dataclass(frozen=True)
+class VoiceStyle:
+    """DSP settings applied on top of the base narration.
+
+    speed is a tempo factor (>1 is faster, pitch preserved), pitch_semitones
+    shifts pitch without changing duration and tilt_db is a spectral tilt
+    around 1 kHz (negative = warm, positive = bright).
+    """
+
+    speed: float = 1.0
+    pitch_semitones: float = 0.0
+    tilt_db: float = 0.0
+
+
+VOICE_STYLES: Dict[str, VoiceStyle] = {
+    "default": VoiceStyle(),
+    "slow": VoiceStyle(speed=0.85),
+    "fast": VoiceStyle(speed=1.2),
+    "deep": VoiceStyle(pitch_semitones=-3.0, tilt_db=-2.0),
+    "high": VoiceStyle(pitch_semitones=3.0),
+    "warm": VoiceStyle(tilt_db=-4.0),
+    "bright": VoiceStyle(tilt_db=4.0),
+    "storyteller": VoiceStyle(speed=0.92, pitch_semitones=-1.0, tilt_db=-2.0),
+}
+
+_STYLE_CACHE: dict[tuple[str, str], str] = {}
+
+_SAMPLE_RATE = 24000  # gTTS narration rate
+_FRAME_SECONDS = 0.04
+_TILT_PIVOT_HZ = 1000.0
+_TILT_OCTAVES = 3.0
+
+
+def get_voice_style(name: str) -> VoiceStyle:
+    key = (name or "default").strip().lower()
+    if key not in VOICE_STYLES:
+        raise ValueError(f"Unsupported voice style: {name}")
+    return VOICE_STYLES[key]
+
+
+def _decode_pcm(path: str) -> Tuple[np.ndarray, int]:
+    """Decode any audio file to mono float32 samples in [-1, 1]."""
+
+    blocks = list(iter_pcm_blocks(path, _SAMPLE_RATE, 1, _SAMPLE_RATE * 10))
+    if not blocks:
+        raise ValueError(f"Narration audio is empty: {path}")
+    samples = np.concatenate(blocks)[:, 0].astype(np.float32)
+    return samples / 32768.0, _SAMPLE_RATE
+
+
+def _write_wav(path: Path, samples: np.ndarray, rate: int) -> None:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+
+
+def _resample(samples: np.ndarray, factor: float) -> np.ndarray:
+    """Linear-interpolation resample; factor > 1 shortens the signal."""
+
+    if factor == 1.0 or samples.size < 2:
+        return samples
+    out_len = max(int(round(samples.size / factor)), 1)
+    positions = np.arange(out_len, dtype=np.float64) * factor
+    return np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+
+
+def _time_stretch(samples: np.ndarray, factor: float, rate: int) -> np.ndarray:
+    """WSOLA time stretch; factor > 1 makes the output shorter.
+
+    Frames are written with a fixed hop of half a frame and read near an
+    analysis hop of ``hop * factor``. Each read is shifted by up to half a hop
+    to line up with the natural continuation of the previous frame, so the
+    overlapping halves add in phase instead of partly cancelling, and the
+    output is divided by the summed window to keep the input level.
+    """
+
+    frame = max(int(rate * _FRAME_SECONDS) // 2 * 2, 4)
+    hop = frame // 2
+    if factor == 1.0 or samples.size < frame:
+        return samples
+
+    tolerance = hop // 2
+    out_len = int(samples.size / factor)
+    n_frames = max(out_len // hop, 2)
+    window = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(frame) / frame)).astype(np.float32)
+
+    padded = np.concatenate([samples, np.zeros(frame + hop + tolerance, dtype=np.float32)])
+    out = np.zeros(n_frames * hop + frame, dtype=np.float32)
+    weight = np.zeros_like(out)
+    last = samples.size - 1
+    start = 0
+    for k in range(n_frames):
+        if k:
+            natural = start + hop
+            nominal = int(k * hop * factor)
+            lo = min(max(nominal - tolerance, 0), last)
+            hi = min(nominal + tolerance, last)
+            region = padded[lo : hi + hop]
+            match = np.correlate(region, padded[natural : natural + hop], mode="valid")
+            start = lo + int(np.argmax(match))
+        pos = k * hop
+        out[pos : pos + frame] += window * padded[start : start + frame]
+        weight[pos : pos + frame] += window
+
+    out /= np.maximum(weight, 1e-3)
+    return out[:out_len]
+
+
+def _apply_tilt(samples: np.ndarray, rate: int, tilt_db: float) -> np.ndarray:
+    if tilt_db == 0.0 or samples.size == 0:
+        return samples
+
+    # Pad to a power of two: odd lengths can make the FFT orders of magnitude slower.
+    n_fft = 1 << (samples.size - 1).bit_length()
+    spectrum = np.fft.rfft(samples, n=n_fft)
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / rate)
+    octaves = np.log2(np.maximum(freqs, 1.0) / _TILT_PIVOT_HZ) / _TILT_OCTAVES
+    gain = 10.0 ** (tilt_db * np.clip(octaves, -1.0, 1.0) / 20.0)
+    return np.fft.irfft(spectrum * gain, n=n_fft)[: samples.size].astype(np.float32)
+
+
+def transform_samples(samples: np.ndarray, rate: int, style: VoiceStyle) -> np.ndarray:
+    """Apply a voice style to mono float32 samples and return new samples."""
+
+    pitch_ratio = 2.0 ** (style.pitch_semitones / 12.0)
+    out = _resample(samples, pitch_ratio)
+    # Resampling changed the duration by 1/pitch_ratio; a single stretch pass
+    # restores it and applies the requested tempo at the same time.
+    out = _time_stretch(out, style.speed / pitch_ratio, rate)
+    out = _apply_tilt(out, rate, style.tilt_db)
+
+    peak = float(np.max(np.abs(out))) if out.size else 0.0
+    if peak > 1.0:
+        out = out / peak
+    return out
+
+
+def apply_voice_style(
+    base_path: str,
+    style_name: str,
+    text_hash: str,
+    output_dir: str = "generated_audio",
+) -> str:
+    """Return a WAV of the base narration rendered in the given voice style.
+
+    Styled variants are cached by (text_hash, style) both in memory and on
+    disk, so each style is computed once per narration.
+    """
+
+    key = (style_name or "default").strip().lower()
+    style = get_voice_style(key)
+
+    cache_key = (text_hash, key)
+    cached_path = _STYLE_CACHE.get(cache_key)
+    if cached_path and os.path.isfile(cached_path):
+        return cached_path
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = Path(output_dir) / f"styled_{text_hash[:16]}_{key}.wav"
+
+    if not path.is_file():
+        samples, rate = _decode_pcm(base_path)
+        tmp_path = path.with_suffix(".tmp")
+        _write_wav(tmp_path, transform_samples(samples, rate, style), rate)
+        os.replace(tmp_path, path)
+
+    resolved = str(path.resolve())
+    _STYLE_CACHE[cache_key] = resolved
+    return resolved
@@ -0,0 +1,71 @@
+"""Benchmark video render profiles.
+
+Renders the same synthetic story (still images + tone narration) with every
+profile in video.profiles and prints wall time and output size, e.g.:
+
+    python -m benchmarks.bench_render_profiles --scenes 5 --seconds 6
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import wave
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from PIL import Image
+
+from video.profiles import RENDER_PROFILES
+from video.renderer import render_story_video
+
+
+def _write_inputs(work_dir: Path, scenes: int, seconds: float) -> tuple[list[str], list[str]]:
+    rng = np.random.default_rng(0)
+    rate = 24000
+    image_paths: list[str] = []
+    audio_paths: list[str] = []
+
+    for index in range(scenes):
+        # Smooth gradients plus a little noise, closer to diffusion output than flat colours.
+        y, x = np.mgrid[0:512, 0:768]
+        base = np.stack([x / 3, y / 2, (x + y) / 5], axis=-1) + rng.normal(0, 8, (512, 768, 3))
+        image_path = work_dir / f"scene_{index}.png"
+        Image.fromarray(np.clip(base + index * 20, 0, 255).astype(np.uint8)).save(image_path)
+        image_paths.append(str(image_path))
+
+        t = np.arange(int(seconds * rate)) / rate
+        tone = (0.2 * np.sin(2 * np.pi * (180 + 20 * index) * t) * 32767).astype("<i2")
+        audio_path = work_dir / f"scene_{index}.wav"
+        with wave.open(str(audio_path), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(tone.tobytes())
+        audio_paths.append(str(audio_path))
+
+    return image_paths, audio_paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scenes", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=6.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        image_paths, audio_paths = _write_inputs(work_dir, args.scenes, args.seconds)
+        print(f"{args.scenes} scenes x {args.seconds:.1f}s")
+
+        for name in RENDER_PROFILES:
+            start = perf_counter()
+            output = render_story_video(image_paths, audio_paths, output_dir=str(work_dir / name), profile=name)
+            elapsed = perf_counter() - start
+            size_kb = Path(output).stat().st_size / 1024.0
+            print(f"{name:>10}: {elapsed:7.2f} s  {size_kb:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Microbenchmark for audio.voice_styles.
+
+Runs every voice style over a synthetic narration-length signal and prints
+the DSP time per style, e.g.:
+
+    python -m benchmarks.bench_voice_styles --seconds 20
+"""
+
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from audio.voice_styles import VOICE_STYLES, transform_samples
+
+
+def _synthetic_voice(seconds: float, rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    # A few harmonics with a slow amplitude envelope roughly resemble speech.
+    f0 = 140.0 + 20.0 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3.0 * t) ** 2
+    return (0.3 * signal * envelope).astype(np.float32)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--rate", type=int, default=24000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = _synthetic_voice(args.seconds, args.rate)
+    print(f"{args.seconds:.1f}s of audio at {args.rate} Hz, best of {args.repeat}")
+
+    for name, style in VOICE_STYLES.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = perf_counter()
+            out = transform_samples(samples, args.rate, style)
+            best = min(best, perf_counter() - start)
+        print(f"{name:>12}: {best * 1000.0:8.2f} ms  ({out.size / args.rate:.2f}s out)")
+
+
+if __name__ == "__main__":
+    main()
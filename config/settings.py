@@ -16,6 +16,45 @@ class Settings(BaseModel):
     jwt_algorithm: str = os.getenv("JWT_ALGORITHM", "HS256")
     jwt_access_token_expire_minutes: int = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     lite_mode: bool = os.getenv("LITE_MODE", "false").lower() == "true"
+    # 0 means one worker per CPU core.
+    video_render_workers: int = int(os.getenv("VIDEO_RENDER_WORKERS", "0"))
+    clip_cache_max_mb: int = int(os.getenv("CLIP_CACHE_MAX_MB", "2048"))
+    # One sub-directory (or file stem) per emotion from nlp.emotion, e.g. assets/bgm/calm/*.mp3
+    bgm_dir: str = os.getenv("BGM_DIR", "assets/bgm")
+    # Normalized BGM WAVs; keep it outside the statically served directories.
+    bgm_cache_dir: str = os.getenv("BGM_CACHE_DIR", "cache/bgm")
+    # Host-wide cap on concurrent ffmpeg encodes (pool workers included) and
+    # the threads each one may use; 0 threads lets ffmpeg pick. 0 encoders
+    # means cpu_count // threads. The clip render pool is never wider than
+    # this cap, since workers beyond it would only wait for a slot.
+    video_max_encoders: int = int(os.getenv("VIDEO_MAX_ENCODERS", "0"))
+    video_encoder_threads: int = int(os.getenv("VIDEO_ENCODER_THREADS", "2"))
+    video_encode_timeout_seconds: float = float(os.getenv("VIDEO_ENCODE_TIMEOUT_SECONDS", "900"))
+    # How long an encode may wait for a free slot before the request gets a
+    # 503 (0 waits indefinitely).
+    video_encode_queue_seconds: float = float(os.getenv("VIDEO_ENCODE_QUEUE_SECONDS", "120"))
+    # PDF exports embed images resized to the print width at this DPI, as JPEG.
+    export_image_dpi: int = int(os.getenv("EXPORT_IMAGE_DPI", "150"))
+    export_jpeg_quality: int = int(os.getenv("EXPORT_JPEG_QUALITY", "85"))
+    export_image_cache_max_mb: int = int(os.getenv("EXPORT_IMAGE_CACHE_MAX_MB", "512"))
+    # Processes laying out PDF pages in parallel; 0 means min(cpu_count, 4).
+    export_pdf_workers: int = int(os.getenv("EXPORT_PDF_WORKERS", "0"))
+    export_page_cache_max_mb: int = int(os.getenv("EXPORT_PAGE_CACHE_MAX_MB", "512"))
+    # Analytics events are buffered and written in batches; when the buffer is
+    # full log_event waits this long for room before dropping the event.
+    analytics_buffer_size: int = int(os.getenv("ANALYTICS_BUFFER_SIZE", "10000"))
+    analytics_batch_size: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+    analytics_flush_seconds: float = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "1.0"))
+    analytics_block_seconds: float = float(os.getenv("ANALYTICS_BLOCK_SECONDS", "0.05"))
+    analytics_overview_ttl_seconds: float = float(os.getenv("ANALYTICS_OVERVIEW_TTL_SECONDS", "10"))
+    # Run the daily analytics_daily snapshot job (with catch-up) in the app process.
+    analytics_snapshots_enabled: bool = os.getenv("ANALYTICS_SNAPSHOTS_ENABLED", "true").lower() == "true"
+    # Raw events older than this many days move to compressed files under
+    # ANALYTICS_ARCHIVE_DIR (zstd, gzip or parquet); 0 keeps them in Mongo.
+    analytics_retention_days: int = int(os.getenv("ANALYTICS_RETENTION_DAYS", "0"))
+    analytics_archive_dir: str = os.getenv("ANALYTICS_ARCHIVE_DIR", "archives/analytics")
+    analytics_archive_format: str = os.getenv("ANALYTICS_ARCHIVE_FORMAT", "zstd")
+    analytics_retention_batch_size: int = int(os.getenv("ANALYTICS_RETENTION_BATCH_SIZE", "5000"))
 
 
 settings = Settings()
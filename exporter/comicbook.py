@@ -1,59 +1,150 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
-from time import time
-from typing import Any, Sequence
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from uuid import uuid4
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import Image as RLImage, PageBreak, Paragraph, SimpleDocTemplate, Spacer
 
+from config.settings import settings
+from utils.hashing import file_sha256
+from .image_prep import prepare_image
+from .pages import PageUnit, merge_pages, page_cache_enabled, page_key, render_units, scene_image_path, scene_text
+
 
 _DEFAULT_OUTPUT_DIR = "exports"
+_PANELS_PER_PAGE = 3
+
+
+def _title_flowables() -> list:
+    styles = getSampleStyleSheet()
+    return [Paragraph("Comic Book", styles["Heading1"]), Spacer(1, 16)]
+
+
+def _panel_flowables(
+    text: str,
+    img_path: Optional[str],
+    frame_width: float,
+    dpi: Optional[int],
+    jpeg_quality: Optional[int],
+    output_dir: str,
+) -> list:
+    styles = getSampleStyleSheet()
+    flowables: list = []
+
+    if img_path is not None:
+        width_pt = frame_width * 0.8
+        prepared, width_px, height_px = prepare_image(
+            img_path, width_pt, dpi=dpi, quality=jpeg_quality, output_dir=output_dir
+        )
+        flowables.append(RLImage(prepared, width=width_pt, height=width_pt * height_px / width_px))
+        flowables.append(Spacer(1, 4))
+
+    bubble = f"{text}" if text else "(No dialogue for this panel.)"
+    flowables.append(Paragraph(bubble, styles["BodyText"]))
+    flowables.append(Spacer(1, 12))
+    return flowables
+
+
+def _build_panel_page(
+    output_path: str,
+    with_title: bool,
+    panels: Sequence[Tuple[str, Optional[str]]],
+    dpi: Optional[int],
+    jpeg_quality: Optional[int],
+    output_dir: str,
+) -> None:
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    story: list = _title_flowables() if with_title else []
+    for text, img_path in panels:
+        story.extend(_panel_flowables(text, img_path, doc.width, dpi, jpeg_quality, output_dir))
+    doc.build(story)
+
+
+def comic_output_path(
+    scenes: Sequence[Any],
+    image_paths: Sequence[str],
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    dpi: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+) -> Path:
+    """Content-addressed PDF path: identical inputs always map to the same file."""
+
+    content = []
+    for index, scene in enumerate(scenes):
+        img_path = scene_image_path(image_paths, index)
+        content.append((scene_text(scene), file_sha256(img_path) if img_path else None))
+
+    key = page_key(
+        "comic.document",
+        content,
+        dpi or settings.export_image_dpi,
+        jpeg_quality or settings.export_jpeg_quality,
+    )
+    return Path(output_dir) / f"comicbook_{key[:24]}.pdf"
 
 
 def generate_comic(
     scenes: Sequence[Any],
     image_paths: Sequence[str],
     output_dir: str = _DEFAULT_OUTPUT_DIR,
+    dpi: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
 ) -> str:
+    """Build the PDF; images are embedded as JPEGs sized for dpi (see image_prep).
+
+    Every group of three panels starts a new page, so with pypdf installed
+    the groups are laid out independently (in parallel, and cached by
+    content; see exporter.pages) and merged. The file name is derived from
+    the inputs (comic_output_path), and an existing file is returned as is.
+    """
+
     if not scenes:
         raise ValueError("At least one scene is required.")
 
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    filename = out_dir / f"comicbook_{int(time())}.pdf"
+    dpi = dpi or settings.export_image_dpi
+    jpeg_quality = jpeg_quality or settings.export_jpeg_quality
 
-    doc = SimpleDocTemplate(str(filename), pagesize=A4)
-    styles = getSampleStyleSheet()
-    story: list = []
+    filename = comic_output_path(scenes, image_paths, output_dir, dpi, jpeg_quality)
+    if filename.is_file():
+        return str(filename.resolve())
 
-    story.append(Paragraph("Comic Book", styles["Heading1"]))
-    story.append(Spacer(1, 16))
+    panels = [(scene_text(scene), scene_image_path(image_paths, index)) for index, scene in enumerate(scenes)]
 
-    for index, scene in enumerate(scenes, start=1):
-        text = getattr(scene, "text", None)
-        if text is None and isinstance(scene, dict):
-            text = scene.get("text", "")
+    if page_cache_enabled():
+        units: List[PageUnit] = []
+        for start in range(0, len(panels), _PANELS_PER_PAGE):
+            group = panels[start : start + _PANELS_PER_PAGE]
+            with_title = start == 0
+            content = [(text, file_sha256(img_path) if img_path else None) for text, img_path in group]
+            units.append(
+                PageUnit(
+                    page_key("comic.panels", with_title, content, dpi, jpeg_quality),
+                    _build_panel_page,
+                    (with_title, group, dpi, jpeg_quality, output_dir),
+                )
+            )
 
-        img_path = None
-        scene_idx = index - 1
-        if scene_idx < len(image_paths):
-            candidate = Path(image_paths[scene_idx])
-            if candidate.is_file():
-                img_path = candidate
+        merge_pages(render_units(units, output_dir, on_progress=on_progress), str(filename))
+        return str(filename.resolve())
 
-        if img_path is not None:
-            story.append(RLImage(str(img_path), width=doc.width * 0.8))
-            story.append(Spacer(1, 4))
+    tmp = filename.with_name(f"{filename.stem}.{uuid4().hex}.tmp")
+    doc = SimpleDocTemplate(str(tmp), pagesize=A4)
+    story: list = _title_flowables()
 
-        bubble = f"{text}" if text else "(No dialogue for this panel.)"
-        story.append(Paragraph(bubble, styles["BodyText"]))
-        story.append(Spacer(1, 12))
+    for index, (text, img_path) in enumerate(panels, start=1):
+        story.extend(_panel_flowables(text, img_path, doc.width, dpi, jpeg_quality, output_dir))
 
-        if index % 3 == 0 and index != len(scenes):
+        if index % _PANELS_PER_PAGE == 0 and index != len(scenes):
             story.append(PageBreak())
 
     doc.build(story)
+    os.replace(tmp, filename)
     return str(filename.resolve())
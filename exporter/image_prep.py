@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from PIL import Image
+
+from config.settings import settings
+from utils.hashing import file_sha256
+from utils.lru_dir import evict_lru
+
+_DEFAULT_OUTPUT_DIR = "exports"
+_CACHE_DIRNAME = ".image_cache"
+_POINTS_PER_INCH = 72.0
+
+
+def _cache_dir(output_dir: str) -> Path:
+    return Path(output_dir) / _CACHE_DIRNAME
+
+
+def target_size(source_size: Tuple[int, int], width_pt: float, dpi: int) -> Tuple[int, int]:
+    """Pixel size for printing an image width_pt points wide at dpi; never upscales."""
+
+    src_w, src_h = source_size
+    width = min(src_w, max(int(round(width_pt / _POINTS_PER_INCH * dpi)), 1))
+    height = max(int(round(src_h * width / src_w)), 1)
+    return width, height
+
+
+def prepare_image(
+    image_path: str,
+    width_pt: float,
+    dpi: Optional[int] = None,
+    quality: Optional[int] = None,
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+) -> Tuple[str, int, int]:
+    """Return a print-sized JPEG derivative of image_path as (path, width_px, height_px).
+
+    Derivatives are cached under <output_dir>/.image_cache by source hash,
+    pixel size and quality, so re-exporting a story reuses them.
+    """
+
+    dpi = dpi or settings.export_image_dpi
+    quality = quality or settings.export_jpeg_quality
+
+    with Image.open(image_path) as img:
+        width, height = target_size(img.size, width_pt, dpi)
+
+        cache_dir = _cache_dir(output_dir)
+        path = cache_dir / f"{file_sha256(image_path)[:32]}_{width}x{height}_q{quality}.jpg"
+        try:
+            # Touch on hit so eviction is least-recently-used.
+            os.utime(path)
+            return str(path), width, height
+        except FileNotFoundError:
+            pass
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        img.draft("RGB", (width, height))  # lets JPEG sources decode at reduced scale
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            converted = Image.new("RGB", rgba.size, (255, 255, 255))
+            converted.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            converted = img.convert("RGB")
+
+        if converted.size != (width, height):
+            converted = converted.resize((width, height), Image.LANCZOS)
+
+        tmp = path.with_name(path.stem + f".{uuid4().hex}.tmp")
+        converted.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+        os.replace(tmp, path)
+
+    evict_lru(cache_dir, ".jpg", settings.export_image_cache_max_mb * 1024 * 1024, keep=path)
+    return str(path), width, height
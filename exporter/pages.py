@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from config.settings import settings
+from utils.lru_dir import evict_lru
+
+try:  # Optional: merging cached page PDFs needs pypdf
+    from pypdf import PdfWriter  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    PdfWriter = None  # type: ignore
+
+
+_CACHE_DIRNAME = ".page_cache"
+# Pages used this recently are kept by eviction: render_units refreshes them
+# before the merge, so they may belong to an export that has not merged yet.
+_EVICT_GRACE_SECONDS = 15 * 60
+# Bump whenever the page templates (styles, sizes, spacing) change.
+LAYOUT_VERSION = 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass(frozen=True)
+class PageUnit:
+    """A self-contained run of pages, built by builder(output_path, *args)."""
+
+    key: str
+    builder: Callable[..., None]
+    args: Tuple[Any, ...]
+
+
+def page_cache_enabled() -> bool:
+    """Page-level caching needs pypdf to merge the cached pages."""
+
+    return PdfWriter is not None
+
+
+def page_key(kind: str, *parts: Any) -> str:
+    material = json.dumps([LAYOUT_VERSION, kind, *parts], ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def scene_text(scene: Any) -> str:
+    text = getattr(scene, "text", None)
+    if text is None and isinstance(scene, dict):
+        text = scene.get("text", "")
+    return text or ""
+
+
+def scene_image_path(image_paths: Sequence[str], index: int) -> Optional[str]:
+    """The scene's image if one was given and exists on disk."""
+
+    if index < len(image_paths):
+        candidate = Path(image_paths[index])
+        if candidate.is_file():
+            return str(candidate)
+    return None
+
+
+def _pool_size() -> int:
+    if settings.export_pdf_workers > 0:
+        return settings.export_pdf_workers
+    return min(os.cpu_count() or 1, 4)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=_pool_size(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _pool
+
+
+def shutdown_page_pool() -> None:
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _render_unit(builder: Callable[..., None], args: Tuple[Any, ...], path: str) -> None:
+    tmp = f"{path}.{uuid4().hex}.tmp"
+    try:
+        builder(tmp, *args)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def render_units(
+    units: Sequence[PageUnit],
+    output_dir: str,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
+    """Return one PDF path per unit, laying out only the units not cached yet.
+
+    Misses are built in a process pool (inline when there is just one).
+    on_progress, if given, is called with (units_ready, total) as they finish.
+    """
+
+    cache_dir = Path(output_dir) / _CACHE_DIRNAME
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    paths: List[str] = []
+    missing: List[Tuple[PageUnit, str]] = []
+    for unit in units:
+        path = cache_dir / f"{unit.key}.pdf"
+        paths.append(str(path))
+        try:
+            # Touch on hit so eviction is least-recently-used.
+            os.utime(path)
+        except FileNotFoundError:
+            missing.append((unit, str(path)))
+
+    total = len(units)
+    ready = total - len(missing)
+    if on_progress is not None:
+        on_progress(ready, total)
+
+    if len(missing) == 1:
+        unit, path = missing[0]
+        _render_unit(unit.builder, unit.args, path)
+        if on_progress is not None:
+            on_progress(total, total)
+    elif missing:
+        pool = _get_pool()
+        futures = [pool.submit(_render_unit, unit.builder, unit.args, path) for unit, path in missing]
+        for future in as_completed(futures):
+            future.result()
+            ready += 1
+            if on_progress is not None:
+                on_progress(ready, total)
+
+    return paths
+
+
+def merge_pages(page_paths: Sequence[str], output_path: str) -> str:
+    """Concatenate page PDFs into output_path."""
+
+    if PdfWriter is None:
+        raise RuntimeError("pypdf is required to merge cached PDF pages.")
+
+    writer = PdfWriter()
+    for path in page_paths:
+        writer.append(path)
+
+    tmp = f"{output_path}.{uuid4().hex}.tmp"
+    with open(tmp, "wb") as fh:
+        writer.write(fh)
+    os.replace(tmp, output_path)
+
+    cache_dir = Path(page_paths[0]).parent if page_paths else None
+    if cache_dir is not None:
+        # Pages touched recently may belong to an export still rendering or merging.
+        evict_lru(
+            cache_dir,
+            ".pdf",
+            settings.export_page_cache_max_mb * 1024 * 1024,
+            protect_seconds=_EVICT_GRACE_SECONDS,
+        )
+    return output_path
@@ -1,18 +1,21 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlparse
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from analytics.events import log_event
 from auth.jwt_handler import get_current_user
 from journal.saver import save_pdf, save_zip
-from .storybook import generate_storybook
-from .comicbook import generate_comic
-from .zip_export import generate_zip
+from tasks.store import create_task, update_task
+from .storybook import generate_storybook, storybook_output_path
+from .comicbook import comic_output_path, generate_comic
+from .zip_export import bundle_output_path, generate_zip, iter_zip_stream
 
 
 _IMAGE_DIR = "generated_images"
@@ -24,6 +27,17 @@ _EXPORT_DIR = "exports"
 router = APIRouter(prefix="/api/export", tags=["export"])
 
 
+ProgressCallback = Optional[Callable[[int, int], None]]
+
+
+class _ExportRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    # "async": true queues an export task and returns its id right away;
+    # poll /api/tasks/status for progress and the final URL.
+    run_async: bool = Field(default=False, alias="async")
+
+
 class Scene(BaseModel):
     id: Optional[int] = None
     text: str
@@ -31,26 +45,36 @@ class Scene(BaseModel):
     summary: Optional[str] = None
 
 
-class StorybookRequest(BaseModel):
+class StorybookRequest(_ExportRequest):
     scenes: List[Scene]
     image_urls: List[str]
     overall_summary: Optional[str] = None
+    # Image resolution/quality in the PDF; defaults come from settings.
+    dpi: Optional[int] = Field(default=None, ge=72, le=600)
+    jpeg_quality: Optional[int] = Field(default=None, ge=30, le=95)
 
 
-class ComicRequest(BaseModel):
+class ComicRequest(_ExportRequest):
     scenes: List[Scene]
     image_urls: List[str]
+    dpi: Optional[int] = Field(default=None, ge=72, le=600)
+    jpeg_quality: Optional[int] = Field(default=None, ge=30, le=95)
 
 
-class BundleRequest(BaseModel):
+class BundleRequest(_ExportRequest):
     image_urls: List[str] = []
     audio_urls: List[str] = []
     video_url: Optional[str] = None
     metadata: dict[str, Any] | None = None
+    # Send the ZIP in the response body as it is written instead of returning a URL.
+    stream: bool = False
+    # With stream, also keep a copy in exports/ (saved as a user asset once complete).
+    persist: bool = False
 
 
 class ExportResponse(BaseModel):
-    url: str
+    url: Optional[str] = None
+    task_id: Optional[str] = None
 
 
 def _resolve_local_path(url_or_path: str, base_dir: str, expected_prefix: str) -> Path:
@@ -64,26 +88,36 @@ def _resolve_local_path(url_or_path: str, base_dir: str, expected_prefix: str) -
     return Path(base_dir) / filename
 
 
-@router.post("/storybook", response_model=ExportResponse)
-async def export_storybook(
-    payload: StorybookRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user),
-) -> ExportResponse:
-    if not payload.scenes:
-        raise HTTPException(status_code=400, detail="At least one scene is required.")
+def _resolve_image_paths(image_urls: List[str]) -> List[str]:
+    return [str(_resolve_local_path(url, _IMAGE_DIR, "/generated/")) for url in image_urls]
 
-    if len(payload.scenes) > 10:
-        raise HTTPException(status_code=400, detail="Maximum 10 scenes are allowed.")
 
-    image_paths: List[str] = []
-    for url in payload.image_urls:
-        image_paths.append(str(_resolve_local_path(url, _IMAGE_DIR, "/generated/")))
+def _bundle_assets(payload: BundleRequest) -> Dict[str, Any]:
+    audio_paths: List[str] = []
+    for url in payload.audio_urls:
+        audio_paths.append(str(_resolve_local_path(url, _AUDIO_DIR, "/audio-files/")))
+
+    video_path: Optional[str] = None
+    if payload.video_url:
+        video_path = str(_resolve_local_path(payload.video_url, _VIDEO_DIR, "/videos/"))
+
+    return {
+        "images": _resolve_image_paths(payload.image_urls),
+        "audio": audio_paths,
+        "video": video_path,
+        "metadata": payload.metadata or {},
+    }
+
 
+def _build_storybook(payload: StorybookRequest, user_id: str, on_progress: ProgressCallback = None) -> str:
     pdf_path = generate_storybook(
         scenes=payload.scenes,
-        image_paths=image_paths,
+        image_paths=_resolve_image_paths(payload.image_urls),
         overall_summary=payload.overall_summary,
         output_dir=_EXPORT_DIR,
+        dpi=payload.dpi,
+        jpeg_quality=payload.jpeg_quality,
+        on_progress=on_progress,
     )
 
     filename = Path(pdf_path).name
@@ -91,27 +125,18 @@ async def export_storybook(
     log_event("export_storybook", meta={"filename": filename})
 
     public_url = f"/exports/{filename}"
-    save_pdf(current_user["id"], public_url, kind="pdf")
+    save_pdf(user_id, public_url, kind="pdf", dedupe=True)
+    return public_url
 
-    return ExportResponse(url=public_url)
-
-
-@router.post("/comic", response_model=ExportResponse)
-async def export_comic(
-    payload: ComicRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user),
-) -> ExportResponse:
-    if not payload.scenes:
-        raise HTTPException(status_code=400, detail="At least one scene is required.")
-
-    image_paths: List[str] = []
-    for url in payload.image_urls:
-        image_paths.append(str(_resolve_local_path(url, _IMAGE_DIR, "/generated/")))
 
+def _build_comic(payload: ComicRequest, user_id: str, on_progress: ProgressCallback = None) -> str:
     pdf_path = generate_comic(
         scenes=payload.scenes,
-        image_paths=image_paths,
+        image_paths=_resolve_image_paths(payload.image_urls),
         output_dir=_EXPORT_DIR,
+        dpi=payload.dpi,
+        jpeg_quality=payload.jpeg_quality,
+        on_progress=on_progress,
     )
 
     filename = Path(pdf_path).name
@@ -119,42 +144,155 @@ async def export_comic(
     log_event("export_comic", meta={"filename": filename})
 
     public_url = f"/exports/{filename}"
-    save_pdf(current_user["id"], public_url, kind="comic")
+    save_pdf(user_id, public_url, kind="comic", dedupe=True)
+    return public_url
 
-    return ExportResponse(url=public_url)
 
+def _build_bundle(payload: BundleRequest, user_id: str, on_progress: ProgressCallback = None) -> str:
+    zip_path = generate_zip(_bundle_assets(payload), output_dir=_EXPORT_DIR, on_progress=on_progress)
 
-@router.post("/bundle", response_model=ExportResponse)
-async def export_bundle(
-    payload: BundleRequest,
+    filename = Path(zip_path).name
+    # Analytics: track bundle exports
+    log_event("export_bundle", meta={"filename": filename})
+
+    public_url = f"/exports/{filename}"
+    save_zip(user_id, public_url, dedupe=True)
+    return public_url
+
+
+def _storybook_exists(payload: StorybookRequest) -> bool:
+    return storybook_output_path(
+        payload.scenes,
+        _resolve_image_paths(payload.image_urls),
+        payload.overall_summary,
+        _EXPORT_DIR,
+        payload.dpi,
+        payload.jpeg_quality,
+    ).is_file()
+
+
+def _comic_exists(payload: ComicRequest) -> bool:
+    return comic_output_path(
+        payload.scenes,
+        _resolve_image_paths(payload.image_urls),
+        _EXPORT_DIR,
+        payload.dpi,
+        payload.jpeg_quality,
+    ).is_file()
+
+
+def _bundle_exists(payload: BundleRequest) -> bool:
+    return bundle_output_path(_bundle_assets(payload), _EXPORT_DIR).is_file()
+
+
+def _run_export_task(
+    task_id: str,
+    kind: str,
+    build: Callable[..., str],
+    payload: BaseModel,
+    user_id: str,
+) -> None:
+    """Background worker shared by all export kinds (runs in the threadpool)."""
+
+    update_task(task_id, {"status": "running", "progress": 0.0, "kind": kind})
+
+    def on_progress(done: int, total: int) -> None:
+        # The last 10% covers merging/closing the file and saving the asset.
+        update_task(task_id, {"progress": (done / total) * 90.0 if total else 90.0})
+
+    try:
+        url = build(payload, user_id, on_progress)
+        update_task(task_id, {"status": "complete", "progress": 100.0, "result": {"url": url, "kind": kind}})
+    except Exception as exc:  # pragma: no cover - defensive
+        update_task(task_id, {"status": "failed", "error": str(exc)})
+
+
+async def _export(
+    kind: str,
+    build: Callable[..., str],
+    exists: Callable[[Any], bool],
+    payload: _ExportRequest,
+    user_id: str,
+    background: BackgroundTasks,
+) -> ExportResponse:
+    """Queue the export as a task, or run it off the event loop and wait.
+
+    Exports are content-addressed, so when the artifact already exists the
+    URL is returned directly even for async requests.
+    """
+
+    if payload.run_async and not await run_in_threadpool(exists, payload):
+        task_id = create_task("export", user_id)
+        background.add_task(_run_export_task, task_id, kind, build, payload, user_id)
+        return ExportResponse(task_id=task_id)
+
+    url = await run_in_threadpool(build, payload, user_id)
+    return ExportResponse(url=url)
+
+
+@router.post("/storybook", response_model=ExportResponse)
+async def export_storybook(
+    payload: StorybookRequest,
+    background: BackgroundTasks,
     current_user: Dict[str, Any] = Depends(get_current_user),
 ) -> ExportResponse:
-    image_paths: List[str] = []
-    for url in payload.image_urls:
-        image_paths.append(str(_resolve_local_path(url, _IMAGE_DIR, "/generated/")))
+    if not payload.scenes:
+        raise HTTPException(status_code=400, detail="At least one scene is required.")
 
-    audio_paths: List[str] = []
-    for url in payload.audio_urls:
-        audio_paths.append(str(_resolve_local_path(url, _AUDIO_DIR, "/audio-files/")))
+    if len(payload.scenes) > 10:
+        raise HTTPException(status_code=400, detail="Maximum 10 scenes are allowed.")
 
-    video_path: Optional[str] = None
-    if payload.video_url:
-        video_path = str(_resolve_local_path(payload.video_url, _VIDEO_DIR, "/videos/"))
+    return await _export("storybook", _build_storybook, _storybook_exists, payload, current_user["id"], background)
 
-    all_assets: dict[str, Any] = {
-        "images": image_paths,
-        "audio": audio_paths,
-        "video": video_path,
-        "metadata": payload.metadata or {},
-    }
 
-    zip_path = generate_zip(all_assets, output_dir=_EXPORT_DIR)
+@router.post("/comic", response_model=ExportResponse)
+async def export_comic(
+    payload: ComicRequest,
+    background: BackgroundTasks,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> ExportResponse:
+    if not payload.scenes:
+        raise HTTPException(status_code=400, detail="At least one scene is required.")
 
-    filename = Path(zip_path).name
-    # Analytics: track bundle exports
-    log_event("export_bundle", meta={"filename": filename})
+    return await _export("comic", _build_comic, _comic_exists, payload, current_user["id"], background)
 
-    public_url = f"/exports/{filename}"
-    save_zip(current_user["id"], public_url)
 
-    return ExportResponse(url=public_url)
+@router.post("/bundle", response_model=ExportResponse)
+async def export_bundle(
+    payload: BundleRequest,
+    background: BackgroundTasks,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> Union[ExportResponse, FileResponse, StreamingResponse]:
+    if payload.stream:
+        if payload.run_async:
+            raise HTTPException(status_code=400, detail="stream and async cannot be combined.")
+
+        all_assets = _bundle_assets(payload)
+        path = await run_in_threadpool(bundle_output_path, all_assets, _EXPORT_DIR)
+        filename = path.name
+        log_event("export_bundle", meta={"filename": filename, "stream": True})
+
+        if path.is_file():
+            # Identical bundle already on disk: send it instead of rebuilding.
+            if payload.persist:
+                save_zip(current_user["id"], f"/exports/{filename}", dedupe=True)
+            return FileResponse(str(path), media_type="application/zip", filename=filename)
+
+        persist_path: Optional[str] = None
+        on_complete: Optional[Callable[[], None]] = None
+        if payload.persist:
+            persist_path = str(path)
+            user_id = current_user["id"]
+
+            def _store_cache_entry() -> None:
+                save_zip(user_id, f"/exports/{filename}", dedupe=True)
+
+            on_complete = _store_cache_entry
+
+        return StreamingResponse(
+            iter_zip_stream(all_assets, persist_path=persist_path, on_complete=on_complete),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    return await _export("bundle", _build_bundle, _bundle_exists, payload, current_user["id"], background)
@@ -1,63 +1,168 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
-from time import time
-from typing import Any, Sequence
+from typing import Any, Callable, List, Optional, Sequence
+from uuid import uuid4
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import Image as RLImage, PageBreak, Paragraph, SimpleDocTemplate, Spacer
 
+from config.settings import settings
+from utils.hashing import file_sha256
+from .image_prep import prepare_image
+from .pages import PageUnit, merge_pages, page_cache_enabled, page_key, render_units, scene_image_path, scene_text
+
 
 _DEFAULT_OUTPUT_DIR = "exports"
 
 
+def _summary_flowables(overall_summary: str) -> list:
+    styles = getSampleStyleSheet()
+    return [
+        Paragraph("Story Summary", styles["Heading1"]),
+        Spacer(1, 12),
+        Paragraph(overall_summary, styles["BodyText"]),
+    ]
+
+
+def _scene_flowables(
+    text: str,
+    img_path: Optional[str],
+    frame_width: float,
+    dpi: Optional[int],
+    jpeg_quality: Optional[int],
+    output_dir: str,
+) -> list:
+    styles = getSampleStyleSheet()
+    flowables: list = []
+
+    if img_path is not None:
+        prepared, width_px, height_px = prepare_image(
+            img_path, frame_width, dpi=dpi, quality=jpeg_quality, output_dir=output_dir
+        )
+        flowables.append(RLImage(prepared, width=frame_width, height=frame_width * height_px / width_px))
+        flowables.append(Spacer(1, 8))
+
+    if text:
+        flowables.append(Paragraph(str(text), styles["BodyText"]))
+    else:
+        flowables.append(Paragraph("(No text for this scene.)", styles["BodyText"]))
+
+    return flowables
+
+
+def _build_summary_page(output_path: str, overall_summary: str) -> None:
+    SimpleDocTemplate(output_path, pagesize=A4).build(_summary_flowables(overall_summary))
+
+
+def _build_scene_page(
+    output_path: str,
+    text: str,
+    img_path: Optional[str],
+    dpi: Optional[int],
+    jpeg_quality: Optional[int],
+    output_dir: str,
+) -> None:
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    doc.build(_scene_flowables(text, img_path, doc.width, dpi, jpeg_quality, output_dir))
+
+
+def storybook_output_path(
+    scenes: Sequence[Any],
+    image_paths: Sequence[str],
+    overall_summary: str | None = None,
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    dpi: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+) -> Path:
+    """Content-addressed PDF path: identical inputs always map to the same file."""
+
+    content = []
+    for index, scene in enumerate(scenes):
+        img_path = scene_image_path(image_paths, index)
+        content.append((scene_text(scene), file_sha256(img_path) if img_path else None))
+
+    key = page_key(
+        "storybook.document",
+        overall_summary or "",
+        content,
+        dpi or settings.export_image_dpi,
+        jpeg_quality or settings.export_jpeg_quality,
+    )
+    return Path(output_dir) / f"storybook_{key[:24]}.pdf"
+
+
 def generate_storybook(
     scenes: Sequence[Any],
     image_paths: Sequence[str],
     overall_summary: str | None = None,
     output_dir: str = _DEFAULT_OUTPUT_DIR,
+    dpi: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
 ) -> str:
+    """Build the PDF; images are embedded as JPEGs sized for dpi (see image_prep).
+
+    The summary and every scene start on a new page, so with pypdf installed
+    each of them is laid out on its own (in parallel, and cached by content;
+    see exporter.pages) and the pages are merged. Without pypdf the whole
+    document is built in one pass. The file name is derived from the inputs
+    (storybook_output_path), and an existing file is returned as is.
+    """
+
     if not scenes:
         raise ValueError("At least one scene is required.")
 
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    filename = out_dir / f"storybook_{int(time())}.pdf"
-
-    doc = SimpleDocTemplate(str(filename), pagesize=A4)
-    styles = getSampleStyleSheet()
+    dpi = dpi or settings.export_image_dpi
+    jpeg_quality = jpeg_quality or settings.export_jpeg_quality
+
+    filename = storybook_output_path(scenes, image_paths, overall_summary, output_dir, dpi, jpeg_quality)
+    if filename.is_file():
+        return str(filename.resolve())
+
+    if page_cache_enabled():
+        units: List[PageUnit] = []
+        if overall_summary:
+            units.append(
+                PageUnit(page_key("storybook.summary", overall_summary), _build_summary_page, (overall_summary,))
+            )
+        for index, scene in enumerate(scenes):
+            text = scene_text(scene)
+            img_path = scene_image_path(image_paths, index)
+            image_hash = file_sha256(img_path) if img_path else None
+            units.append(
+                PageUnit(
+                    page_key("storybook.scene", text, image_hash, dpi, jpeg_quality),
+                    _build_scene_page,
+                    (text, img_path, dpi, jpeg_quality, output_dir),
+                )
+            )
+
+        merge_pages(render_units(units, output_dir, on_progress=on_progress), str(filename))
+        return str(filename.resolve())
+
+    tmp = filename.with_name(f"{filename.stem}.{uuid4().hex}.tmp")
+    doc = SimpleDocTemplate(str(tmp), pagesize=A4)
     story: list = []
 
     if overall_summary:
-        story.append(Paragraph("Story Summary", styles["Heading1"]))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph(overall_summary, styles["BodyText"]))
+        story.extend(_summary_flowables(overall_summary))
         story.append(PageBreak())
 
     for index, scene in enumerate(scenes):
-        text = getattr(scene, "text", None)
-        if text is None and isinstance(scene, dict):
-            text = scene.get("text", "")
-
-        img_path = None
-        if index < len(image_paths):
-            candidate = Path(image_paths[index])
-            if candidate.is_file():
-                img_path = candidate
-
-        if img_path is not None:
-            story.append(RLImage(str(img_path), width=doc.width))
-            story.append(Spacer(1, 8))
-
-        if text:
-            story.append(Paragraph(str(text), styles["BodyText"]))
-        else:
-            story.append(Paragraph("(No text for this scene.)", styles["BodyText"]))
-
+        story.extend(
+            _scene_flowables(
+                scene_text(scene), scene_image_path(image_paths, index), doc.width, dpi, jpeg_quality, output_dir
+            )
+        )
         if index != len(scenes) - 1:
             story.append(PageBreak())
 
     doc.build(story)
+    os.replace(tmp, filename)
     return str(filename.resolve())
@@ -1,47 +1,201 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import json
+import os
 import zipfile
 from pathlib import Path
-from time import time
-from typing import Any, Mapping, Sequence
+from typing import Any, Callable, Iterator, List, Mapping, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from utils.hashing import file_sha256
 
 
 _DEFAULT_OUTPUT_DIR = "exports"
+# Bump when the archive layout (entry names, compression) changes.
+_BUNDLE_VERSION = 1
+_READ_CHUNK = 1024 * 1024
 
+# Already compressed; deflating them burns CPU for a fraction of a percent.
+_STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".mp3", ".m4a", ".aac", ".ogg", ".mp4", ".webm"}
+
+
+def _compression_for(path: Path) -> int:
+    return zipfile.ZIP_STORED if path.suffix.lower() in _STORED_SUFFIXES else zipfile.ZIP_DEFLATED
 
-def generate_zip(
-    all_assets: Mapping[str, Any],
-    output_dir: str = _DEFAULT_OUTPUT_DIR,
-) -> str:
-    out_dir = Path(output_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
 
-    filename = out_dir / f"bundle_{int(time())}.zip"
+def _bundle_entries(all_assets: Mapping[str, Any]) -> List[Tuple[str, Path]]:
+    """(arcname, path) for every bundled file that exists on disk."""
 
     images: Sequence[str] = all_assets.get("images", []) or []
     audio: Sequence[str] = all_assets.get("audio", []) or []
     video: str | None = all_assets.get("video") or None
+
+    entries: List[Tuple[str, Path]] = []
+    for path in images:
+        p = Path(path)
+        if p.is_file():
+            entries.append((f"images/{p.name}", p))
+
+    for path in audio:
+        p = Path(path)
+        if p.is_file():
+            entries.append((f"audio/{p.name}", p))
+
+    if video:
+        vp = Path(video)
+        if vp.is_file():
+            entries.append(("video/final.mp4", vp))
+
+    return entries
+
+
+def _metadata_bytes(all_assets: Mapping[str, Any]) -> Optional[bytes]:
     metadata: Any = all_assets.get("metadata")
+    if metadata is None:
+        return None
+    return json.dumps(metadata, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def bundle_output_path(all_assets: Mapping[str, Any], output_dir: str = _DEFAULT_OUTPUT_DIR) -> Path:
+    """Content-addressed ZIP path, keyed by the manifest (names + file hashes) and metadata."""
+
+    manifest = [(arcname, file_sha256(str(path))) for arcname, path in _bundle_entries(all_assets)]
+    material = json.dumps([_BUNDLE_VERSION, manifest], ensure_ascii=False).encode("utf-8")
+    digest = hashlib.sha256(material)
+    digest.update(_metadata_bytes(all_assets) or b"")
+    return Path(output_dir) / f"bundle_{digest.hexdigest()[:24]}.zip"
 
-    with zipfile.ZipFile(str(filename), "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for path in images:
-            p = Path(path)
-            if p.is_file():
-                zf.write(str(p), arcname=f"images/{p.name}")
 
-        for path in audio:
-            p = Path(path)
-            if p.is_file():
-                zf.write(str(p), arcname=f"audio/{p.name}")
+def generate_zip(
+    all_assets: Mapping[str, Any],
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> str:
+    """Write the bundle to output_dir; on_progress gets (bytes_done, bytes_total).
 
-        if video:
-            vp = Path(video)
-            if vp.is_file():
-                zf.write(str(vp), arcname="video/final.mp4")
+    The file is named by bundle_output_path, and an existing one is reused.
+    """
 
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    filename = bundle_output_path(all_assets, output_dir)
+    if filename.is_file():
+        return str(filename.resolve())
+
+    entries = _bundle_entries(all_assets)
+    total = sum(path.stat().st_size for _, path in entries)
+    done = 0
+
+    tmp = filename.with_name(f"{filename.stem}.{uuid4().hex}.tmp")
+    with zipfile.ZipFile(str(tmp), "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, path in entries:
+            zf.write(str(path), arcname=arcname, compress_type=_compression_for(path))
+            done += path.stat().st_size
+            if on_progress is not None:
+                on_progress(done, total)
+
+        metadata = _metadata_bytes(all_assets)
         if metadata is not None:
-            data = json.dumps(metadata, indent=2, ensure_ascii=False)
-            zf.writestr("metadata.json", data)
+            zf.writestr("metadata.json", metadata)
 
+    os.replace(tmp, filename)
     return str(filename.resolve())
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable buffer the ZipFile writes into.
+
+    Being unseekable makes zipfile emit data descriptors instead of seeking
+    back to patch local headers, so the archive can be sent as it is built.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip_stream(
+    all_assets: Mapping[str, Any],
+    persist_path: Optional[str] = None,
+    on_complete: Optional[Callable[[], None]] = None,
+) -> Iterator[bytes]:
+    """Yield the bundle ZIP in chunks while it is being written.
+
+    Media files are STORED and read in 1 MiB pieces, metadata.json is
+    deflated; memory use stays around one read chunk whatever the bundle
+    size. With persist_path the same bytes are also written to that file
+    (renamed into place only once the archive is complete). on_complete runs
+    after the last chunk, i.e. only if the client received the whole file.
+    """
+
+    persist = None
+    tmp_path: Optional[Path] = None
+    if persist_path is not None:
+        Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(persist_path).with_suffix(f".{uuid4().hex[:12]}.part")
+        persist = open(tmp_path, "wb")
+
+    sink = _ChunkSink()
+
+    def flush() -> bytes:
+        data = sink.drain()
+        if persist is not None and data:
+            persist.write(data)
+        return data
+
+    completed = False
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            for arcname, path in _bundle_entries(all_assets):
+                info = zipfile.ZipInfo.from_file(str(path), arcname=arcname)
+                info.compress_type = _compression_for(path)
+                with open(path, "rb") as src, zf.open(info, "w") as dest:
+                    while True:
+                        chunk = src.read(_READ_CHUNK)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = flush()
+                        if data:
+                            yield data
+
+            metadata = _metadata_bytes(all_assets)
+            if metadata is not None:
+                zf.writestr("metadata.json", metadata, compress_type=zipfile.ZIP_DEFLATED)
+
+        data = flush()
+        if data:
+            yield data
+        completed = True
+    finally:
+        if persist is not None:
+            persist.close()
+            assert tmp_path is not None and persist_path is not None
+            if completed:
+                os.replace(tmp_path, persist_path)
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+    if on_complete is not None:
+        on_complete()
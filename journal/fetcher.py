@@ -24,6 +24,7 @@ def get_user_assets(user_id: str) -> List[dict]:
             "url": doc.get("url"),
             "scene_index": doc.get("scene_index"),
             "kind": doc.get("kind"),
+            "previews": doc.get("previews"),
             "createdAt": doc.get("createdAt"),
         }
         for doc in cursor
@@ -41,6 +42,7 @@ def filter_assets(user_id: str, asset_type: str) -> List[dict]:
             "url": doc.get("url"),
             "scene_index": doc.get("scene_index"),
             "kind": doc.get("kind"),
+            "previews": doc.get("previews"),
             "createdAt": doc.get("createdAt"),
         }
         for doc in cursor
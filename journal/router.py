@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
@@ -22,6 +22,8 @@ class AssetOut(BaseModel):
     type: str
     url: str
     scene_index: Optional[int] = None
+    # Video only: poster, thumbnails, sprite and sprite_vtt URLs.
+    previews: Optional[Dict[str, Any]] = None
     createdAt: Optional[datetime] = None
 
 
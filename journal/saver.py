@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
 
 from db.mongo import get_database
 
@@ -18,11 +21,17 @@ def _normalize_user_id(user_id: str) -> str:
     return str(user_id)
 
 
-def _insert_asset(user_id: str, asset_type: str, url: str, scene_index: Optional[int] = None) -> str:
+def _insert_asset(
+    user_id: str,
+    asset_type: str,
+    url: str,
+    scene_index: Optional[int] = None,
+    previews: Optional[Dict[str, Any]] = None,
+) -> str:
     """Insert a single asset document into the user_assets collection.
 
     Document fields strictly follow the requested schema:
-    userId, type, url, scene_index (optional), createdAt.
+    userId, type, url, scene_index (optional), previews (optional), createdAt.
     """
 
     col = _get_collection()
@@ -37,11 +46,33 @@ def _insert_asset(user_id: str, asset_type: str, url: str, scene_index: Optional
 
     if scene_index is not None:
         doc["scene_index"] = scene_index
+    if previews:
+        doc["previews"] = previews
 
     result = col.insert_one(doc)
     return str(result.inserted_id)
 
 
+def _upsert_asset(user_id: str, asset_type: str, url: str) -> str:
+    """Return the existing (userId, type, url) asset, inserting it if needed.
+
+    Used for content-addressed exports, where re-exporting the same story
+    yields the same URL and should not add another journal entry.
+    """
+
+    col = _get_collection()
+    now = datetime.utcnow()
+    key = {"userId": _normalize_user_id(user_id), "type": asset_type, "url": url}
+
+    doc = col.find_one_and_update(
+        key,
+        {"$setOnInsert": {**key, "createdAt": now}, "$set": {"updatedAt": now}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return str(doc["_id"])
+
+
 def save_image(user_id: str, url: str, scene_index: Optional[int] = None) -> str:
     return _insert_asset(user_id=user_id, asset_type="image", url=url, scene_index=scene_index)
 
@@ -50,20 +81,34 @@ def save_audio(user_id: str, url: str, scene_index: Optional[int] = None) -> str
     return _insert_asset(user_id=user_id, asset_type="audio", url=url, scene_index=scene_index)
 
 
-def save_video(user_id: str, url: str) -> str:
-    return _insert_asset(user_id=user_id, asset_type="video", url=url)
+def save_video(user_id: str, url: str, previews: Optional[Dict[str, Any]] = None) -> str:
+    """previews holds the poster/thumbnail/sprite URLs from video.previews.preview_urls."""
 
+    return _insert_asset(user_id=user_id, asset_type="video", url=url, previews=previews)
 
-def save_pdf(user_id: str, url: str, kind: str = "pdf") -> str:
+
+def save_pdf(user_id: str, url: str, kind: str = "pdf", dedupe: bool = False) -> str:
     """Save a PDF-like asset.
 
     kind is mapped onto the "type" field and should typically be
-    either "pdf" (storybook) or "comic".
+    either "pdf" (storybook) or "comic". With dedupe, an existing entry
+    for the same URL is reused instead of adding a new one.
     """
 
     asset_type = kind if kind in {"pdf", "comic"} else "pdf"
+    if dedupe:
+        return _upsert_asset(user_id=user_id, asset_type=asset_type, url=url)
     return _insert_asset(user_id=user_id, asset_type=asset_type, url=url)
 
 
-def save_zip(user_id: str, url: str) -> str:
+def save_zip(user_id: str, url: str, dedupe: bool = False) -> str:
+    if dedupe:
+        return _upsert_asset(user_id=user_id, asset_type="zip", url=url)
     return _insert_asset(user_id=user_id, asset_type="zip", url=url)
+
+
+def update_asset_url(asset_id: str, url: str) -> None:
+    """Point an existing asset at a new URL, e.g. after a video is re-rendered."""
+
+    col = _get_collection()
+    col.update_one({"_id": ObjectId(asset_id)}, {"$set": {"url": url, "updatedAt": datetime.utcnow()}})
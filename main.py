@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import Response
 import os
+import threading
 
 from config.settings import settings
 from db.mongo import connect_to_mongo, close_mongo_connection, get_database
@@ -13,8 +14,13 @@ from audio.router import router as audio_router
 from video.router import router as video_router
 from exporter.router import router as export_router
 from analytics.router import router as analytics_router
+from analytics.jobs import shutdown_scheduler, start_scheduler
+from analytics.sink import start_event_sink, stop_event_sink
 from journal.router import router as journal_router
 from tasks.router import router as tasks_router
+from video.bgm_library import warm_bgm_library
+from exporter.pages import shutdown_page_pool
+from video.parallel import shutdown_pool
 
 
 app = FastAPI(title=settings.app_name)
@@ -66,10 +72,20 @@ app.mount("/exports", StaticFiles(directory=_EXPORT_DIR), name="exports")
 @app.on_event("startup")
 def on_startup() -> None:
     connect_to_mongo()
+    start_event_sink()
+    if settings.analytics_snapshots_enabled:
+        start_scheduler()
+    # Decode + normalize BGM tracks up front so renders only memory-map them.
+    threading.Thread(target=warm_bgm_library, daemon=True).start()
 
 
 @app.on_event("shutdown")
 def on_shutdown() -> None:
+    shutdown_scheduler()
+    shutdown_pool()
+    shutdown_page_pool()
+    # Flush buffered analytics before the connection goes away.
+    stop_event_sink()
     close_mongo_connection()
 
 
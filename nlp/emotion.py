@@ -1,7 +1,8 @@
-from typing import Dict
+from typing import Dict, Tuple
 
 
-_DEFAULT_EMOTION = "mystery"
+DEFAULT_EMOTION = "mystery"
+EMOTIONS: Tuple[str, ...] = ("joy", "fear", "mystery", "adventure", "sad", "calm")
 
 
 def _keyword_scores(text: str) -> Dict[str, int]:
@@ -49,6 +50,6 @@ def detect_emotion(text: str) -> str:
 
     if value == 0:
         # No strong keyword match; treat as generic "mystery" story
-        return _DEFAULT_EMOTION
+        return DEFAULT_EMOTION
 
     return label
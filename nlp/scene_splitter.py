@@ -3,7 +3,7 @@ from typing import Dict, List
 import re
 
 
-def _split_sentences(text: str) -> List[str]:
+def split_sentences(text: str) -> List[str]:
     """Very simple sentence splitter using punctuation.
 
     We avoid heavy NLTK models here to keep the setup light and deterministic.
@@ -25,7 +25,7 @@ def split_into_scenes(text: str, sentences_per_scene: int = 3) -> List[Dict[str,
     Returns a list of scene dicts: {"id": int, "text": str}.
     """
 
-    sentences = _split_sentences(text)
+    sentences = split_sentences(text)
 
     scenes: List[Dict[str, str]] = []
     current: List[str] = []
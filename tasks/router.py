@@ -11,37 +11,22 @@ from pydantic import BaseModel
 from analytics.events import log_event
 from auth.jwt_handler import get_current_user
 from audio.tts_engine import generate_tts
-from db.mongo import get_database
 from imagegen.consistency import ConsistencyState, adjust_prompt_for_consistency, init_consistency_state
 from imagegen.sd15 import generate_sd15
 from imagegen.sdxl import generate_sdxl
 from journal.saver import save_audio, save_image, save_video
+from video.bgm_library import select_scene_bgm
 from video.composer import compose_video
-from video.lip_sync import lip_sync
+from video.hls import playlist_url, render_hls
+from video.parallel import ClipResult, clip_errors, render_clips_parallel
+from video.previews import preview_urls
+from video.renderer import render_story_video
+from video.subtitles import caption_video
+from .store import create_task, tasks_collection, update_task
 
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
-_TASKS_COLLECTION = "tasks"
-
-
-def _tasks_collection():
-    db = get_database()
-    return db[_TASKS_COLLECTION]
-
-
-def _update_task(task_id: str, fields: Dict[str, Any]) -> None:
-    col = _tasks_collection()
-    col.update_one(
-        {"_id": ObjectId(task_id)},
-        {
-            "$set": {
-                **fields,
-                "updatedAt": datetime.utcnow(),
-            }
-        },
-    )
-
 
 class SceneIn(BaseModel):
     id: Optional[int] = None
@@ -72,6 +57,14 @@ class AudioTaskRequest(BaseModel):
 class VideoTaskRequest(BaseModel):
     image_urls: List[str]
     audio_urls: List[str]
+    keep_scene_clips: bool = False
+    profile: Literal["standard", "still", "draft"] = "standard"
+    emotions: Optional[List[str]] = None
+    bgm: bool = True
+    # "hls" publishes a playlist that can be played while later scenes render.
+    output: Literal["mp4", "hls"] = "mp4"
+    scene_texts: Optional[List[str]] = None
+    soft_subtitles: bool = False
 
 
 class TaskCreateResponse(BaseModel):
@@ -80,11 +73,12 @@ class TaskCreateResponse(BaseModel):
 
 class TaskStatusResponse(BaseModel):
     id: str
-    type: Literal["image", "audio", "video"]
+    type: Literal["image", "audio", "video", "export"]
     status: Literal["queued", "running", "finishing", "complete", "failed"]
     progress: float
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    clips: Optional[List[Dict[str, Any]]] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
@@ -104,8 +98,8 @@ def _run_image_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
     from pathlib import Path
     from time import time as now_time
 
-    col = _tasks_collection()
-    _update_task(task_id, {"status": "running", "progress": 0.0})
+    col = tasks_collection()
+    update_task(task_id, {"status": "running", "progress": 0.0})
 
     try:
         req = ImageTaskRequest(**payload)
@@ -165,9 +159,9 @@ def _run_image_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
             save_image(user_id, public_url, scene_index=scene_id)
 
             progress = (index / total) * 100.0
-            _update_task(task_id, {"progress": progress})
+            update_task(task_id, {"progress": progress})
 
-        _update_task(
+        update_task(
             task_id,
             {
                 "status": "complete",
@@ -176,14 +170,14 @@ def _run_image_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
             },
         )
     except Exception as exc:  # pragma: no cover - defensive
-        _update_task(task_id, {"status": "failed", "error": str(exc)})
+        update_task(task_id, {"status": "failed", "error": str(exc)})
 
 
 def _run_audio_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None:
     from pathlib import Path
 
-    col = _tasks_collection()
-    _update_task(task_id, {"status": "running", "progress": 0.0})
+    col = tasks_collection()
+    update_task(task_id, {"status": "running", "progress": 0.0})
 
     try:
         req = AudioTaskRequest(**payload)
@@ -214,9 +208,9 @@ def _run_audio_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
             save_audio(user_id, public_url, scene_index=scene_id)
 
             progress = (index / total) * 100.0
-            _update_task(task_id, {"progress": progress})
+            update_task(task_id, {"progress": progress})
 
-        _update_task(
+        update_task(
             task_id,
             {
                 "status": "complete",
@@ -225,14 +219,14 @@ def _run_audio_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
             },
         )
     except Exception as exc:  # pragma: no cover - defensive
-        _update_task(task_id, {"status": "failed", "error": str(exc)})
+        update_task(task_id, {"status": "failed", "error": str(exc)})
 
 
 def _run_video_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None:
     from pathlib import Path
 
-    col = _tasks_collection()
-    _update_task(task_id, {"status": "running", "progress": 0.0})
+    col = tasks_collection()
+    update_task(task_id, {"status": "running", "progress": 0.0})
 
     try:
         req = VideoTaskRequest(**payload)
@@ -245,12 +239,12 @@ def _run_video_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
         _AUDIO_DIR = "generated_audio"
         _VIDEO_DIR = "generated_videos"
 
-        clip_paths: List[str] = []
+        image_paths: List[str] = []
         audio_paths: List[str] = []
 
         total = len(req.image_urls)
 
-        for index, (image_url, audio_url) in enumerate(zip(req.image_urls, req.audio_urls), start=1):
+        for image_url, audio_url in zip(req.image_urls, req.audio_urls):
             image_path = Path(_IMAGE_DIR) / Path(image_url).name
             audio_path = Path(_AUDIO_DIR) / Path(audio_url).name
 
@@ -259,34 +253,100 @@ def _run_video_task(task_id: str, payload: Dict[str, Any], user_id: str) -> None
             if not audio_path.is_file():
                 raise ValueError(f"Audio file not found: {audio_path.name}")
 
-            clip_path = lip_sync(str(image_path), str(audio_path), output_dir=_VIDEO_DIR)
-            clip_paths.append(clip_path)
+            image_paths.append(str(image_path))
             audio_paths.append(str(audio_path))
 
-            progress = (index / total) * 70.0  # first 70% while per-scene clips are built
-            _update_task(task_id, {"progress": progress})
+        scene_bgm = select_scene_bgm(req.emotions, len(image_paths)) if req.bgm else None
+
+        result: Dict[str, Any] = {}
 
-        bgm_path: Optional[str] = None
+        if req.output == "hls":
+
+            def on_segment(ready: int, total_segments: int, playlist_path: str) -> None:
+                progress = (ready / total_segments) * 90.0
+                update_task(
+                    task_id,
+                    {
+                        "progress": progress,
+                        "result": {"playlist_url": playlist_url(playlist_path, _VIDEO_DIR), "segments_ready": ready},
+                    },
+                )
 
-        _update_task(task_id, {"status": "finishing", "progress": 85.0})
+            hls = render_hls(
+                task_id,
+                image_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=req.profile,
+                scene_bgm=scene_bgm,
+                on_segment=on_segment,
+            )
+            result["playlist_url"] = playlist_url(hls["playlist_path"], _VIDEO_DIR)
+            final_video_path = hls["video_path"]
+        elif req.keep_scene_clips:
+            update_task(task_id, {"clips": [{"status": "queued"} for _ in range(total)]})
+
+            def on_clip_done(result: ClipResult, completed: int, total_clips: int) -> None:
+                clip_state: Dict[str, Any] = {"status": "failed" if result.error else "complete"}
+                if result.error:
+                    clip_state["error"] = result.error
+                progress = (completed / total_clips) * 70.0  # first 70% while per-scene clips are built
+                update_task(task_id, {"progress": progress, f"clips.{result.index}": clip_state})
+
+            results = render_clips_parallel(
+                list(zip(image_paths, audio_paths)),
+                output_dir=_VIDEO_DIR,
+                profile=req.profile,
+                on_progress=on_clip_done,
+            )
+            errors = clip_errors(results)
+            if errors:
+                raise RuntimeError("Clip rendering failed: " + "; ".join(errors))
+
+            clip_paths = [r.clip_path for r in results]
+            update_task(task_id, {"status": "finishing", "progress": 85.0})
+            final_video_path = compose_video(
+                clip_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=req.profile,
+                scene_bgm=scene_bgm,
+            )
+        else:
+            update_task(task_id, {"progress": 10.0})
+            final_video_path = render_story_video(
+                image_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=req.profile,
+                scene_bgm=scene_bgm,
+            )
 
-        final_video_path = compose_video(clip_paths, audio_paths, output_dir=_VIDEO_DIR, bgm_path=bgm_path)
         filename = Path(final_video_path).name
         video_url = f"/videos/{filename}"
+        result["video_url"] = video_url
+
+        if req.scene_texts is not None:
+            paths = caption_video(final_video_path, req.scene_texts, audio_paths, soft=req.soft_subtitles)
+            result["subtitles"] = {kind: f"/videos/{Path(path).name}" for kind, path in paths.items()}
 
-        log_event("video_rendered", meta={"clip_count": len(clip_paths)})
-        save_video(user_id, video_url)
+        previews = preview_urls(final_video_path, _VIDEO_DIR)
+        if previews:
+            result["previews"] = previews
 
-        _update_task(
+        log_event("video_rendered", meta={"clip_count": len(image_paths), "profile": req.profile, "output": req.output})
+        save_video(user_id, video_url, previews=previews)
+
+        update_task(
             task_id,
             {
                 "status": "complete",
                 "progress": 100.0,
-                "result": {"video_url": video_url},
+                "result": result,
             },
         )
     except Exception as exc:  # pragma: no cover - defensive
-        _update_task(task_id, {"status": "failed", "error": str(exc)})
+        update_task(task_id, {"status": "failed", "error": str(exc)})
 
 
 @router.post("/image", response_model=TaskCreateResponse)
@@ -300,20 +360,7 @@ async def create_image_task(
     if len(payload.scenes) > 10:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Maximum 10 scenes are allowed")
 
-    col = _tasks_collection()
-    now = datetime.utcnow()
-    doc = {
-        "type": "image",
-        "status": "queued",
-        "progress": 0.0,
-        "result": None,
-        "error": None,
-        "userId": current_user["id"],
-        "createdAt": now,
-        "updatedAt": now,
-    }
-    result = col.insert_one(doc)
-    task_id = str(result.inserted_id)
+    task_id = create_task("image", current_user["id"])
 
     background.add_task(_run_image_task, task_id, payload.dict(), current_user["id"])
 
@@ -331,20 +378,7 @@ async def create_audio_task(
     if len(payload.scenes) > 10:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Maximum 10 scenes are allowed")
 
-    col = _tasks_collection()
-    now = datetime.utcnow()
-    doc = {
-        "type": "audio",
-        "status": "queued",
-        "progress": 0.0,
-        "result": None,
-        "error": None,
-        "userId": current_user["id"],
-        "createdAt": now,
-        "updatedAt": now,
-    }
-    result = col.insert_one(doc)
-    task_id = str(result.inserted_id)
+    task_id = create_task("audio", current_user["id"])
 
     background.add_task(_run_audio_task, task_id, payload.dict(), current_user["id"])
 
@@ -364,21 +398,13 @@ async def create_video_task(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="image_urls and audio_urls must have the same length",
         )
+    if payload.scene_texts is not None and len(payload.scene_texts) != len(payload.audio_urls):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="scene_texts must have one entry per scene",
+        )
 
-    col = _tasks_collection()
-    now = datetime.utcnow()
-    doc = {
-        "type": "video",
-        "status": "queued",
-        "progress": 0.0,
-        "result": None,
-        "error": None,
-        "userId": current_user["id"],
-        "createdAt": now,
-        "updatedAt": now,
-    }
-    result = col.insert_one(doc)
-    task_id = str(result.inserted_id)
+    task_id = create_task("video", current_user["id"])
 
     background.add_task(_run_video_task, task_id, payload.dict(), current_user["id"])
 
@@ -387,7 +413,7 @@ async def create_video_task(
 
 @router.get("/status", response_model=TaskStatusResponse)
 async def get_task_status(id: str = Query(..., description="Task id")) -> TaskStatusResponse:
-    col = _tasks_collection()
+    col = tasks_collection()
     try:
         obj_id = ObjectId(id)
     except Exception as exc:  # pragma: no cover - defensive
@@ -404,6 +430,7 @@ async def get_task_status(id: str = Query(..., description="Task id")) -> TaskSt
         progress=float(doc.get("progress", 0.0)),
         result=doc.get("result"),
         error=doc.get("error"),
+        clips=doc.get("clips"),
         createdAt=doc.get("createdAt"),
         updatedAt=doc.get("updatedAt"),
     )
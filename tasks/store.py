@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict
+
+from bson import ObjectId
+
+from db.mongo import get_database
+
+
+_TASKS_COLLECTION = "tasks"
+
+
+def tasks_collection():
+    db = get_database()
+    return db[_TASKS_COLLECTION]
+
+
+def create_task(task_type: str, user_id: str) -> str:
+    """Insert a queued task document and return its id."""
+
+    now = datetime.utcnow()
+    doc = {
+        "type": task_type,
+        "status": "queued",
+        "progress": 0.0,
+        "result": None,
+        "error": None,
+        "userId": user_id,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    result = tasks_collection().insert_one(doc)
+    return str(result.inserted_id)
+
+
+def update_task(task_id: str, fields: Dict[str, Any]) -> None:
+    tasks_collection().update_one(
+        {"_id": ObjectId(task_id)},
+        {
+            "$set": {
+                **fields,
+                "updatedAt": datetime.utcnow(),
+            }
+        },
+    )
@@ -0,0 +1,107 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analytics import archive, export, retention
+from config.settings import settings
+
+
+_THROUGH = datetime(2026, 3, 3)
+
+
+class _Cursor(list):
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        return self
+
+
+class _Events:
+    """analytics_events holding the events newer than the archive."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        created_at = query.get("created_at", {})
+        return _Cursor(
+            doc
+            for doc in self.docs
+            if ("$gte" not in created_at or doc["created_at"] >= created_at["$gte"])
+            and ("$lt" not in created_at or doc["created_at"] < created_at["$lt"])
+        )
+
+
+def _event(event_id, created_at):
+    return {"_id": event_id, "event_type": "dream_created", "user_id": "u1", "created_at": created_at, "meta": {}}
+
+
+@pytest.fixture
+def archived(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_archive_dir", str(tmp_path))
+    monkeypatch.setattr(archive, "archived_through", lambda: _THROUGH)
+    monkeypatch.setattr(export, "ensure_event_indexes", lambda: None)
+    live = _Events([_event("live-1", _THROUGH + timedelta(hours=5))])
+    monkeypatch.setattr(export, "get_database", lambda: {"analytics_events": live})
+
+    for day, hours in ((datetime(2026, 3, 1), (1, 20)), (datetime(2026, 3, 2), (3,))):
+        rows = [export.event_row(_event(f"old-{day:%d}-{hour}", day + timedelta(hours=hour))) for hour in hours]
+        path = archive.day_dir(day) / f"events-{day:%Y-%m-%d}.0{archive.SUFFIXES['gzip']}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, "wb") as fh:
+            for chunk in export.iter_ndjson(rows):
+                fh.write(chunk)
+
+
+def test_aware_start_reads_archive_then_mongo(archived):
+    start = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+    rows = list(export.iter_event_rows(start=start))
+
+    assert [row["id"] for row in rows] == ["old-01-20", "old-02-3", "live-1"]
+
+
+def test_aware_range_is_converted_to_utc(archived):
+    # 2026-03-01 22:00 to 2026-03-02 04:00 UTC, given in UTC+2.
+    tz = timezone(timedelta(hours=2))
+    start = datetime(2026, 3, 2, 0, tzinfo=tz)
+    end = datetime(2026, 3, 2, 6, tzinfo=tz)
+
+    rows = list(export.iter_event_rows(start=start, end=end))
+
+    assert [row["id"] for row in rows] == ["old-02-3"]
+
+
+def test_aware_end_after_archive_reaches_mongo(archived):
+    end = datetime(2026, 3, 4, tzinfo=timezone.utc)
+
+    rows = list(archive.iter_archived_rows(end=end))
+
+    assert [row["id"] for row in rows] == ["old-01-1", "old-01-20", "old-02-3"]
+    assert [row["id"] for row in export.iter_event_rows(end=end)][-1] == "live-1"
+
+
+def test_part_written_concurrently_is_not_overwritten(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_archive_dir", str(tmp_path))
+    day = datetime(2026, 3, 1)
+    taken = archive.day_dir(day) / f"events-2026-03-01.0{archive.SUFFIXES['gzip']}"
+    real_next_part_path = archive.next_part_path
+
+    def racing_next_part_path(day, fmt):
+        # Another process claims part 0 after this one picked it.
+        if not taken.exists():
+            taken.write_bytes(b"theirs")
+            return taken
+        return real_next_part_path(day, fmt)
+
+    monkeypatch.setattr(archive, "next_part_path", racing_next_part_path)
+    rows = iter([export.event_row(_event("mine", day + timedelta(hours=1)))])
+
+    path = retention._write_part(day, rows, "gzip")
+
+    assert taken.read_bytes() == b"theirs"
+    assert path.name == "events-2026-03-01.1.ndjson.gz"
+    assert [row["id"] for row in archive.iter_part_rows(path)] == ["mine"]
+    assert sorted(p.name for p in path.parent.iterdir()) == [taken.name, path.name]
@@ -0,0 +1,49 @@
+import pytest
+
+from analytics.hll import REGISTERS, HyperLogLog
+
+
+def _sketch(ids) -> HyperLogLog:
+    sketch = HyperLogLog()
+    sketch.update(f"user-{i}" for i in ids)
+    return sketch
+
+
+@pytest.mark.parametrize("size", [100, 1_000, 10_000, 50_000, 200_000])
+def test_estimate_within_two_percent(size):
+    estimate = _sketch(range(size)).estimate()
+    assert abs(estimate - size) / size < 0.02
+
+
+def test_empty_sketch_estimates_zero():
+    assert HyperLogLog().estimate() == 0
+
+
+def test_union_equals_sketch_of_combined_ids():
+    first = _sketch(range(0, 60_000))
+    second = _sketch(range(40_000, 100_000))
+    third = _sketch(range(90_000, 120_000))
+    combined = _sketch(range(120_000))
+
+    union = HyperLogLog.union([first, second.to_bytes(), third])
+    assert union.to_bytes() == combined.to_bytes()
+    assert union.estimate() == combined.estimate()
+
+
+def test_merge_reports_changes():
+    sketch = _sketch(range(1_000))
+    assert not sketch.merge(_sketch(range(500)))
+    assert sketch.merge(_sketch(range(1_000, 2_000)))
+    assert sketch.to_bytes() == _sketch(range(2_000)).to_bytes()
+
+
+def test_round_trip_through_bytes():
+    sketch = _sketch(range(5_000))
+    data = sketch.to_bytes()
+    assert len(data) == REGISTERS
+    assert HyperLogLog(data).to_bytes() == data
+
+
+def test_rejects_wrong_register_count():
+    with pytest.raises(ValueError):
+        HyperLogLog(b"\x00" * 10)
@@ -0,0 +1,96 @@
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from analytics import rollups, sink
+
+
+_WHEN = datetime(2026, 3, 1, 9, 30)
+
+
+class _Rollups:
+    """analytics_rollups with just the counter and sketch writes the sink makes."""
+
+    name = "analytics_rollups"
+
+    def __init__(self):
+        self.counts = defaultdict(float)
+        self.sketches = defaultdict(int)
+        self.fail_bulk_at = None
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def bulk_write(self, ops, ordered=True):
+        failed = self.fail_bulk_at
+        self.fail_bulk_at = None
+        errors = []
+        for index, op in enumerate(ops):
+            if index == failed:
+                errors.append({"index": index, "code": 1, "errmsg": "injected"})
+                continue
+            self.counts[op._filter["_id"]] += op._doc["$inc"]["count"]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+@pytest.fixture
+def store(monkeypatch):
+    collection = _Rollups()
+    failures = {"sketch": 0}
+
+    def merge_sketch(coll, day, sketch):
+        if failures["sketch"]:
+            failures["sketch"] -= 1
+            raise RuntimeError("sketch merge failed")
+        coll.sketches[day] += 1
+
+    monkeypatch.setattr(rollups, "_rollups_collection", lambda name=None: collection)
+    monkeypatch.setattr(rollups, "_merge_sketch", merge_sketch)
+    monkeypatch.setattr(sink, "insert_events", lambda docs: list(docs))
+    return collection, failures
+
+
+def _sink():
+    return sink.EventSink(max_buffer=100, batch_size=10, flush_seconds=1.0, block_seconds=0.0)
+
+
+def _event(event_type="dream_created"):
+    return {"event_type": event_type, "user_id": "u1", "created_at": _WHEN}
+
+
+def _count(collection, granularity, event_type="dream_created"):
+    bucket = rollups.bucket_start(_WHEN, granularity)
+    return collection.counts[rollups.rollup_id(granularity, event_type, bucket)]
+
+
+def test_failed_sketch_merge_is_retried_without_recounting(store):
+    collection, failures = store
+    failures["sketch"] = 1
+    events = _sink()
+
+    events.submit(_event())
+    events.flush()  # the retry happens in the same flush, on its final empty pass
+
+    assert [_count(collection, g) for g in rollups.GRANULARITIES] == [1, 1, 1]
+    assert collection.sketches == {datetime(2026, 3, 1): 1}
+    stats = events.snapshot()
+    assert (stats["rollup_failed"], stats["rollup_pending"], stats["rollup_dropped"]) == (1, 0, 0)
+
+
+def test_partial_bulk_write_retries_only_failed_counters(store):
+    collection, _ = store
+    collection.fail_bulk_at = 1
+    events = _sink()
+
+    events.submit(_event("dream_created"))
+    events.submit(_event("image_generated"))
+    events.flush()
+    events.flush()
+
+    for event_type in ("dream_created", "image_generated"):
+        assert [_count(collection, g, event_type) for g in rollups.GRANULARITIES] == [1, 1, 1]
+    assert collection.sketches == {datetime(2026, 3, 1): 1}
+    assert events.snapshot()["rollup_pending"] == 0
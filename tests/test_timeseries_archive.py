@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from analytics import aggregator, archive, rollups
+
+
+def test_kolkata_days_before_archive_come_from_hourly_rollups(monkeypatch):
+    raw_since = []
+
+    def series(event_types, granularity, start, end, field="count"):
+        assert granularity == "hour"
+        hours = {
+            datetime(2026, 2, 28, 18, 0): 1.0,  # 23:30 IST on Feb 28, counted from 00:00 IST Mar 1
+            datetime(2026, 3, 1, 3, 0): 2.0,  # 08:30 IST on Mar 1
+            datetime(2026, 3, 1, 20, 0): 4.0,  # 01:30 IST on Mar 2
+        }
+        return {hour: value for hour, value in hours.items() if start <= hour < end}
+
+    def truncated(definition, buckets, unit, tz_name, since):
+        raw_since.append(since)
+        return [(datetime(2026, 3, 2, 18, 30), 8.0)]  # 00:00 IST on Mar 3
+
+    monkeypatch.setattr(archive, "archived_through", lambda: datetime(2026, 3, 2))
+    monkeypatch.setattr(rollups, "series", series)
+    monkeypatch.setattr(aggregator, "_truncated_event_points", truncated)
+
+    points = aggregator.get_timeseries(
+        "dreams", start=datetime(2026, 3, 1), end=datetime(2026, 3, 4), tz_name="Asia/Kolkata"
+    )
+
+    assert points == [
+        {"date": "2026-03-01", "value": 3.0},
+        {"date": "2026-03-02", "value": 4.0},
+        {"date": "2026-03-03", "value": 8.0},
+    ]
+    assert raw_since == [datetime(2026, 3, 2)]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from audio.voice_styles import VOICE_STYLES, transform_samples
+
+
+_RATE = 24000
+
+# Reference output of transform_samples on _signal(); (rms, peak) per style.
+_GOLDEN = {
+    "default": (0.22446, 0.45948),
+    "slow": (0.22425, 0.45509),
+    "fast": (0.22423, 0.45868),
+    "deep": (0.26435, 0.50080),
+    "high": (0.22278, 0.44404),
+    "warm": (0.30345, 0.55606),
+    "bright": (0.17400, 0.40858),
+    "storyteller": (0.26064, 0.48810),
+}
+
+
+def _signal() -> np.ndarray:
+    rng = np.random.default_rng(1234)
+    t = np.arange(2 * _RATE) / _RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.1 * np.sin(2 * np.pi * 1800 * t)
+    return (signal + 0.02 * rng.standard_normal(t.size)).astype(np.float32)
+
+
+def _rms(samples: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+
+def test_golden_covers_every_style():
+    assert set(_GOLDEN) == set(VOICE_STYLES)
+
+
+@pytest.mark.parametrize("name", sorted(VOICE_STYLES))
+def test_transform_samples_matches_golden(name):
+    samples = _signal()
+    style = VOICE_STYLES[name]
+
+    out = transform_samples(samples, _RATE, style)
+
+    assert out.dtype == np.float32
+    assert abs(out.size - samples.size / style.speed) <= 2
+    expected_rms, expected_peak = _GOLDEN[name]
+    assert _rms(out) == pytest.approx(expected_rms, rel=0.02)
+    assert float(np.max(np.abs(out))) == pytest.approx(expected_peak, rel=0.02)
+    assert float(np.max(np.abs(out))) <= 1.0
+
+
+@pytest.mark.parametrize("name", ["slow", "fast"])
+def test_time_stretch_keeps_input_level(name):
+    samples = _signal()
+
+    out = transform_samples(samples, _RATE, VOICE_STYLES[name])
+
+    assert _rms(out) == pytest.approx(_rms(samples), rel=0.01)
+
+
+def test_transform_samples_is_deterministic():
+    samples = _signal()
+    style = VOICE_STYLES["storyteller"]
+
+    np.testing.assert_array_equal(transform_samples(samples, _RATE, style), transform_samples(samples, _RATE, style))
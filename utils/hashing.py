@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Dict, Tuple
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256 hex digest. Generated assets are written
+# once and never modified in place, so size + mtime is a safe cache key.
+_FILE_HASH_CACHE: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 of a file's contents, memoized per (size, mtime)."""
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    cached = _FILE_HASH_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    value = digest.hexdigest()
+    _FILE_HASH_CACHE[key] = value
+    return value
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+
+def evict_lru(
+    cache_dir: Path,
+    suffix: str,
+    max_bytes: int,
+    keep: Optional[Path] = None,
+    protect_seconds: float = 0.0,
+) -> None:
+    """Delete the least recently used files ending in suffix until cache_dir fits max_bytes.
+
+    Recency is the file mtime, which cache hits refresh with os.utime.
+    Files used within the last protect_seconds are never deleted, even if
+    the directory stays over max_bytes.
+    """
+
+    protected_since = time.time() - protect_seconds
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file() or not entry.name.endswith(suffix):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:  # evicted concurrently by another worker
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return
+
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and Path(path) == keep:
+            continue
+        if protect_seconds and mtime >= protected_since:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,166 @@
+"""Raw PCM access to audio files, shared by the audio and video layers."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Iterator, Optional
+
+import numpy as np
+
+try:  # Optional: bundled ffmpeg binary shipped with imageio-ffmpeg
+    import imageio_ffmpeg  # type: ignore
+except Exception:  # pragma: no cover - defensive import guard
+    imageio_ffmpeg = None  # type: ignore
+
+
+_WAVE_FORMAT_PCM = 1
+
+_ffmpeg_exe: Optional[str] = None
+
+
+def get_ffmpeg_exe() -> str:
+    """Locate an ffmpeg binary: PATH first, then the imageio-ffmpeg bundle."""
+
+    global _ffmpeg_exe
+
+    if _ffmpeg_exe is None:
+        exe = shutil.which("ffmpeg")
+        if exe is None and imageio_ffmpeg is not None:
+            try:
+                exe = imageio_ffmpeg.get_ffmpeg_exe()
+            except Exception:
+                exe = None
+        if exe is None:
+            raise RuntimeError("ffmpeg was not found on PATH and imageio-ffmpeg is not installed.")
+        _ffmpeg_exe = exe
+
+    return _ffmpeg_exe
+
+
+def wav_memmap(path: str) -> Optional[tuple[np.memmap, int]]:
+    """Memory-map the sample data of a 16-bit PCM WAV file.
+
+    Returns (frames x channels int16 memmap, sample_rate), or None if the file
+    is not a plain 16-bit PCM WAV and has to be decoded instead.
+    """
+
+    try:
+        with open(path, "rb") as fh:
+            header = fh.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+
+            fmt = None
+            while True:
+                chunk = fh.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = struct.unpack("<4sI", chunk)
+                if chunk_id == b"fmt ":
+                    fmt = struct.unpack("<HHIIHH", fh.read(16))
+                    fh.seek(size - 16 + (size & 1), 1)
+                elif chunk_id == b"data":
+                    data_offset = fh.tell()
+                    break
+                else:
+                    fh.seek(size + (size & 1), 1)
+    except OSError:
+        return None
+
+    if fmt is None:
+        return None
+    audio_format, channels, rate, _, _, bits = fmt
+    if audio_format != _WAVE_FORMAT_PCM or bits != 16 or channels < 1:
+        return None
+
+    # Streaming writers may leave the data size unset; trust the file size then.
+    available = os.path.getsize(path) - data_offset
+    frames = min(size, available) // (2 * channels)
+    if frames == 0:
+        return None
+    data = np.memmap(path, dtype="<i2", mode="r", offset=data_offset, shape=(frames, channels))
+    return data, rate
+
+
+def iter_pcm_blocks(
+    path: str,
+    sample_rate: int,
+    channels: int,
+    block_frames: int,
+) -> Iterator[np.ndarray]:
+    """Yield int16 PCM blocks of shape (frames, channels) from any audio file.
+
+    Matching 16-bit WAV files are memory-mapped; everything else is decoded
+    by an ffmpeg subprocess and read from its stdout, so memory use is bounded
+    by block_frames regardless of the file length.
+    """
+
+    mapped = wav_memmap(path)
+    if mapped is not None:
+        data, rate = mapped
+        if rate == sample_rate and data.shape[1] in (1, channels):
+            for start in range(0, data.shape[0], block_frames):
+                block = np.asarray(data[start : start + block_frames])
+                if block.shape[1] != channels:
+                    block = np.repeat(block, channels, axis=1)
+                yield block
+            return
+
+    if channels == 2:
+        # ffmpeg's default mono -> stereo upmix puts the source at -3 dB on
+        # each side; duplicate it at full level instead, like a WAV would be.
+        channel_args = ["-af", "pan=stereo|FL=FL+FC|FR=FR+FC"]
+    else:
+        channel_args = ["-ac", str(channels)]
+
+    cmd = [
+        get_ffmpeg_exe(),
+        "-hide_banner",
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        path,
+        *channel_args,
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(sample_rate),
+        "-",
+    ]
+    # stderr goes to a file rather than a pipe so a chatty decoder can never
+    # block on a full pipe while we are reading stdout.
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        assert proc.stdout is not None
+        block_bytes = block_frames * channels * 2
+        try:
+            pending = b""
+            while True:
+                chunk = proc.stdout.read(block_bytes - len(pending))
+                if not chunk:
+                    break
+                pending += chunk
+                if len(pending) == block_bytes:
+                    yield np.frombuffer(pending, dtype="<i2").reshape(-1, channels)
+                    pending = b""
+            usable = len(pending) - len(pending) % (channels * 2)
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype="<i2").reshape(-1, channels)
+        finally:
+            # Reached early if the consumer stops iterating.
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+        if proc.returncode != 0:
+            err.seek(0)
+            message = err.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"ffmpeg could not decode {path}: {message}")
@@ -1,53 +1,230 @@
 from __future__ import annotations
 
+import wave
 from pathlib import Path
 from time import time
-from typing import Optional, Sequence
+from typing import Iterator, Optional, Sequence
 
-from pydub import AudioSegment
+import numpy as np
 
-# Point pydub to the exact ffmpeg.exe location on Windows
-AudioSegment.converter = r"C:\ffmpeg-8.0.1-full_build\bin\ffmpeg.exe"
+from utils.pcm import iter_pcm_blocks, wav_memmap
 
 _DEFAULT_OUTPUT_DIR = "generated_videos"
 
+SAMPLE_RATE = 44100
+CHANNELS = 2
+_BLOCK_FRAMES = SAMPLE_RATE  # one second per block keeps memory constant
+
+_BGM_LOOP_CROSSFADE_SECONDS = 1.0
+_SCENE_CROSSFADE_SECONDS = 1.5
+_DUCK_WINDOW_SECONDS = 0.02
+_DUCK_THRESHOLD = 0.02  # narration RMS (full scale = 1.0) that triggers ducking
+_DUCK_ATTACK_SECONDS = 0.05
+_DUCK_RELEASE_SECONDS = 0.4
+
+
+def _db_to_gain(db: float) -> float:
+    return float(10.0 ** (db / 20.0))
+
+
+class LoopedBgm:
+    """Endless, seamlessly looping view over a PCM buffer.
+
+    The last crossfade_frames of the track are blended into its first
+    crossfade_frames, so the loop period is len(pcm) - crossfade_frames and
+    there is no click at the wrap point. Reads index straight into pcm (which
+    may be a read-only memmap); nothing is tiled or copied up front.
+    """
+
+    def __init__(self, pcm: np.ndarray, crossfade_frames: int) -> None:
+        self.pcm = pcm
+        self.crossfade = max(0, min(int(crossfade_frames), pcm.shape[0] // 2))
+        self.period = pcm.shape[0] - self.crossfade
+        ramp = np.linspace(0.0, 1.0, self.crossfade, endpoint=False, dtype=np.float32)
+        self._fade_in = ramp[:, None]
+        self._fade_out = (1.0 - ramp)[:, None]
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        """Return float32 samples (frames x channels) starting at loop position start."""
+
+        positions = (start + np.arange(frames)) % self.period
+        out = self.pcm[positions].astype(np.float32)
+
+        if self.crossfade:
+            head = positions < self.crossfade
+            if np.any(head):
+                idx = positions[head]
+                tail = self.pcm[self.period + idx].astype(np.float32)
+                # The first pass fades in from silence; later passes blend with the previous tail.
+                wrapped = ((start + np.flatnonzero(head)) >= self.period)[:, None]
+                out[head] = out[head] * self._fade_in[idx] + np.where(wrapped, tail * self._fade_out[idx], 0.0)
+
+        return out
+
+
+def load_bgm(path: str, crossfade_seconds: float = _BGM_LOOP_CROSSFADE_SECONDS) -> LoopedBgm:
+    """Open a BGM track for looping; WAVs in the mixer format are memory-mapped."""
+
+    mapped = wav_memmap(path)
+    if mapped is not None and mapped[1] == SAMPLE_RATE and mapped[0].shape[1] == CHANNELS:
+        pcm = mapped[0]
+    else:
+        blocks = list(iter_pcm_blocks(path, SAMPLE_RATE, CHANNELS, _BLOCK_FRAMES))
+        if not blocks:
+            raise ValueError(f"BGM track is empty: {path}")
+        pcm = np.concatenate(blocks)
+
+    return LoopedBgm(pcm, int(crossfade_seconds * SAMPLE_RATE))
+
+
+class _Ducker:
+    """Sidechain gain follower: lowers the BGM while narration is audible."""
+
+    def __init__(self, duck_db: float) -> None:
+        self.window = max(int(_DUCK_WINDOW_SECONDS * SAMPLE_RATE), 1)
+        self.duck_gain = _db_to_gain(duck_db)
+        self.attack = 1.0 - np.exp(-_DUCK_WINDOW_SECONDS / _DUCK_ATTACK_SECONDS)
+        self.release = 1.0 - np.exp(-_DUCK_WINDOW_SECONDS / _DUCK_RELEASE_SECONDS)
+        self.gain = 1.0
+
+    def gains(self, narration: np.ndarray) -> np.ndarray:
+        frames = narration.shape[0]
+        windows = -(-frames // self.window)
+        padded = np.zeros((windows * self.window, narration.shape[1]), dtype=np.float32)
+        padded[:frames] = narration
+        rms = np.sqrt(np.mean(padded.reshape(windows, -1) ** 2, axis=1))
+        targets = np.where(rms > _DUCK_THRESHOLD, self.duck_gain, 1.0)
+
+        # One-pole smoothing has to be sequential, but it runs per 20 ms
+        # window rather than per sample.
+        smoothed = np.empty(windows, dtype=np.float32)
+        gain = self.gain
+        for i, target in enumerate(targets):
+            coeff = self.attack if target < gain else self.release
+            gain += (target - gain) * coeff
+            smoothed[i] = gain
+        self.gain = gain
+
+        return np.repeat(smoothed, self.window)[:frames, None]
+
+
+def _fit_blocks(blocks: Iterator[np.ndarray], target_frames: Optional[int]) -> Iterator[np.ndarray]:
+    """Trim or silence-pad a scene's narration blocks to exactly target_frames."""
+
+    written = 0
+    for block in blocks:
+        if target_frames is not None:
+            block = block[: max(target_frames - written, 0)]
+            if block.shape[0] == 0:
+                break
+        written += block.shape[0]
+        yield block
+
+    if target_frames is not None:
+        while written < target_frames:
+            frames = min(_BLOCK_FRAMES, target_frames - written)
+            written += frames
+            yield np.zeros((frames, CHANNELS), dtype="<i2")
+
+
+def _scene_music(
+    track: Optional[LoopedBgm],
+    previous: Optional[LoopedBgm],
+    position: int,
+    scene_frame: int,
+    frames: int,
+) -> Optional[np.ndarray]:
+    """BGM samples for one narration block, crossfading when the scene switched tracks."""
+
+    current = track.read(position, frames) if track is not None else None
+    crossfade = int(_SCENE_CROSSFADE_SECONDS * SAMPLE_RATE)
+    if track is previous or previous is None or scene_frame >= crossfade:
+        return current
+
+    ramp = np.clip((scene_frame + np.arange(frames)) / crossfade, 0.0, 1.0).astype(np.float32)[:, None]
+    music = previous.read(position, frames) * (1.0 - ramp)
+    if current is not None:
+        music += current * ramp
+    return music
+
 
 def mix_scenes_with_bgm(
     audio_paths: Sequence[str],
     output_dir: str = _DEFAULT_OUTPUT_DIR,
     bgm_path: Optional[str] = None,
     bgm_gain_db: float = -18.0,
+    duck_db: float = -8.0,
+    scene_bgm: Optional[Sequence[Optional[LoopedBgm]]] = None,
+    scene_durations: Optional[Sequence[float]] = None,
 ) -> str:
     """Merge scene narration audio files and optionally overlay soft BGM.
 
+    Narration is streamed block by block (memory-mapped when the inputs are
+    already 16-bit WAV, decoded by ffmpeg otherwise); the BGM is looped with a
+    crossfade, attenuated by bgm_gain_db and further ducked by duck_db while
+    narration is playing. Output is written in chunks, so memory use does not
+    grow with the length of the story.
+
+    scene_bgm optionally gives one track per scene (see video.bgm_library)
+    and takes precedence over bgm_path; switching tracks between scenes
+    crossfades them. scene_durations, if given, trims or pads each scene's
+    narration to that many seconds so the audio lines up with video segments
+    whose lengths are rounded to whole frames.
+
     Returns the path to a WAV file containing the final mixed audio.
     """
 
     if not audio_paths:
         raise ValueError("At least one narration audio path is required.")
 
-    combined = AudioSegment.empty()
-    for path in audio_paths:
-        segment = AudioSegment.from_file(path)
-        combined += segment
-
-    if bgm_path is not None and Path(bgm_path).is_file():
-        bgm = AudioSegment.from_file(bgm_path)
-
-        if len(bgm) < len(combined):
-            loops = int(len(combined) / len(bgm)) + 1
-            bgm = (bgm * loops)[: len(combined)]
-        else:
-            bgm = bgm[: len(combined)]
-
-        bgm = bgm + bgm_gain_db
-        final_audio = bgm.overlay(combined)
+    if scene_bgm is not None:
+        tracks = list(scene_bgm) + [None] * (len(audio_paths) - len(scene_bgm))
     else:
-        final_audio = combined
+        bgm: Optional[LoopedBgm] = None
+        if bgm_path is not None and Path(bgm_path).is_file():
+            bgm = load_bgm(bgm_path)
+        tracks = [bgm] * len(audio_paths)
 
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     filename = out_dir / f"final_audio_{int(time())}.wav"
-    final_audio.export(filename, format="wav")
+
+    bgm_gain = _db_to_gain(bgm_gain_db)
+    ducker = _Ducker(duck_db)
+    position = 0
+    previous: Optional[LoopedBgm] = None
+
+    with wave.open(str(filename), "wb") as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+
+        for index, (path, track) in enumerate(zip(audio_paths, tracks)):
+            target_frames = None
+            if scene_durations is not None:
+                target_frames = int(round(scene_durations[index] * SAMPLE_RATE))
+
+            scene_frame = 0
+            blocks = iter_pcm_blocks(str(path), SAMPLE_RATE, CHANNELS, _BLOCK_FRAMES)
+            for block in _fit_blocks(blocks, target_frames):
+                frames = block.shape[0]
+                narration = block.astype(np.float32) / 32768.0
+                # The ducker follows the narration even without music so its
+                # state is continuous when a later scene brings BGM in.
+                duck = ducker.gains(narration)
+                music = _scene_music(track, previous, position, scene_frame, frames)
+                if music is None:
+                    wf.writeframes(np.ascontiguousarray(block, dtype="<i2").tobytes())
+                else:
+                    mixed = narration + (music / 32768.0) * (bgm_gain * duck)
+                    pcm = (np.clip(mixed, -1.0, 1.0) * 32767.0).astype("<i2")
+                    wf.writeframes(pcm.tobytes())
+                position += frames
+                scene_frame += frames
+            previous = track
+
+    if position == 0:
+        raise ValueError("Narration audio is empty.")
+
     return str(filename)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import threading
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config.settings import settings
+from nlp.emotion import DEFAULT_EMOTION, EMOTIONS
+from utils.hashing import file_sha256
+from utils.pcm import iter_pcm_blocks
+from .bgm import CHANNELS, SAMPLE_RATE, LoopedBgm, load_bgm
+
+_AUDIO_EXTENSIONS = {".mp3", ".wav", ".ogg", ".m4a", ".flac"}
+_BLOCK_FRAMES = SAMPLE_RATE * 10
+
+_TARGET_RMS = 10.0 ** (-20.0 / 20.0)  # -20 dBFS
+_PEAK_CEILING = 0.98
+
+_library: Optional[Dict[str, List[Path]]] = None
+_tracks: Dict[str, LoopedBgm] = {}
+_lock = threading.Lock()
+
+
+def _scan_library() -> Dict[str, List[Path]]:
+    """Map each emotion to its BGM files: <bgm_dir>/<emotion>/* or <bgm_dir>/<emotion>.*"""
+
+    root = Path(settings.bgm_dir)
+    library: Dict[str, List[Path]] = {}
+
+    for emotion in EMOTIONS:
+        files: List[Path] = []
+        folder = root / emotion
+        if folder.is_dir():
+            files += [p for p in folder.iterdir() if p.suffix.lower() in _AUDIO_EXTENSIONS]
+        if root.is_dir():
+            files += [p for p in root.glob(f"{emotion}.*") if p.suffix.lower() in _AUDIO_EXTENSIONS]
+        if files:
+            library[emotion] = sorted(files)
+
+    return library
+
+
+def _get_library() -> Dict[str, List[Path]]:
+    global _library
+
+    if _library is None:
+        _library = _scan_library()
+    return _library
+
+
+def _normalize_to_cache(source: Path) -> Path:
+    """Decode a track once into a loudness-normalized WAV in the mixer format.
+
+    Two streaming passes: the first measures RMS and peak, the second writes
+    the scaled PCM. Later renders memory-map the result instead of decoding.
+    """
+
+    cache_dir = Path(settings.bgm_cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    target = cache_dir / f"{file_sha256(str(source))[:24]}.wav"
+    if target.is_file():
+        return target
+
+    sum_squares = 0.0
+    peak = 0.0
+    frames = 0
+    for block in iter_pcm_blocks(str(source), SAMPLE_RATE, CHANNELS, _BLOCK_FRAMES):
+        samples = block.astype(np.float64) / 32768.0
+        sum_squares += float(np.sum(samples * samples))
+        peak = max(peak, float(np.max(np.abs(samples))))
+        frames += block.shape[0]
+
+    if frames == 0 or peak == 0.0:
+        raise ValueError(f"BGM track is silent or empty: {source}")
+
+    rms = (sum_squares / (frames * CHANNELS)) ** 0.5
+    gain = min(_TARGET_RMS / rms, _PEAK_CEILING / peak)
+
+    tmp = target.with_suffix(".tmp")
+    with wave.open(str(tmp), "wb") as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        for block in iter_pcm_blocks(str(source), SAMPLE_RATE, CHANNELS, _BLOCK_FRAMES):
+            scaled = np.clip(block.astype(np.float32) * gain, -32768, 32767).astype("<i2")
+            wf.writeframes(scaled.tobytes())
+    os.replace(tmp, target)
+
+    return target
+
+
+def _load_track(source: Path) -> LoopedBgm:
+    key = str(source.resolve())
+    track = _tracks.get(key)
+    if track is None:
+        track = load_bgm(str(_normalize_to_cache(source)))
+        _tracks[key] = track
+    return track
+
+
+def get_bgm_for_emotion(emotion: Optional[str]) -> Optional[LoopedBgm]:
+    """Return the looping BGM track for an emotion label, or None if the library has none.
+
+    Unknown or missing emotions fall back to the default emotion's tracks.
+    """
+
+    library = _get_library()
+    key = (emotion or DEFAULT_EMOTION).strip().lower()
+    files = library.get(key) or library.get(DEFAULT_EMOTION)
+    if not files:
+        return None
+
+    with _lock:
+        return _load_track(files[0])
+
+
+def select_scene_bgm(emotions: Optional[Sequence[Optional[str]]], scene_count: int) -> List[Optional[LoopedBgm]]:
+    """Pick one BGM track per scene from the scene emotions."""
+
+    labels = list(emotions or [])
+    labels += [None] * (scene_count - len(labels))
+    return [get_bgm_for_emotion(label) for label in labels[:scene_count]]
+
+
+def warm_bgm_library() -> None:
+    """Decode and normalize every library track so renders only memory-map them."""
+
+    for files in _get_library().values():
+        try:
+            with _lock:
+                _load_track(files[0])
+        except Exception:  # pragma: no cover - a broken track must not stop startup
+            continue
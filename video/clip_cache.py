@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+from config.settings import settings
+from utils.hashing import file_sha256
+from utils.lru_dir import evict_lru
+from .profiles import RenderProfile
+
+_CACHE_DIRNAME = ".clip_cache"
+# Bump when lip_sync output changes in a way the profile does not capture.
+_CACHE_VERSION = 1
+
+
+def _cache_dir(output_dir: str) -> Path:
+    return Path(output_dir) / _CACHE_DIRNAME
+
+
+def clip_cache_key(image_path: str, audio_path: str, profile: RenderProfile) -> str:
+    """Content key for a lip_sync clip: image bytes, audio bytes and encoder settings."""
+
+    material = f"{_CACHE_VERSION}:{file_sha256(image_path)}:{file_sha256(audio_path)}:{profile!r}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def get_cached_clip(key: str, output_dir: str) -> Optional[str]:
+    path = _cache_dir(output_dir) / f"{key}.mp4"
+    try:
+        # Touch on hit so eviction is least-recently-used.
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return str(path)
+
+
+def store_clip(key: str, rendered_path: str, output_dir: str) -> str:
+    """Move a freshly rendered clip into the cache and return its cached path."""
+
+    cache_dir = _cache_dir(output_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    path = cache_dir / f"{key}.mp4"
+    os.replace(rendered_path, path)
+    evict_lru(cache_dir, ".mp4", settings.clip_cache_max_mb * 1024 * 1024, keep=path)
+    return str(path)
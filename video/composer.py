@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from pathlib import Path
 from time import time
-from typing import List, Optional, Sequence
-import gc
+from typing import Optional, Sequence
 
-from moviepy.editor import AudioFileClip, VideoFileClip, concatenate_videoclips
-
-from .bgm import mix_scenes_with_bgm
+from .bgm import LoopedBgm, mix_scenes_with_bgm
+from .ffmpeg_tools import probe_duration, probe_video_size, run_ffmpeg
+from .previews import PreviewPlan, plan_previews, write_sprite_vtt
+from .profiles import get_render_profile
+from .renderer import build_compose_args
 
 _DEFAULT_OUTPUT_DIR = "generated_videos"
 
@@ -17,53 +18,50 @@ def compose_video(
     audio_paths: Sequence[str],
     output_dir: str = _DEFAULT_OUTPUT_DIR,
     bgm_path: Optional[str] = None,
+    profile: Optional[str] = None,
+    scene_bgm: Optional[Sequence[Optional[LoopedBgm]]] = None,
+    previews: bool = True,
 ) -> str:
-    """Combine per-scene clips and audio into a single MP4 video."""
+    """Combine per-scene clips and audio into a single MP4 video.
+
+    Clips are faded, centered on a canvas the size of the largest one and
+    concatenated in a single ffmpeg pass that also muxes the mixed audio
+    and, with previews, writes the poster/thumbnails/sprite sheet.
+    """
 
     if not clip_paths:
         raise ValueError("At least one video clip is required.")
     if len(clip_paths) != len(audio_paths):
         raise ValueError("clip_paths and audio_paths must have the same length.")
 
+    render_profile = get_render_profile(profile)
+
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    clips: List[VideoFileClip] = []
-    composite_clip: Optional[VideoFileClip] = None
-    audio_clip: Optional[AudioFileClip] = None
-    final_video_path: Optional[Path] = None
-
-    try:
-        for path in clip_paths:
-            clip = VideoFileClip(str(path))
-            clip = clip.fadein(0.3).fadeout(0.3)
-            clips.append(clip)
-
-        composite_clip = concatenate_videoclips(clips, method="compose")
-
-        mixed_audio_path = mix_scenes_with_bgm(audio_paths, output_dir=str(out_dir), bgm_path=bgm_path)
-        audio_clip = AudioFileClip(mixed_audio_path)
-        composite_clip = composite_clip.set_audio(audio_clip)
+    durations = [probe_duration(str(path)) for path in clip_paths]
+    sizes = [probe_video_size(str(path)) for path in clip_paths]
+    canvas = (
+        max(max(w for w, _ in sizes) // 2 * 2, 2),
+        max(max(h for _, h in sizes) // 2 * 2, 2),
+    )
 
-        filename = out_dir / f"final_video_{int(time())}.mp4"
-        composite_clip.write_videofile(
-            str(filename),
-            codec="libx264",
-            audio_codec="aac",
-            verbose=False,
-            logger=None,
-        )
-        final_video_path = filename
-    finally:
-        for clip in clips:
-            clip.close()
-        if audio_clip is not None:
-            audio_clip.close()
-        if composite_clip is not None:
-            composite_clip.close()
-        gc.collect()
+    mixed_audio_path = mix_scenes_with_bgm(
+        audio_paths,
+        output_dir=str(out_dir),
+        bgm_path=bgm_path,
+        scene_bgm=scene_bgm,
+    )
 
-    if final_video_path is None:
-        raise RuntimeError("Video composition failed.")
+    filename = out_dir / f"final_video_{int(time())}.mp4"
+    plan: Optional[PreviewPlan] = None
+    if previews:
+        plan = plan_previews(str(filename), durations, canvas, render_profile.fps)
 
-    return str(final_video_path)
+    run_ffmpeg(
+        build_compose_args(clip_paths, durations, canvas, mixed_audio_path, str(filename), render_profile, plan),
+        label="compose_video",
+    )
+    if plan is not None:
+        write_sprite_vtt(plan)
+    return str(filename)
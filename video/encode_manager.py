@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from time import monotonic
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence
+
+from config.settings import settings
+
+_HISTORY_SIZE = 200
+
+# Shared with the render pool's workers (see install_encode_slots), so the
+# cap holds across processes and not just across threads of this one.
+_slots: Optional[Any] = None
+_slots_lock = threading.Lock()
+
+_capture = threading.local()
+
+
+class EncodeTimeoutError(RuntimeError):
+    """An encode ran past its timeout and was killed."""
+
+
+class EncodeBusyError(RuntimeError):
+    """No encode slot became free within VIDEO_ENCODE_QUEUE_SECONDS."""
+
+
+@dataclass
+class EncodeStats:
+    """Resource usage of one finished encoder process."""
+
+    label: str
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_mb: float
+    queued_seconds: float
+    returncode: int
+    timed_out: bool = False
+
+
+def max_encoders() -> int:
+    """Concurrent encode cap: VIDEO_MAX_ENCODERS, or enough to fill the CPUs."""
+
+    if settings.video_max_encoders > 0:
+        return settings.video_max_encoders
+    threads = settings.video_encoder_threads if settings.video_encoder_threads > 0 else 1
+    return max((os.cpu_count() or 1) // threads, 1)
+
+
+def encode_slots():
+    """The process-shared semaphore that bounds concurrent encodes."""
+
+    global _slots
+
+    with _slots_lock:
+        if _slots is None:
+            _slots = multiprocessing.get_context("spawn").BoundedSemaphore(max_encoders())
+        return _slots
+
+
+def install_encode_slots(slots) -> None:
+    """ProcessPoolExecutor initializer: adopt the parent's encode semaphore."""
+
+    global _slots
+    _slots = slots
+
+
+def encoder_thread_args() -> List[str]:
+    """ffmpeg output options limiting the threads a single encode may use."""
+
+    threads = settings.video_encoder_threads
+    if threads <= 0:
+        return []
+    return ["-threads", str(threads)]
+
+
+@contextmanager
+def capture_encodes() -> Iterator[List[EncodeStats]]:
+    """Collect the stats of every encode run by this thread inside the block.
+
+    Used by pool workers to hand their numbers back to the parent process,
+    whose EncodeManager is the one the API reports on.
+    """
+
+    captured: List[EncodeStats] = []
+    previous = getattr(_capture, "stats", None)
+    _capture.stats = captured
+    try:
+        yield captured
+    finally:
+        _capture.stats = previous
+
+
+def _wait_with_usage(proc: subprocess.Popen) -> tuple[int, float, float]:
+    """Reap proc and return (returncode, cpu_seconds, peak_rss_mb).
+
+    os.wait4 reports the rusage of exactly this child, which stays accurate
+    while other encodes run concurrently (RUSAGE_CHILDREN would not).
+    """
+
+    if not hasattr(os, "wait4"):  # pragma: no cover - Windows
+        return proc.wait(), 0.0, 0.0
+
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss_bytes = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return proc.returncode, usage.ru_utime + usage.ru_stime, rss_bytes / (1024 * 1024)
+
+
+class EncodeManager:
+    """Runs encoder subprocesses under a shared concurrency cap and timeout.
+
+    Every encode waits for a slot (up to VIDEO_ENCODE_QUEUE_SECONDS, then
+    EncodeBusyError), is killed if it exceeds its timeout and
+    has its wall time, CPU time and peak RSS recorded; snapshot() returns the
+    running totals plus the most recent encodes.
+    """
+
+    def __init__(self, history: int = _HISTORY_SIZE) -> None:
+        self._lock = threading.Lock()
+        self._recent: Deque[EncodeStats] = deque(maxlen=history)
+        self._active = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+        self._wall_seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._peak_rss_mb = 0.0
+
+    def run(self, cmd: Sequence[str], label: str, timeout: Optional[float] = None) -> EncodeStats:
+        """Run cmd to completion, raising RuntimeError if it fails, times out or finds no free slot."""
+
+        if timeout is None:
+            timeout = settings.video_encode_timeout_seconds
+
+        slots = encode_slots()
+        queued_at = monotonic()
+        with self._lock:
+            self._waiting += 1
+        queue_seconds = settings.video_encode_queue_seconds
+        acquired = slots.acquire(timeout=queue_seconds) if queue_seconds > 0 else slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+            if acquired:
+                self._active += 1
+            else:
+                self._rejected += 1
+        if not acquired:
+            raise EncodeBusyError(f"{label}: all encoders stayed busy for {queue_seconds:g}s")
+
+        try:
+            stats, stderr_tail = self._execute(cmd, label, timeout, monotonic() - queued_at)
+        finally:
+            slots.release()
+            with self._lock:
+                self._active -= 1
+
+        self.record(stats)
+
+        if stats.timed_out:
+            raise EncodeTimeoutError(f"{label} exceeded {timeout:.0f}s and was killed")
+        if stats.returncode != 0:
+            raise RuntimeError("ffmpeg failed: " + " | ".join(stderr_tail))
+        return stats
+
+    def _execute(
+        self,
+        cmd: Sequence[str],
+        label: str,
+        timeout: Optional[float],
+        queued_seconds: float,
+    ) -> tuple[EncodeStats, List[str]]:
+        # stderr goes to a file so a chatty encoder can never block on a full
+        # pipe while we sit in wait4.
+        with tempfile.TemporaryFile() as err:
+            started = monotonic()
+            proc = subprocess.Popen(list(cmd), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=err)
+
+            killed = threading.Event()
+
+            def kill() -> None:
+                killed.set()
+                proc.kill()
+
+            timer = threading.Timer(timeout, kill) if timeout and timeout > 0 else None
+            if timer is not None:
+                timer.daemon = True
+                timer.start()
+            try:
+                returncode, cpu_seconds, peak_rss_mb = _wait_with_usage(proc)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if proc.returncode is None:  # interrupted while waiting
+                    proc.kill()
+                    proc.wait()
+
+            wall_seconds = monotonic() - started
+
+            tail: List[str] = []
+            if returncode != 0:
+                err.seek(0)
+                tail = err.read().decode("utf-8", errors="replace").strip().splitlines()[-5:]
+
+        stats = EncodeStats(
+            label=label,
+            wall_seconds=round(wall_seconds, 3),
+            cpu_seconds=round(cpu_seconds, 3),
+            peak_rss_mb=round(peak_rss_mb, 1),
+            queued_seconds=round(queued_seconds, 3),
+            returncode=returncode,
+            timed_out=killed.is_set(),
+        )
+        return stats, tail
+
+    def record(self, stats: EncodeStats) -> None:
+        """Add a finished encode (possibly reported by a pool worker) to the totals."""
+
+        with self._lock:
+            self._recent.append(stats)
+            if stats.timed_out:
+                self._timed_out += 1
+            elif stats.returncode != 0:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._wall_seconds += stats.wall_seconds
+            self._cpu_seconds += stats.cpu_seconds
+            self._peak_rss_mb = max(self._peak_rss_mb, stats.peak_rss_mb)
+
+        captured = getattr(_capture, "stats", None)
+        if captured is not None:
+            captured.append(stats)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_encoders": max_encoders(),
+                "threads_per_encode": settings.video_encoder_threads,
+                "timeout_seconds": settings.video_encode_timeout_seconds,
+                "queue_seconds": settings.video_encode_queue_seconds,
+                # active/waiting only count encodes started by this process.
+                "active": self._active,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "rejected": self._rejected,
+                "total_wall_seconds": round(self._wall_seconds, 3),
+                "total_cpu_seconds": round(self._cpu_seconds, 3),
+                "max_peak_rss_mb": self._peak_rss_mb,
+                "recent": [asdict(s) for s in reversed(self._recent)],
+            }
+
+
+_manager = EncodeManager()
+
+
+def get_encode_manager() -> EncodeManager:
+    return _manager
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import re
+import subprocess
+import wave
+from typing import List, Optional, Sequence
+
+from utils.pcm import get_ffmpeg_exe
+from .encode_manager import EncodeStats, encoder_thread_args, get_encode_manager
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_SIZE_RE = re.compile(r"Stream #.*?Video:.*?\b(\d{2,5})x(\d{2,5})\b")
+
+
+def run_ffmpeg(args: Sequence[str], label: str = "ffmpeg", timeout: Optional[float] = None) -> EncodeStats:
+    """Run ffmpeg with the given arguments, raising RuntimeError on failure.
+
+    The last argument must be the output path. The run goes through the
+    shared EncodeManager, which caps concurrency, limits encoder threads,
+    kills it after timeout (settings default) and records its resource use.
+    """
+
+    *options, output = args
+    cmd: List[str] = [get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-y", *options, *encoder_thread_args(), output]
+    return get_encode_manager().run(cmd, label=label, timeout=timeout)
+
+
+def _probe_header(path: str) -> str:
+    """ffmpeg's stream summary for path; only the container is parsed."""
+
+    proc = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    return proc.stderr.decode("utf-8", errors="replace")
+
+
+def probe_duration(path: str) -> float:
+    """Return the duration of a media file in seconds.
+
+    PCM WAV files are read from their header; anything else is probed with
+    ffmpeg, which only parses the container and does not decode the stream.
+    """
+
+    try:
+        with wave.open(path, "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate() or 1)
+    except (wave.Error, EOFError):
+        pass
+
+    match = _DURATION_RE.search(_probe_header(path))
+    if match is None:
+        raise ValueError(f"Could not determine duration of {path}")
+
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def probe_video_size(path: str) -> tuple[int, int]:
+    """Return (width, height) of the first video stream in path."""
+
+    match = _VIDEO_SIZE_RE.search(_probe_header(path))
+    if match is None:
+        raise ValueError(f"Could not determine video size of {path}")
+    return int(match.group(1)), int(match.group(2))
+
+
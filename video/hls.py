@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import math
+import os
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+from .bgm import LoopedBgm, mix_scenes_with_bgm
+from .ffmpeg_tools import probe_duration, run_ffmpeg
+from .profiles import get_render_profile
+from .renderer import canvas_size, frame_aligned_duration, render_ts_segment
+
+_DEFAULT_OUTPUT_DIR = "generated_videos"
+_HLS_DIRNAME = "hls"
+_PLAYLIST_NAME = "index.m3u8"
+
+
+def _write_playlist(path: Path, durations: Sequence[float], ready: int, target: int, finished: bool) -> None:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+    ]
+    for index in range(ready):
+        lines.append(f"#EXTINF:{durations[index]:.3f},")
+        lines.append(f"scene_{index:03d}.ts")
+    if finished:
+        lines.append("#EXT-X-ENDLIST")
+
+    # Players poll the playlist while we render; never let them see a half-written file.
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def render_hls(
+    stream_id: str,
+    image_paths: Sequence[str],
+    audio_paths: Sequence[str],
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    profile: Optional[str] = None,
+    scene_bgm: Optional[Sequence[Optional[LoopedBgm]]] = None,
+    final_mp4: bool = True,
+    on_segment: Optional[Callable[[int, int, str], None]] = None,
+) -> Dict[str, Optional[str]]:
+    """Render a story as an HLS stream, publishing each scene as soon as it is encoded.
+
+    The narration is mixed first (cheap), then every scene is encoded into its
+    own MPEG-TS segment and appended to an EVENT playlist, so playback can
+    start after the first scene. on_segment(ready_count, total, playlist_path)
+    is called after each segment. With final_mp4 the finished stream is
+    remuxed into a single MP4 by stream copy.
+
+    Returns {"playlist_path": ..., "video_path": ...}.
+    """
+
+    if not image_paths:
+        raise ValueError("At least one image is required.")
+    if len(image_paths) != len(audio_paths):
+        raise ValueError("image_paths and audio_paths must have the same length.")
+
+    render_profile = get_render_profile(profile)
+    durations = [frame_aligned_duration(probe_duration(str(p)), render_profile.fps) for p in audio_paths]
+    canvas = canvas_size(image_paths, render_profile.max_height)
+
+    stream_dir = Path(output_dir) / _HLS_DIRNAME / stream_id
+    stream_dir.mkdir(parents=True, exist_ok=True)
+
+    mixed_audio_path = mix_scenes_with_bgm(
+        audio_paths,
+        output_dir=str(stream_dir),
+        scene_bgm=scene_bgm,
+        scene_durations=durations,
+    )
+
+    playlist = stream_dir / _PLAYLIST_NAME
+    target = max(int(math.ceil(max(durations))), 1)
+    total = len(durations)
+    _write_playlist(playlist, durations, 0, target, finished=False)
+
+    start = 0.0
+    for index, (image_path, duration) in enumerate(zip(image_paths, durations)):
+        segment = stream_dir / f"scene_{index:03d}.ts"
+        render_ts_segment(str(image_path), mixed_audio_path, start, duration, str(segment), canvas, render_profile)
+        start += duration
+
+        _write_playlist(playlist, durations, index + 1, target, finished=index + 1 == total)
+        if on_segment is not None:
+            on_segment(index + 1, total, str(playlist))
+
+    video_path: Optional[str] = None
+    if final_mp4:
+        output = Path(output_dir) / f"final_video_{stream_id}.mp4"
+        run_ffmpeg(
+            [
+                "-i",
+                str(playlist),
+                "-c",
+                "copy",
+                "-bsf:a",
+                "aac_adtstoasc",
+                "-movflags",
+                "+faststart",
+                str(output),
+            ],
+            label="hls_remux",
+        )
+        video_path = str(output)
+
+    return {"playlist_path": str(playlist), "video_path": video_path}
+
+
+def playlist_url(playlist_path: str, output_dir: str = _DEFAULT_OUTPUT_DIR) -> str:
+    """Public URL of a playlist under the /videos static mount."""
+
+    relative = Path(playlist_path).relative_to(Path(output_dir))
+    return "/videos/" + "/".join(relative.parts)
+
@@ -3,19 +3,33 @@ from __future__ import annotations
 import os
 from pathlib import Path
 from time import time
+from typing import Optional
+from uuid import uuid4
 
-from moviepy.editor import AudioFileClip, ImageClip
+from .clip_cache import clip_cache_key, get_cached_clip, store_clip
+from .ffmpeg_tools import probe_duration, run_ffmpeg
+from .profiles import get_render_profile
+from .renderer import canvas_size
 
 _DEFAULT_OUTPUT_DIR = "generated_videos"
 
 
-def lip_sync(image_path: str, audio_path: str, output_dir: str = _DEFAULT_OUTPUT_DIR) -> str:
+def lip_sync(
+    image_path: str,
+    audio_path: str,
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    profile: Optional[str] = None,
+    use_cache: bool = True,
+) -> str:
     """Create a short video clip from a single image and narration audio.
 
     This is implemented as a static image + audio clip so that the pipeline
     works even without a local Wav2Lip installation. The function signature
     and output format are compatible with a future Wav2Lip-based
     implementation.
+
+    With use_cache, clips are reused across calls when the image bytes,
+    audio bytes and render profile are identical (see video.clip_cache).
     """
 
     image_file = Path(image_path)
@@ -26,33 +40,57 @@ def lip_sync(image_path: str, audio_path: str, output_dir: str = _DEFAULT_OUTPUT
     if not audio_file.is_file():
         raise FileNotFoundError(f"Audio not found: {audio_file}")
 
-    os.makedirs(output_dir, exist_ok=True)
+    render_profile = get_render_profile(profile)
 
-    audio_clip = AudioFileClip(str(audio_file))
-    video_clip = None
+    cache_key: Optional[str] = None
+    if use_cache:
+        cache_key = clip_cache_key(str(image_file), str(audio_file), render_profile)
+        cached_path = get_cached_clip(cache_key, output_dir)
+        if cached_path is not None:
+            return cached_path
 
-    try:
-        duration = float(audio_clip.duration or 0.0)
-        if duration <= 0:
-            raise ValueError("Audio duration must have a positive duration.")
+    os.makedirs(output_dir, exist_ok=True)
 
-        video_clip = ImageClip(str(image_file)).set_duration(duration).set_audio(audio_clip)
-        video_clip = video_clip.set_fps(25)
+    duration = probe_duration(str(audio_file))
+    if duration <= 0:
+        raise ValueError("Audio duration must have a positive duration.")
 
-        timestamp = int(time())
-        filename = f"scene_{image_file.stem}_{timestamp}.mp4"
-        output_path = Path(output_dir) / filename
+    width, height = canvas_size([str(image_file)], render_profile.max_height)
 
-        video_clip.write_videofile(
+    # Unique per call: pool workers may render scenes sharing an image stem
+    # in the same second.
+    timestamp = int(time())
+    filename = f"scene_{image_file.stem}_{timestamp}_{uuid4().hex[:12]}.mp4"
+    output_path = Path(output_dir) / filename
+
+    run_ffmpeg(
+        [
+            "-loop",
+            "1",
+            "-framerate",
+            str(render_profile.fps),
+            "-t",
+            f"{duration:.3f}",
+            "-i",
+            str(image_file),
+            "-i",
+            str(audio_file),
+            "-vf",
+            f"scale={width}:{height},setsar=1,format=yuv420p",
+            "-c:v",
+            "libx264",
+            "-preset",
+            render_profile.preset,
+            *render_profile.x264_params(),
+            "-c:a",
+            "aac",
+            "-shortest",
             str(output_path),
-            codec="libx264",
-            audio_codec="aac",
-            verbose=False,
-            logger=None,
-        )
-    finally:
-        audio_clip.close()
-        if video_clip is not None:
-            video_clip.close()
+        ],
+        label="lip_sync",
+    )
+
+    if cache_key is not None:
+        return store_clip(cache_key, str(output_path), output_dir)
 
     return str(output_path)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from .clip_cache import clip_cache_key, get_cached_clip
+from .encode_manager import (
+    EncodeBusyError,
+    EncodeStats,
+    capture_encodes,
+    encode_slots,
+    get_encode_manager,
+    install_encode_slots,
+    max_encoders,
+)
+from .lip_sync import lip_sync
+from .profiles import get_render_profile
+
+_DEFAULT_OUTPUT_DIR = "generated_videos"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class ClipResult:
+    """Outcome of rendering one scene clip; exactly one of clip_path/error is set."""
+
+    index: int
+    clip_path: Optional[str] = None
+    error: Optional[str] = None
+    # The error was EncodeBusyError: no encode slot freed up in time.
+    busy: bool = False
+    # Encodes the worker ran for this clip; folded into the parent's EncodeManager.
+    encodes: List[EncodeStats] = field(default_factory=list)
+
+
+def _pool_size() -> int:
+    """Workers beyond the encode cap would only block on a slot, so cap them there."""
+
+    workers = settings.video_render_workers if settings.video_render_workers > 0 else (os.cpu_count() or 1)
+    return max(min(workers, max_encoders()), 1)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        # spawn avoids forking a process that holds Mongo client threads.
+        # Workers share the parent's encode semaphore, so VIDEO_MAX_ENCODERS
+        # bounds ffmpeg processes host-wide rather than per worker.
+        _pool = ProcessPoolExecutor(
+            max_workers=_pool_size(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=install_encode_slots,
+            initargs=(encode_slots(),),
+        )
+
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _render_clip(
+    index: int,
+    image_path: str,
+    audio_path: str,
+    output_dir: str,
+    profile: Optional[str],
+) -> ClipResult:
+    with capture_encodes() as encodes:
+        try:
+            clip_path = lip_sync(image_path, audio_path, output_dir=output_dir, profile=profile)
+            return ClipResult(index=index, clip_path=clip_path, encodes=encodes)
+        except EncodeBusyError as exc:
+            return ClipResult(index=index, error=f"{type(exc).__name__}: {exc}", busy=True, encodes=encodes)
+        except Exception as exc:
+            return ClipResult(index=index, error=f"{type(exc).__name__}: {exc}", encodes=encodes)
+
+
+def render_clips_parallel(
+    pairs: Sequence[Tuple[str, str]],
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    profile: Optional[str] = None,
+    on_progress: Optional[Callable[[ClipResult, int, int], None]] = None,
+) -> List[ClipResult]:
+    """Render one lip_sync clip per (image_path, audio_path) pair in parallel.
+
+    Scenes whose inputs are already in the clip cache are resolved without
+    touching the pool; the rest are encoded in a shared process pool sized to
+    the host's cores. Results are returned in input order; a failing scene is
+    reported in its ClipResult instead of aborting the others. on_progress,
+    if given, is called in the calling process as each clip finishes with
+    (result, completed_count, total).
+    """
+
+    total = len(pairs)
+    results: List[Optional[ClipResult]] = [None] * total
+    render_profile = get_render_profile(profile)
+
+    completed = 0
+    pending: List[int] = []
+    for index, (image_path, audio_path) in enumerate(pairs):
+        try:
+            cached_path = get_cached_clip(clip_cache_key(image_path, audio_path, render_profile), output_dir)
+        except OSError:  # missing input; let the worker report it
+            cached_path = None
+
+        if cached_path is None:
+            pending.append(index)
+            continue
+
+        completed += 1
+        results[index] = ClipResult(index=index, clip_path=cached_path)
+        if on_progress is not None:
+            on_progress(results[index], completed, total)
+
+    futures = {}
+    if pending:
+        pool = _get_pool()
+        futures = {
+            pool.submit(_render_clip, index, pairs[index][0], pairs[index][1], output_dir, profile): index
+            for index in pending
+        }
+
+    for future in as_completed(futures):
+        completed += 1
+        index = futures[future]
+        try:
+            result = future.result()
+        except Exception as exc:  # worker crashed before returning
+            result = ClipResult(index=index, error=f"{type(exc).__name__}: {exc}")
+        results[index] = result
+
+        manager = get_encode_manager()
+        for stats in result.encodes:
+            manager.record(stats)
+
+        if on_progress is not None:
+            on_progress(result, completed, total)
+
+    return [r for r in results if r is not None]
+
+
+def clip_errors(results: Sequence[ClipResult]) -> List[str]:
+    """Human readable per-scene errors (1-based scene numbers)."""
+
+    return [f"Scene {r.index + 1}: {r.error}" for r in results if r.error is not None]
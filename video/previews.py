@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_PREVIEW_DIRNAME = "previews"
+_POSTER_NAME = "poster.jpg"
+_THUMB_PATTERN = "thumb_%02d.jpg"
+_SPRITE_NAME = "sprite.jpg"
+_SPRITE_VTT_NAME = "sprite.vtt"
+
+_MAX_THUMBNAILS = 4
+_THUMB_WIDTH = 320
+_TILE_WIDTH = 160
+_SPRITE_COLUMNS = 10
+_MAX_SPRITE_TILES = 100
+
+
+@dataclass
+class PreviewPlan:
+    """Which frames of a render become the poster, thumbnails and sprite tiles."""
+
+    directory: Path
+    total_duration: float
+    poster_frame: int
+    thumb_frames: List[int]
+    sprite_interval: int
+    sprite_tiles: int
+    sprite_columns: int
+    sprite_rows: int
+    tile_size: Tuple[int, int]
+
+
+def preview_dir(video_path: str) -> Path:
+    path = Path(video_path)
+    return path.parent / _PREVIEW_DIRNAME / path.stem
+
+
+def plan_previews(video_path: str, durations: Sequence[float], canvas: Tuple[int, int], fps: int) -> PreviewPlan:
+    """Pick preview frames from the scene timeline of an upcoming render.
+
+    The poster and thumbnails are taken from the middle of scenes, away from
+    the fades; sprite tiles are one every sprite_interval seconds, capped at
+    _MAX_SPRITE_TILES per sheet.
+    """
+
+    starts = [0.0]
+    for duration in durations:
+        starts.append(starts[-1] + duration)
+    total = starts[-1]
+    last_frame = max(int(total * fps) - 1, 0)
+
+    def frame_at(seconds: float) -> int:
+        return min(int(seconds * fps), last_frame)
+
+    midpoints = [frame_at(start + duration / 2.0) for start, duration in zip(starts, durations)]
+    step = max(len(midpoints) / _MAX_THUMBNAILS, 1.0)
+    thumb_frames = sorted({midpoints[int(i * step)] for i in range(min(len(midpoints), _MAX_THUMBNAILS))})
+
+    interval = max(math.ceil(total / _MAX_SPRITE_TILES), 1)
+    tiles = max(math.ceil(total / interval), 1)
+    columns = min(tiles, _SPRITE_COLUMNS)
+    width, height = canvas
+    tile_height = max(round(_TILE_WIDTH * height / width / 2) * 2, 2)
+
+    return PreviewPlan(
+        directory=preview_dir(video_path),
+        total_duration=total,
+        poster_frame=midpoints[0],
+        thumb_frames=thumb_frames,
+        sprite_interval=interval,
+        sprite_tiles=tiles,
+        sprite_columns=columns,
+        sprite_rows=math.ceil(tiles / columns),
+        tile_size=(_TILE_WIDTH, tile_height),
+    )
+
+
+def preview_filters(plan: PreviewPlan, source: str) -> Tuple[List[str], str]:
+    """Filter graph branches that split previews off the rendered stream.
+
+    source is the label of the final video stream (e.g. "vout"); returns the
+    extra filter chains and the label the main encoder should map instead.
+    """
+
+    thumbs = "+".join(f"eq(n\\,{n})" for n in plan.thumb_frames)
+    tile_w, tile_h = plan.tile_size
+    return (
+        [
+            f"[{source}]split=4[venc][vposter][vthumbs][vsprite]",
+            f"[vposter]select='eq(n\\,{plan.poster_frame})'[poster]",
+            f"[vthumbs]select='{thumbs}',scale={_THUMB_WIDTH}:-2[thumbs]",
+            f"[vsprite]fps=1/{plan.sprite_interval},scale={tile_w}:{tile_h},"
+            f"tile={plan.sprite_columns}x{plan.sprite_rows}[sprite]",
+        ],
+        "venc",
+    )
+
+
+def preview_output_args(plan: PreviewPlan) -> List[str]:
+    """ffmpeg outputs for the preview images; they go before the main output."""
+
+    plan.directory.mkdir(parents=True, exist_ok=True)
+    return [
+        "-map",
+        "[poster]",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "3",
+        str(plan.directory / _POSTER_NAME),
+        "-map",
+        "[thumbs]",
+        "-fps_mode",
+        "vfr",
+        "-frames:v",
+        str(len(plan.thumb_frames)),
+        "-q:v",
+        "4",
+        str(plan.directory / _THUMB_PATTERN),
+        "-map",
+        "[sprite]",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        str(plan.directory / _SPRITE_NAME),
+    ]
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def write_sprite_vtt(plan: PreviewPlan) -> str:
+    """Write the WebVTT index that maps time ranges to sprite sheet tiles."""
+
+    tile_w, tile_h = plan.tile_size
+    lines = ["WEBVTT", ""]
+    for index in range(plan.sprite_tiles):
+        start = index * plan.sprite_interval
+        end = min(start + plan.sprite_interval, plan.total_duration)
+        x = (index % plan.sprite_columns) * tile_w
+        y = (index // plan.sprite_columns) * tile_h
+        lines.append(f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}")
+        lines.append(f"{_SPRITE_NAME}#xywh={x},{y},{tile_w},{tile_h}")
+        lines.append("")
+
+    path = plan.directory / _SPRITE_VTT_NAME
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def preview_urls(video_path: str, output_dir: str, url_prefix: str = "/videos") -> Optional[Dict[str, Any]]:
+    """URLs of the previews written alongside video_path, or None if there are none."""
+
+    directory = preview_dir(video_path)
+    if not (directory / _POSTER_NAME).is_file():
+        return None
+
+    base = f"{url_prefix}/{directory.relative_to(Path(output_dir)).as_posix()}"
+    previews: Dict[str, Any] = {
+        "poster": f"{base}/{_POSTER_NAME}",
+        "thumbnails": [f"{base}/{p.name}" for p in sorted(directory.glob("thumb_*.jpg"))],
+    }
+    if (directory / _SPRITE_VTT_NAME).is_file():
+        previews["sprite"] = f"{base}/{_SPRITE_NAME}"
+        previews["sprite_vtt"] = f"{base}/{_SPRITE_VTT_NAME}"
+    return previews
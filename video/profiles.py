@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Encoder settings for the video stage.
+
+    keyint is the maximum GOP length in frames; max_height downscales the
+    output canvas (used for cheap preview renders).
+    """
+
+    name: str
+    fps: int
+    preset: str
+    crf: int
+    tune: Optional[str] = None
+    keyint: Optional[int] = None
+    max_height: Optional[int] = None
+
+    def x264_params(self) -> List[str]:
+        """Extra ffmpeg output arguments for libx264 (excluding fps/preset)."""
+
+        params = ["-crf", str(self.crf)]
+        if self.tune:
+            params += ["-tune", self.tune]
+        if self.keyint:
+            params += ["-g", str(self.keyint)]
+        return params
+
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    # libx264 defaults at 25 fps, i.e. what the pipeline always produced.
+    "standard": RenderProfile(name="standard", fps=25, preset="medium", crf=23),
+    # Scenes are still images: a low frame rate, long GOPs and stillimage
+    # tuning keep quality while spending far less time on unchanged frames.
+    "still": RenderProfile(name="still", fps=10, preset="veryfast", crf=23, tune="stillimage", keyint=100),
+    # Low-resolution preview renders.
+    "draft": RenderProfile(
+        name="draft", fps=10, preset="ultrafast", crf=30, tune="stillimage", keyint=100, max_height=360
+    ),
+}
+
+DEFAULT_PROFILE = "standard"
+
+
+def get_render_profile(name: Optional[str] = None) -> RenderProfile:
+    key = (name or DEFAULT_PROFILE).strip().lower()
+    if key not in RENDER_PROFILES:
+        raise ValueError(f"Unsupported render profile: {name}")
+    return RENDER_PROFILES[key]
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from bson import ObjectId
+
+from db.mongo import get_database
+from utils.hashing import file_sha256
+from .bgm import mix_scenes_with_bgm
+from .bgm_library import select_scene_bgm
+from .ffmpeg_tools import probe_duration
+from .profiles import get_render_profile
+from .renderer import canvas_size, concat_segments, frame_aligned_duration, render_segment
+
+_DEFAULT_OUTPUT_DIR = "generated_videos"
+_SEGMENT_DIRNAME = ".segments"
+_COLLECTION_NAME = "video_projects"
+# Segment encodes run in ffmpeg subprocesses, so threads are enough here.
+_SEGMENT_WORKERS = 4
+
+
+def _projects_collection():
+    db = get_database()
+    return db[_COLLECTION_NAME]
+
+
+def _segment_path(output_dir: str, scene: Dict[str, Any], project: Dict[str, Any]) -> Path:
+    """Segments are content-addressed, so unchanged scenes are never re-encoded."""
+
+    material = f"{scene['image_hash']}:{scene['frames']}:{project['profile']}:{project['canvas']}"
+    key = hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+    return Path(output_dir) / _SEGMENT_DIRNAME / f"{key}.mp4"
+
+
+def _describe_scene(image_path: str, audio_path: str, emotion: Optional[str], fps: int) -> Dict[str, Any]:
+    duration = frame_aligned_duration(probe_duration(audio_path), fps)
+    return {
+        "image_path": str(image_path),
+        "audio_path": str(audio_path),
+        "image_hash": file_sha256(str(image_path)),
+        "audio_hash": file_sha256(str(audio_path)),
+        "emotion": emotion,
+        "duration": duration,
+        "frames": round(duration * fps),
+        "segment_path": None,
+    }
+
+
+def _render_missing_segments(project: Dict[str, Any], scene_indexes: Sequence[int], output_dir: str) -> None:
+    profile = get_render_profile(project["profile"])
+    canvas = tuple(project["canvas"])
+
+    jobs = []
+    for index in scene_indexes:
+        scene = project["scenes"][index]
+        path = _segment_path(output_dir, scene, project)
+        scene["segment_path"] = str(path)
+        if not path.is_file():
+            jobs.append((scene, path))
+
+    if not jobs:
+        return
+
+    (Path(output_dir) / _SEGMENT_DIRNAME).mkdir(parents=True, exist_ok=True)
+
+    def render(job) -> None:
+        scene, path = job
+        tmp = path.with_name(path.stem + ".tmp.mp4")
+        render_segment(scene["image_path"], scene["duration"], str(tmp), canvas, profile)
+        tmp.replace(path)
+
+    with ThreadPoolExecutor(max_workers=min(_SEGMENT_WORKERS, len(jobs))) as pool:
+        list(pool.map(render, jobs))
+
+
+def _assemble(project: Dict[str, Any], output_dir: str) -> str:
+    """Re-mix the narration timeline and stream-copy the segments into the final MP4."""
+
+    scenes = project["scenes"]
+    audio_paths = [s["audio_path"] for s in scenes]
+    scene_bgm = select_scene_bgm([s.get("emotion") for s in scenes], len(scenes)) if project["bgm"] else None
+
+    mixed_audio_path = mix_scenes_with_bgm(
+        audio_paths,
+        output_dir=output_dir,
+        scene_bgm=scene_bgm,
+        scene_durations=[s["duration"] for s in scenes],
+    )
+
+    version = int(project.get("version", 0)) + 1
+    project["version"] = version
+    project["audio_path"] = mixed_audio_path
+
+    output = Path(output_dir) / f"project_{project['_id']}_v{version}.mp4"
+    concat_segments([s["segment_path"] for s in scenes], mixed_audio_path, str(output))
+    return str(output)
+
+
+def create_project(
+    user_id: str,
+    image_paths: Sequence[str],
+    audio_paths: Sequence[str],
+    emotions: Optional[Sequence[Optional[str]]] = None,
+    profile: Optional[str] = None,
+    bgm: bool = True,
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+) -> Dict[str, Any]:
+    """Render a story as per-scene segments and store it as an editable project.
+
+    Returns the project document, including video_path of the final MP4.
+    """
+
+    if not image_paths:
+        raise ValueError("At least one image is required.")
+    if len(image_paths) != len(audio_paths):
+        raise ValueError("image_paths and audio_paths must have the same length.")
+
+    render_profile = get_render_profile(profile)
+    labels = list(emotions or []) + [None] * len(image_paths)
+
+    now = datetime.utcnow()
+    project: Dict[str, Any] = {
+        "_id": ObjectId(),
+        "userId": str(user_id),
+        "profile": render_profile.name,
+        "fps": render_profile.fps,
+        "canvas": list(canvas_size(image_paths, render_profile.max_height)),
+        "bgm": bgm,
+        "scenes": [
+            _describe_scene(image_path, audio_path, labels[index], render_profile.fps)
+            for index, (image_path, audio_path) in enumerate(zip(image_paths, audio_paths))
+        ],
+        "version": 0,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+    _render_missing_segments(project, range(len(project["scenes"])), output_dir)
+    project["video_path"] = _assemble(project, output_dir)
+
+    _projects_collection().insert_one(project)
+    return project
+
+
+def get_project(project_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    return _projects_collection().find_one({"_id": ObjectId(project_id), "userId": str(user_id)})
+
+
+def update_scene(
+    project: Dict[str, Any],
+    index: int,
+    image_path: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    emotion: Optional[str] = None,
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+) -> Dict[str, Any]:
+    """Replace one scene's inputs and re-render only what changed.
+
+    Only the edited scene's segment is re-encoded (and only if its image or
+    frame-aligned duration actually changed); the narration timeline is
+    re-mixed and the final MP4 is rebuilt by stream copy.
+    """
+
+    scenes = project["scenes"]
+    if index < 0 or index >= len(scenes):
+        raise IndexError(f"Scene index out of range: {index}")
+
+    old = scenes[index]
+    scene = _describe_scene(
+        image_path or old["image_path"],
+        audio_path or old["audio_path"],
+        emotion if emotion is not None else old.get("emotion"),
+        int(project["fps"]),
+    )
+    scenes[index] = scene
+
+    _render_missing_segments(project, [index], output_dir)
+    project["video_path"] = _assemble(project, output_dir)
+    project["updatedAt"] = datetime.utcnow()
+
+    _projects_collection().update_one(
+        {"_id": project["_id"]},
+        {
+            "$set": {
+                "scenes": scenes,
+                "version": project["version"],
+                "audio_path": project["audio_path"],
+                "video_path": project["video_path"],
+                "updatedAt": project["updatedAt"],
+            }
+        },
+    )
+    return project
+
+
+def set_project_asset(project: Dict[str, Any], asset_id: str) -> None:
+    """Remember which user_assets entry shows this project's video."""
+
+    project["asset_id"] = asset_id
+    _projects_collection().update_one({"_id": project["_id"]}, {"$set": {"asset_id": asset_id}})
+
+
+def project_scene_summary(project: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"index": i, "duration": s["duration"], "emotion": s.get("emotion")}
+        for i, s in enumerate(project["scenes"])
+    ]
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+from pathlib import Path
+from time import time
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .bgm import LoopedBgm, mix_scenes_with_bgm
+from .ffmpeg_tools import probe_duration, run_ffmpeg
+from .previews import PreviewPlan, plan_previews, preview_filters, preview_output_args, write_sprite_vtt
+from .profiles import RenderProfile, get_render_profile
+
+_DEFAULT_OUTPUT_DIR = "generated_videos"
+_FADE_SECONDS = 0.3
+
+
+def canvas_size(image_paths: Sequence[str], max_height: Optional[int] = None) -> Tuple[int, int]:
+    """Largest width/height across the images, rounded down to even numbers.
+
+    Mirrors concatenate_videoclips(method="compose"), which centers smaller
+    clips on a canvas the size of the largest one. max_height scales the
+    canvas down proportionally.
+    """
+
+    width = height = 0
+    for path in image_paths:
+        with Image.open(path) as img:
+            width = max(width, img.width)
+            height = max(height, img.height)
+
+    if max_height and height > max_height:
+        width = int(width * max_height / height)
+        height = max_height
+
+    return max(width // 2 * 2, 2), max(height // 2 * 2, 2)
+
+
+def _scene_filter(index: int, duration: float, width: int, height: int, fps: int) -> str:
+    fade = min(_FADE_SECONDS, duration / 2.0)
+    return (
+        f"[{index}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p,"
+        f"fade=t=in:st=0:d={fade:.3f},fade=t=out:st={duration - fade:.3f}:d={fade:.3f}[v{index}]"
+    )
+
+
+def build_render_args(
+    image_paths: Sequence[str],
+    durations: Sequence[float],
+    audio_path: str,
+    output_path: str,
+    profile: Optional[RenderProfile] = None,
+    previews: Optional[PreviewPlan] = None,
+) -> List[str]:
+    """Build the ffmpeg arguments for a single-pass scene render.
+
+    Every still image becomes a looped input trimmed to its narration length;
+    scaling, fades and concatenation all happen in one filter graph and the
+    result is muxed with the already mixed narration in a single encode.
+    With previews, the poster, thumbnails and sprite sheet are split off the
+    same decoded frames (see video.previews).
+    """
+
+    profile = profile or get_render_profile()
+    canvas = canvas_size(image_paths, profile.max_height)
+
+    args: List[str] = []
+    for path, duration in zip(image_paths, durations):
+        args += ["-loop", "1", "-framerate", str(profile.fps), "-t", f"{duration:.3f}", "-i", str(path)]
+    args += ["-i", str(audio_path)]
+
+    return args + _concat_encode_args(durations, canvas, profile, str(output_path), previews)
+
+
+def build_compose_args(
+    clip_paths: Sequence[str],
+    durations: Sequence[float],
+    canvas: Tuple[int, int],
+    audio_path: str,
+    output_path: str,
+    profile: Optional[RenderProfile] = None,
+    previews: Optional[PreviewPlan] = None,
+) -> List[str]:
+    """Like build_render_args, but for already encoded per-scene clips.
+
+    The clips' own audio is dropped in favour of the mixed narration track.
+    """
+
+    profile = profile or get_render_profile()
+
+    args: List[str] = []
+    for path in clip_paths:
+        args += ["-i", str(path)]
+    args += ["-i", str(audio_path)]
+
+    return args + _concat_encode_args(durations, canvas, profile, str(output_path), previews)
+
+
+def _concat_encode_args(
+    durations: Sequence[float],
+    canvas: Tuple[int, int],
+    profile: RenderProfile,
+    output_path: str,
+    previews: Optional[PreviewPlan] = None,
+) -> List[str]:
+    """Filter graph + encoder options shared by the single-pass renders.
+
+    Inputs 0..n-1 are the scenes and input n is the mixed audio. The video
+    output always comes last so run_ffmpeg's thread limit applies to it.
+    """
+
+    width, height = canvas
+    count = len(durations)
+    filters = [_scene_filter(i, d, width, height, profile.fps) for i, d in enumerate(durations)]
+    labels = "".join(f"[v{i}]" for i in range(count))
+    filters.append(f"{labels}concat=n={count}:v=1:a=0[vout]")
+
+    video_label = "vout"
+    preview_args: List[str] = []
+    if previews is not None:
+        branches, video_label = preview_filters(previews, "vout")
+        filters += branches
+        preview_args = preview_output_args(previews)
+
+    return [
+        "-filter_complex",
+        ";".join(filters),
+        *preview_args,
+        "-map",
+        f"[{video_label}]",
+        "-map",
+        f"{count}:a",
+        "-c:v",
+        "libx264",
+        "-preset",
+        profile.preset,
+        *profile.x264_params(),
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        "aac",
+        "-shortest",
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+
+
+def render_story_video(
+    image_paths: Sequence[str],
+    audio_paths: Sequence[str],
+    output_dir: str = _DEFAULT_OUTPUT_DIR,
+    bgm_path: Optional[str] = None,
+    profile: Optional[str] = None,
+    scene_bgm: Optional[Sequence[Optional[LoopedBgm]]] = None,
+    previews: bool = True,
+) -> str:
+    """Render still images + narration straight to the final MP4.
+
+    Unlike lip_sync + compose_video this encodes the video exactly once and
+    writes no per-scene intermediate clips. With previews, a poster,
+    thumbnails and a seek sprite sheet are written by the same ffmpeg run;
+    use video.previews.preview_urls to find them.
+    """
+
+    if not image_paths:
+        raise ValueError("At least one image is required.")
+    if len(image_paths) != len(audio_paths):
+        raise ValueError("image_paths and audio_paths must have the same length.")
+
+    render_profile = get_render_profile(profile)
+
+    for path in image_paths:
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"Image not found: {path}")
+
+    durations = [probe_duration(str(path)) for path in audio_paths]
+    if any(d <= 0 for d in durations):
+        raise ValueError("Audio duration must have a positive duration.")
+
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    mixed_audio_path = mix_scenes_with_bgm(
+        audio_paths,
+        output_dir=str(out_dir),
+        bgm_path=bgm_path,
+        scene_bgm=scene_bgm,
+    )
+
+    filename = out_dir / f"final_video_{int(time())}.mp4"
+    plan: Optional[PreviewPlan] = None
+    if previews:
+        canvas = canvas_size(image_paths, render_profile.max_height)
+        plan = plan_previews(str(filename), durations, canvas, render_profile.fps)
+
+    run_ffmpeg(
+        build_render_args(image_paths, durations, mixed_audio_path, str(filename), render_profile, plan),
+        label="render_story_video",
+    )
+    if plan is not None:
+        write_sprite_vtt(plan)
+    return str(filename)
+
+
+def frame_aligned_duration(duration: float, fps: int) -> float:
+    """Round a scene duration to a whole number of frames (at least one)."""
+
+    return max(round(duration * fps), 1) / float(fps)
+
+
+def render_segment(
+    image_path: str,
+    duration: float,
+    output_path: str,
+    canvas: Tuple[int, int],
+    profile: Optional[RenderProfile] = None,
+) -> str:
+    """Encode one scene as a standalone, video-only H.264 segment.
+
+    Each segment starts on its own IDR frame and every segment of a project
+    uses the same canvas and encoder settings, so segments can be joined with
+    concat_segments by stream copy and any one of them re-encoded on its own.
+    duration should already be frame aligned.
+    """
+
+    profile = profile or get_render_profile()
+    width, height = canvas
+
+    args = [
+        "-loop",
+        "1",
+        "-framerate",
+        str(profile.fps),
+        "-t",
+        f"{duration:.6f}",
+        "-i",
+        str(image_path),
+        "-filter_complex",
+        _scene_filter(0, duration, width, height, profile.fps),
+        "-map",
+        "[v0]",
+        "-an",
+        "-c:v",
+        "libx264",
+        "-preset",
+        profile.preset,
+        *profile.x264_params(),
+        "-pix_fmt",
+        "yuv420p",
+        "-frames:v",
+        str(round(duration * profile.fps)),
+        str(output_path),
+    ]
+    run_ffmpeg(args, label="render_segment")
+    return str(output_path)
+
+
+def concat_segments(segment_paths: Sequence[str], audio_path: str, output_path: str) -> str:
+    """Join video segments by stream copy and mux the mixed audio track.
+
+    Only the audio is encoded here; the video bitstream is copied as-is.
+    """
+
+    output = Path(output_path)
+    list_path = output.with_suffix(".txt")
+    lines = []
+    for path in segment_paths:
+        escaped = str(Path(path).resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    try:
+        run_ffmpeg(
+            [
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                str(list_path),
+                "-i",
+                str(audio_path),
+                "-map",
+                "0:v",
+                "-map",
+                "1:a",
+                "-c:v",
+                "copy",
+                "-c:a",
+                "aac",
+                "-shortest",
+                "-movflags",
+                "+faststart",
+                str(output),
+            ],
+            label="concat_segments",
+        )
+    finally:
+        list_path.unlink(missing_ok=True)
+
+    return str(output)
+
+
+def render_ts_segment(
+    image_path: str,
+    audio_path: str,
+    start: float,
+    duration: float,
+    output_path: str,
+    canvas: Tuple[int, int],
+    profile: Optional[RenderProfile] = None,
+) -> str:
+    """Encode one scene plus its slice of the mixed audio as an MPEG-TS segment.
+
+    Timestamps are offset to the scene's start so consecutive segments play
+    back as one continuous HLS stream.
+    """
+
+    profile = profile or get_render_profile()
+    width, height = canvas
+
+    args = [
+        "-loop",
+        "1",
+        "-framerate",
+        str(profile.fps),
+        "-t",
+        f"{duration:.6f}",
+        "-i",
+        str(image_path),
+        "-ss",
+        f"{start:.6f}",
+        "-t",
+        f"{duration:.6f}",
+        "-i",
+        str(audio_path),
+        "-filter_complex",
+        _scene_filter(0, duration, width, height, profile.fps),
+        "-map",
+        "[v0]",
+        "-map",
+        "1:a",
+        "-c:v",
+        "libx264",
+        "-preset",
+        profile.preset,
+        *profile.x264_params(),
+        "-pix_fmt",
+        "yuv420p",
+        "-frames:v",
+        str(round(duration * profile.fps)),
+        "-c:a",
+        "aac",
+        "-output_ts_offset",
+        f"{start:.6f}",
+        "-f",
+        "mpegts",
+        str(output_path),
+    ]
+    run_ffmpeg(args, label="render_ts_segment")
+    return str(output_path)
@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Literal, Optional
 from urllib.parse import urlparse
+from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
 from analytics.events import log_event
 from auth.jwt_handler import get_current_user
-from journal.saver import save_video
-from .lip_sync import lip_sync
+from journal.saver import save_video, update_asset_url
+from .bgm_library import select_scene_bgm
 from .composer import compose_video
+from .encode_manager import EncodeBusyError, get_encode_manager
+from .hls import playlist_url, render_hls
+from .parallel import clip_errors, render_clips_parallel
+from .previews import preview_urls
+from .project import create_project, get_project, project_scene_summary, set_project_asset, update_scene
+from .renderer import render_story_video
+from .subtitles import caption_video
 
 _IMAGE_DIR = "generated_images"
 _AUDIO_DIR = "generated_audio"
@@ -23,10 +32,60 @@ router = APIRouter(prefix="/api/video", tags=["video"])
 class GenerateVideoRequest(BaseModel):
     image_urls: List[str]
     audio_urls: List[str]
+    # Also write one MP4 per scene (lip_sync) and compose them afterwards.
+    # Off by default: the single-pass renderer encodes the video only once.
+    keep_scene_clips: bool = False
+    # Encoder settings, see video.profiles.RENDER_PROFILES.
+    profile: Literal["standard", "still", "draft"] = "standard"
+    # Per-scene emotion labels from /api/nlp/process; they pick the BGM tracks.
+    emotions: Optional[List[str]] = None
+    bgm: bool = True
+    # "hls" also writes a segmented stream; use /api/tasks/video to play it while rendering.
+    output: Literal["mp4", "hls"] = "mp4"
+    # Narration text per scene; when given, sidecar WebVTT/SRT captions are written.
+    scene_texts: Optional[List[str]] = None
+    # Also mux the captions into the MP4 as a soft subtitle track (stream copy).
+    soft_subtitles: bool = False
 
 
 class GenerateVideoResponse(BaseModel):
     video_url: str
+    playlist_url: Optional[str] = None
+    previews: Optional[Dict[str, Any]] = None
+    subtitles: Optional[Dict[str, str]] = None
+
+
+class SubtitlesRequest(BaseModel):
+    video_url: str
+    audio_urls: List[str]
+    scene_texts: List[str]
+    soft_subtitles: bool = False
+
+
+class SubtitlesResponse(BaseModel):
+    video_url: str
+    subtitles: Dict[str, str]
+
+
+class CreateProjectRequest(BaseModel):
+    image_urls: List[str]
+    audio_urls: List[str]
+    profile: Literal["standard", "still", "draft"] = "standard"
+    emotions: Optional[List[str]] = None
+    bgm: bool = True
+
+
+class UpdateSceneRequest(BaseModel):
+    image_url: Optional[str] = None
+    audio_url: Optional[str] = None
+    emotion: Optional[str] = None
+
+
+class ProjectResponse(BaseModel):
+    project_id: str
+    video_url: str
+    version: int
+    scenes: List[Dict[str, Any]]
 
 
 def _resolve_local_path(url_or_path: str, base_dir: str, expected_prefix: str) -> Path:
@@ -42,8 +101,52 @@ def _resolve_local_path(url_or_path: str, base_dir: str, expected_prefix: str) -
     return Path(base_dir) / filename
 
 
+def _resolve_scene_inputs(image_urls: List[str], audio_urls: List[str]) -> tuple[List[str], List[str]]:
+    image_paths: List[str] = []
+    audio_paths: List[str] = []
+
+    for image_url, audio_url in zip(image_urls, audio_urls):
+        image_path = _resolve_local_path(image_url, _IMAGE_DIR, "/generated/")
+        audio_path = _resolve_local_path(audio_url, _AUDIO_DIR, "/audio-files/")
+
+        if not image_path.is_file():
+            raise HTTPException(status_code=400, detail=f"Image file not found: {image_path.name}")
+        if not audio_path.is_file():
+            raise HTTPException(status_code=400, detail=f"Audio file not found: {audio_path.name}")
+
+        image_paths.append(str(image_path))
+        audio_paths.append(str(audio_path))
+
+    return image_paths, audio_paths
+
+
+@contextmanager
+def _encode_capacity() -> Iterator[None]:
+    """Answer 503 when no encode slot frees up within VIDEO_ENCODE_QUEUE_SECONDS."""
+
+    try:
+        yield
+    except EncodeBusyError as exc:
+        raise HTTPException(status_code=503, detail="Video encoders are busy; retry shortly.") from exc
+
+
+def _subtitle_urls(paths: Dict[str, str]) -> Dict[str, str]:
+    return {kind: f"/videos/{Path(path).name}" for kind, path in paths.items()}
+
+
+def _project_response(project: Dict[str, Any]) -> ProjectResponse:
+    return ProjectResponse(
+        project_id=str(project["_id"]),
+        video_url=f"/videos/{Path(project['video_path']).name}",
+        version=int(project["version"]),
+        scenes=project_scene_summary(project),
+    )
+
+
+# The rendering handlers are plain def: FastAPI runs them in its threadpool,
+# so waiting for an encode slot never blocks the event loop.
 @router.post("/generate", response_model=GenerateVideoResponse)
-async def generate_video(
+def generate_video(
     payload: GenerateVideoRequest,
     current_user: Dict[str, Any] = Depends(get_current_user),
 ) -> GenerateVideoResponse:
@@ -53,32 +156,191 @@ async def generate_video(
     if len(payload.image_urls) != len(payload.audio_urls):
         raise HTTPException(status_code=400, detail="image_urls and audio_urls must have the same length")
 
-    clip_paths: List[str] = []
-    audio_paths: List[str] = []
+    if payload.scene_texts is not None and len(payload.scene_texts) != len(payload.audio_urls):
+        raise HTTPException(status_code=400, detail="scene_texts must have one entry per scene")
 
-    for image_url, audio_url in zip(payload.image_urls, payload.audio_urls):
-        image_path = _resolve_local_path(image_url, _IMAGE_DIR, "/generated/")
-        audio_path = _resolve_local_path(audio_url, _AUDIO_DIR, "/audio-files/")
+    image_paths, audio_paths = _resolve_scene_inputs(payload.image_urls, payload.audio_urls)
 
-        if not image_path.is_file():
-            raise HTTPException(status_code=400, detail=f"Image file not found: {image_path.name}")
-        if not audio_path.is_file():
-            raise HTTPException(status_code=400, detail=f"Audio file not found: {audio_path.name}")
+    scene_bgm = select_scene_bgm(payload.emotions, len(image_paths)) if payload.bgm else None
 
-        clip_path = lip_sync(str(image_path), str(audio_path), output_dir=_VIDEO_DIR)
-        clip_paths.append(clip_path)
-        audio_paths.append(str(audio_path))
+    stream_url: Optional[str] = None
+
+    with _encode_capacity():
+        if payload.output == "hls":
+            hls = render_hls(
+                uuid4().hex,
+                image_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=payload.profile,
+                scene_bgm=scene_bgm,
+            )
+            stream_url = playlist_url(hls["playlist_path"], _VIDEO_DIR)
+            final_video_path = hls["video_path"]
+        elif payload.keep_scene_clips:
+            results = render_clips_parallel(
+                list(zip(image_paths, audio_paths)),
+                output_dir=_VIDEO_DIR,
+                profile=payload.profile,
+            )
+            if any(r.busy for r in results):
+                raise EncodeBusyError("all encoders are busy")
+            errors = clip_errors(results)
+            if errors:
+                raise HTTPException(status_code=500, detail="Clip rendering failed: " + "; ".join(errors))
 
-    # Optional BGM file location (if you add one later, place it here)
-    bgm_path: str | None = None
+            clip_paths = [r.clip_path for r in results]
+            final_video_path = compose_video(
+                clip_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=payload.profile,
+                scene_bgm=scene_bgm,
+            )
+        else:
+            final_video_path = render_story_video(
+                image_paths,
+                audio_paths,
+                output_dir=_VIDEO_DIR,
+                profile=payload.profile,
+                scene_bgm=scene_bgm,
+            )
 
-    final_video_path = compose_video(clip_paths, audio_paths, output_dir=_VIDEO_DIR, bgm_path=bgm_path)
     filename = Path(final_video_path).name
     video_url = f"/videos/{filename}"
 
     # Analytics: track video render operations
-    log_event("video_rendered", meta={"clip_count": len(clip_paths)})
+    log_event(
+        "video_rendered",
+        meta={"clip_count": len(image_paths), "profile": payload.profile, "output": payload.output},
+    )
+
+    subtitles: Optional[Dict[str, str]] = None
+    with _encode_capacity():
+        if payload.scene_texts is not None:
+            paths = caption_video(final_video_path, payload.scene_texts, audio_paths, soft=payload.soft_subtitles)
+            subtitles = _subtitle_urls(paths)
+
+        previews = preview_urls(final_video_path, _VIDEO_DIR)
+    save_video(current_user["id"], video_url, previews=previews)
+
+    return GenerateVideoResponse(video_url=video_url, playlist_url=stream_url, previews=previews, subtitles=subtitles)
+
+
+@router.post("/subtitles", response_model=SubtitlesResponse)
+def regenerate_subtitles(
+    payload: SubtitlesRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> SubtitlesResponse:
+    """(Re)write captions for an existing video without re-encoding it.
+
+    audio_urls must be the narration the video was rendered from; they give
+    the scene timings.
+    """
+
+    if len(payload.scene_texts) != len(payload.audio_urls):
+        raise HTTPException(status_code=400, detail="scene_texts and audio_urls must have the same length")
+
+    video_path = _resolve_local_path(payload.video_url, _VIDEO_DIR, "/videos/")
+    if not video_path.is_file():
+        raise HTTPException(status_code=400, detail=f"Video file not found: {video_path.name}")
+
+    audio_paths: List[str] = []
+    for audio_url in payload.audio_urls:
+        audio_path = _resolve_local_path(audio_url, _AUDIO_DIR, "/audio-files/")
+        if not audio_path.is_file():
+            raise HTTPException(status_code=400, detail=f"Audio file not found: {audio_path.name}")
+        audio_paths.append(str(audio_path))
+
+    with _encode_capacity():
+        paths = caption_video(str(video_path), payload.scene_texts, audio_paths, soft=payload.soft_subtitles)
+    return SubtitlesResponse(video_url=f"/videos/{video_path.name}", subtitles=_subtitle_urls(paths))
+
+
+@router.post("/projects", response_model=ProjectResponse)
+def create_video_project(
+    payload: CreateProjectRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> ProjectResponse:
+    """Render a story as an editable project (one stored segment per scene)."""
+
+    if not payload.image_urls or not payload.audio_urls:
+        raise HTTPException(status_code=400, detail="image_urls and audio_urls are required")
+
+    if len(payload.image_urls) != len(payload.audio_urls):
+        raise HTTPException(status_code=400, detail="image_urls and audio_urls must have the same length")
+
+    image_paths, audio_paths = _resolve_scene_inputs(payload.image_urls, payload.audio_urls)
+
+    with _encode_capacity():
+        project = create_project(
+            current_user["id"],
+            image_paths,
+            audio_paths,
+            emotions=payload.emotions,
+            profile=payload.profile,
+            bgm=payload.bgm,
+            output_dir=_VIDEO_DIR,
+        )
+    response = _project_response(project)
+
+    log_event("video_rendered", meta={"clip_count": len(image_paths), "profile": payload.profile, "project": True})
+    set_project_asset(project, save_video(current_user["id"], response.video_url))
+
+    return response
+
+
+@router.put("/projects/{project_id}/scenes/{index}", response_model=ProjectResponse)
+def update_video_project_scene(
+    project_id: str,
+    index: int,
+    payload: UpdateSceneRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+) -> ProjectResponse:
+    """Swap one scene's image/audio and re-encode only that scene's segment."""
+
+    try:
+        project = get_project(project_id, current_user["id"])
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail="Invalid project id") from exc
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    image_path: Optional[str] = None
+    audio_path: Optional[str] = None
+    if payload.image_url:
+        image_path = str(_resolve_local_path(payload.image_url, _IMAGE_DIR, "/generated/"))
+        if not Path(image_path).is_file():
+            raise HTTPException(status_code=400, detail=f"Image file not found: {Path(image_path).name}")
+    if payload.audio_url:
+        audio_path = str(_resolve_local_path(payload.audio_url, _AUDIO_DIR, "/audio-files/"))
+        if not Path(audio_path).is_file():
+            raise HTTPException(status_code=400, detail=f"Audio file not found: {Path(audio_path).name}")
+
+    try:
+        with _encode_capacity():
+            project = update_scene(
+                project,
+                index,
+                image_path=image_path,
+                audio_path=audio_path,
+                emotion=payload.emotion,
+                output_dir=_VIDEO_DIR,
+            )
+    except IndexError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    response = _project_response(project)
+
+    log_event("video_rendered", meta={"clip_count": 1, "profile": project["profile"], "project": True})
+    if project.get("asset_id"):
+        update_asset_url(project["asset_id"], response.video_url)
+
+    return response
+
 
-    save_video(current_user["id"], video_url)
+@router.get("/encoder-stats")
+async def encoder_stats(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """Concurrency limits, totals and recent per-encode wall/CPU time and peak RSS."""
 
-    return GenerateVideoResponse(video_url=video_url)
+    return get_encode_manager().snapshot()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import textwrap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from nlp.scene_splitter import split_sentences
+from .ffmpeg_tools import probe_duration, run_ffmpeg
+
+_LINE_WIDTH = 42  # common broadcast limit; longer sentences wrap onto more lines
+_MIN_CUE_SECONDS = 0.8
+
+
+@dataclass
+class Cue:
+    start: float
+    end: float
+    text: str
+
+
+def build_cues(scene_texts: Sequence[str], durations: Sequence[float]) -> List[Cue]:
+    """One cue per sentence, timed from the narration durations of each scene.
+
+    A scene's duration is shared between its sentences in proportion to
+    their length, which tracks TTS speaking time closely enough for
+    captions without running any alignment.
+    """
+
+    if len(scene_texts) != len(durations):
+        raise ValueError("scene_texts and durations must have the same length.")
+
+    cues: List[Cue] = []
+    scene_start = 0.0
+    for text, duration in zip(scene_texts, durations):
+        sentences = split_sentences(text or "")
+        weights = [max(len(s), 1) for s in sentences]
+        total_weight = float(sum(weights))
+
+        start = scene_start
+        for sentence, weight in zip(sentences, weights):
+            end = start + duration * weight / total_weight
+            cues.append(Cue(start=start, end=end, text=sentence))
+            start = end
+
+        scene_start += duration
+
+    # Very short sentences flash by; borrow time from the gap-free next cue.
+    for cue, following in zip(cues, cues[1:]):
+        if cue.end - cue.start < _MIN_CUE_SECONDS and following.end - cue.start > 2 * _MIN_CUE_SECONDS:
+            cue.end = following.start = cue.start + _MIN_CUE_SECONDS
+
+    return cues
+
+
+def _timestamp(seconds: float, separator: str) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _wrap(text: str) -> str:
+    return "\n".join(textwrap.wrap(text, _LINE_WIDTH)) or text
+
+
+def to_webvtt(cues: Sequence[Cue]) -> str:
+    blocks = ["WEBVTT"]
+    for cue in cues:
+        blocks.append(f"{_timestamp(cue.start, '.')} --> {_timestamp(cue.end, '.')}\n{_wrap(cue.text)}")
+    return "\n\n".join(blocks) + "\n"
+
+
+def to_srt(cues: Sequence[Cue]) -> str:
+    blocks = [
+        f"{index}\n{_timestamp(cue.start, ',')} --> {_timestamp(cue.end, ',')}\n{_wrap(cue.text)}"
+        for index, cue in enumerate(cues, start=1)
+    ]
+    return "\n\n".join(blocks) + "\n"
+
+
+def write_subtitles(video_path: str, scene_texts: Sequence[str], durations: Sequence[float]) -> Dict[str, str]:
+    """Write <video stem>.vtt and .srt next to video_path.
+
+    Returns {"vtt": path, "srt": path}. Rewriting them never touches the video.
+    """
+
+    cues = build_cues(scene_texts, durations)
+    base = Path(video_path).with_suffix("")
+    paths = {"vtt": f"{base}.vtt", "srt": f"{base}.srt"}
+
+    Path(paths["vtt"]).write_text(to_webvtt(cues), encoding="utf-8")
+    Path(paths["srt"]).write_text(to_srt(cues), encoding="utf-8")
+    return paths
+
+
+def mux_soft_subtitles(video_path: str, srt_path: str, language: str = "eng") -> str:
+    """Add (or replace) a soft subtitle track on an MP4 in place.
+
+    Audio and video are stream-copied; only the text track is converted to
+    mov_text, so this costs about as much as copying the file. language is
+    an ISO 639-2 code.
+    """
+
+    video = Path(video_path)
+    tmp = video.with_name(video.stem + ".subs.tmp.mp4")
+    try:
+        run_ffmpeg(
+            [
+                "-i",
+                str(video),
+                "-i",
+                str(srt_path),
+                "-map",
+                "0:v",
+                "-map",
+                "0:a?",
+                "-map",
+                "1:s",
+                "-c:v",
+                "copy",
+                "-c:a",
+                "copy",
+                "-c:s",
+                "mov_text",
+                "-metadata:s:s:0",
+                f"language={language}",
+                "-movflags",
+                "+faststart",
+                str(tmp),
+            ],
+            label="mux_subtitles",
+        )
+        os.replace(tmp, video)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return str(video)
+
+
+def caption_video(
+    video_path: str,
+    scene_texts: Sequence[str],
+    audio_paths: Sequence[str],
+    soft: bool = False,
+    language: str = "eng",
+) -> Dict[str, str]:
+    """Write sidecar subtitles for a rendered story and optionally mux them in.
+
+    Scene timings come from the narration files the video was built from.
+    """
+
+    durations = [probe_duration(str(path)) for path in audio_paths]
+    paths = write_subtitles(video_path, scene_texts, durations)
+    if soft:
+        mux_soft_subtitles(video_path, paths["srt"], language=language)
+    return paths